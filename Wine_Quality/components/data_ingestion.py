@@ -1,7 +1,13 @@
 import sys, os
 sys.path.append(os.getcwd())
 import os 
+import glob
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+import pandas as pd
 from pandas import DataFrame
+from bson import ObjectId
 
 from sklearn.model_selection import train_test_split
 from wine_quality.exception import custom_Exception
@@ -9,6 +15,9 @@ from wine_quality.logger import logging
 from wine_quality.entity.config_entity import DataIngestionConfig
 from wine_quality.entity.artifact_entity import DataIngestionArtifact
 from wine_quality.data_access.wine_data import winedata
+from wine_quality.utils.main_utils import (read_yaml_file, write_yaml_file, get_schema_dtypes,
+                                           save_dataframe, read_dataframe)
+from wine_quality.constants import SCHEMA_FILE_PATH
 
 import sys
 
@@ -28,16 +37,49 @@ class DataIngestion:
 
             """
             self.data_ingestion_config = data_ingestion_config
+            schema_config = read_yaml_file(file_path=SCHEMA_FILE_PATH)
+            self._schema_dtypes = get_schema_dtypes(schema_config, exclude_drop_columns=False)
+            self._exported_columns = list(get_schema_dtypes(schema_config))
         except Exception as e:
             raise custom_Exception(e, sys) from e   
         
 
 
 
+    def _export_collection(self, wine_data: winedata, query: dict = None,
+                           extra_columns: dict = None) -> List[DataFrame]:
+        """
+        export the (optionally filtered) collection, range partitioned when export_partitions > 1
+        """
+        if self.data_ingestion_config.export_partitions > 1:
+            return wine_data.export_collection_in_partitions(
+                collection_name=self.data_ingestion_config.collection_name,
+                n_partitions=self.data_ingestion_config.export_partitions,
+                max_workers=self.data_ingestion_config.export_workers,
+                field=self.data_ingestion_config.partition_field,
+                query=query, extra_columns=extra_columns)
+        return [wine_data.export_collection_as_dataframe(collection_name=self.data_ingestion_config.collection_name,
+                                                         query=query, extra_columns=extra_columns)]
+
+
+    def _incremental_columns(self) -> dict:
+        """
+        columns the incremental export reads on top of the exported schema columns (column -> dtype):
+        the watermark field, to advance the watermark on what was read, and the dedupe key
+        """
+        columns = {}
+        for column in (self.data_ingestion_config.watermark_field, self.data_ingestion_config.dedupe_key):
+            if column is not None and column not in self._exported_columns:
+                columns[column] = self._schema_dtypes.get(column, np.dtype("datetime64[ms]")
+                                                          if column == self.data_ingestion_config.watermark_field
+                                                          else np.dtype("object"))
+        return columns
+
+
     def export_data_into_feature_store(self)->DataFrame:
         """
         Method Name :   export_data_into_feature_store
-        Description :   This method exports data from mongodb to csv file
+        Description :   This method exports data from mongodb to the parquet feature store
         
         Output      :   data is returned as artifact of data ingestion components
         On Failure  :   Write an exception log and then raise an exception
@@ -45,19 +87,199 @@ class DataIngestion:
         try:
             logging.info(f"Exporting data from mongodb")
             wine_data = winedata()
-            dataframe = wine_data.export_collection_as_dataframe(collection_name=
-                                                                   self.data_ingestion_config.collection_name)
-            logging.info(f"Shape of dataframe: {dataframe.shape}")
+
+            if self.data_ingestion_config.incremental:
+                return self.export_incremental_into_feature_store(wine_data)
+
             feature_store_file_path  = self.data_ingestion_config.feature_store_file_path
             dir_path = os.path.dirname(feature_store_file_path)
             os.makedirs(dir_path,exist_ok=True)
-            logging.info(f"Saving exported data into feature store file path: {feature_store_file_path}")
-            dataframe.to_csv(feature_store_file_path,index=False,header=True)
+
+            partitions = self._export_collection(wine_data)
+
+            if self.data_ingestion_config.write_partition_files and len(partitions) > 1:
+                file_root, file_ext = os.path.splitext(feature_store_file_path)
+                for i, partition in enumerate(partitions):
+                    partition_file_path = f"{file_root}_part_{i:03d}{file_ext}"
+                    logging.info(f"Saving partition {i} ({len(partition)} rows) into: {partition_file_path}")
+                    save_dataframe(partition_file_path, partition, dtypes=self._schema_dtypes)
+                dataframe = pd.concat(partitions, ignore_index=True)
+            else:
+                dataframe = partitions[0] if len(partitions) == 1 else pd.concat(partitions, ignore_index=True)
+                logging.info(f"Saving exported data into feature store file path: {feature_store_file_path}")
+                save_dataframe(feature_store_file_path, dataframe, dtypes=self._schema_dtypes)
+
+            logging.info(f"Shape of dataframe: {dataframe.shape}")
             return dataframe
 
         except Exception as e:
             raise custom_Exception(e,sys)
+
+
+    def read_watermark(self):
+        """
+        Method Name :   read_watermark
+        Description :   This method reads the high-water mark recorded by the previous incremental export
+
+        Output      :   last exported value of the watermark field, None on the first run
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            watermark_file_path = self.data_ingestion_config.watermark_file_path
+            if not os.path.exists(watermark_file_path):
+                return None
+            watermark = read_yaml_file(file_path=watermark_file_path)
+            if watermark["field"] != self.data_ingestion_config.watermark_field:
+                raise Exception(f"Feature store watermark is on [{watermark['field']}] but ingestion is configured "
+                                f"on [{self.data_ingestion_config.watermark_field}], reset {watermark_file_path} "
+                                f"and the feature store partitions to change it")
+            if watermark["type"] == "objectid":
+                return ObjectId(watermark["value"])
+            return watermark["value"]
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+
+    def write_watermark(self, value) -> None:
+        """
+        Method Name :   write_watermark
+        Description :   This method records the high-water mark of the last exported partition
+        
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            content = {"field": self.data_ingestion_config.watermark_field,
+                       "updated_at": datetime.now().isoformat()}
+            if isinstance(value, ObjectId):
+                content.update({"type": "objectid", "value": str(value),
+                                "generation_time": value.generation_time.isoformat()})
+            else:
+                content.update({"type": type(value).__name__, "value": value})
+            write_yaml_file(file_path=self.data_ingestion_config.watermark_file_path, content=content, replace=True)
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+
+    def drop_duplicate_keys(self, dataframe: DataFrame) -> DataFrame:
+        """
+        Method Name :   drop_duplicate_keys
+        Description :   This method keeps the last row (newest partition) of every dedupe key: a document upserted
+                        again is exported again with a new stamp. Rows without the key are all kept
+
+        Output      :   dataframe without the outdated rows
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            key = self.data_ingestion_config.dedupe_key
+            if key is None or key not in dataframe.columns:
+                return dataframe
+            duplicated = (dataframe[key].notna() & dataframe.duplicated(subset=[key], keep="last")).to_numpy()
+            if duplicated.any():
+                logging.info(f"Dropping {int(duplicated.sum())} outdated rows of re-ingested {key} values")
+            return dataframe[~duplicated].reset_index(drop=True)
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+
+    def list_feature_store_partitions(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.data_ingestion_config.persistent_feature_store_dir, "*.parquet")))
+
+
+    def compact_feature_store(self) -> None:
+        """
+        Method Name :   compact_feature_store
+        Description :   This method merges the feature store partitions into one file once there are more
+                        than compaction_threshold of them, so reads do not degrade with the number of runs,
+                        and drops the outdated rows of re-ingested keys
         
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            partition_files = self.list_feature_store_partitions()
+            if len(partition_files) <= self.data_ingestion_config.compaction_threshold:
+                return
+            logging.info(f"Compacting {len(partition_files)} feature store partitions")
+            dataframe = pd.concat([read_dataframe(file_path) for file_path in partition_files], ignore_index=True)
+            dataframe = self.drop_duplicate_keys(dataframe)
+            compacted_file_path = os.path.join(self.data_ingestion_config.persistent_feature_store_dir,
+                                               f"part_{datetime.now().strftime('%Y%m%d%H%M%S%f')}_compacted.parquet")
+            # write under a temporary name first so a crash never leaves the store without its rows
+            save_dataframe(compacted_file_path + ".tmp", dataframe, dtypes=self._schema_dtypes)
+            os.replace(compacted_file_path + ".tmp", compacted_file_path)
+            for file_path in partition_files:
+                os.remove(file_path)
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+
+    def export_incremental_into_feature_store(self, wine_data: winedata) -> DataFrame:
+        """
+        Method Name :   export_incremental_into_feature_store
+        Description :   This method exports only the documents newer than the recorded watermark,
+                        appends them as a new partition of the persistent feature store and returns
+                        the whole feature store (newest row per dedupe key) as one dataframe, also saved as the
+                        feature store file of the run.
+                        The watermark field is the server-side ingest stamp written by wine-load, and the export
+                        stops at server time - watermark_lag_seconds: a write in flight gets a stamp before it
+                        commits, stopping short of "now" keeps it from landing below a saved watermark.
+                        The watermark advances to the highest stamp actually read, not to the query bound,
+                        so documents an export did not see (e.g. on a lagging secondary) are read next run.
+        
+        Output      :   data is returned as artifact of data ingestion components
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            field = self.data_ingestion_config.watermark_field
+            os.makedirs(self.data_ingestion_config.persistent_feature_store_dir, exist_ok=True)
+
+            watermark = self.read_watermark()
+            # fix the upper bound first, documents stamped after it are picked up by the next run
+            lag = timedelta(seconds=self.data_ingestion_config.watermark_lag_seconds)
+            lag_bound = wine_data.get_server_time() - lag
+            if field == "_id":
+                lag_bound = ObjectId.from_datetime(lag_bound)
+            upper = wine_data.get_max_value(collection_name=self.data_ingestion_config.collection_name, field=field,
+                                            query={field: {"$lte": lag_bound}})
+            logging.info(f"Feature store watermark on {field}: {watermark}, export bound: {upper} (<= {lag_bound})")
+
+            if upper is not None and (watermark is None or upper > watermark):
+                condition = {"$lte": upper}
+                if watermark is not None:
+                    condition["$gt"] = watermark
+                partitions = self._export_collection(wine_data, query={field: condition},
+                                                     extra_columns=self._incremental_columns())
+                new_data = partitions[0] if len(partitions) == 1 else pd.concat(partitions, ignore_index=True)
+
+                if len(new_data) > 0:
+                    partition_file_path = os.path.join(self.data_ingestion_config.persistent_feature_store_dir,
+                                                       f"part_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.parquet")
+                    logging.info(f"Appending {len(new_data)} new rows to feature store partition: {partition_file_path}")
+                    read_max = new_data[field].max()
+                    if field == "_id":
+                        # parquet has no ObjectId type
+                        new_data[field] = new_data[field].astype(str)
+                    save_dataframe(partition_file_path, new_data, dtypes=self._schema_dtypes)
+                    self.write_watermark(read_max.to_pydatetime() if isinstance(read_max, pd.Timestamp) else read_max)
+                    self.compact_feature_store()
+                else:
+                    logging.info(f"The export read no document up to {upper}, watermark kept")
+            else:
+                logging.info("No new documents since the last export")
+
+            partition_files = self.list_feature_store_partitions()
+            if len(partition_files) == 0:
+                raise Exception(f"Feature store {self.data_ingestion_config.persistent_feature_store_dir} is empty")
+            dataframe = pd.concat([read_dataframe(file_path) for file_path in partition_files], ignore_index=True)
+            dataframe = self.drop_duplicate_keys(dataframe)[self._exported_columns]
+            logging.info(f"Saving the feature store into feature store file path: "
+                         f"{self.data_ingestion_config.feature_store_file_path}")
+            save_dataframe(self.data_ingestion_config.feature_store_file_path, dataframe, dtypes=self._schema_dtypes)
+            logging.info(f"Shape of dataframe: {dataframe.shape}")
+            return dataframe
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+
     def split_data_as_train_test(self,dataframe: DataFrame) ->None:
         """
         Method Name :   split_data_as_train_test
@@ -70,7 +292,8 @@ class DataIngestion:
 
         try:
                 
-            train_set, test_set = train_test_split(dataframe, test_size=self.data_ingestion_config.train_test_split_ratio)
+            train_set, test_set = train_test_split(dataframe, test_size=self.data_ingestion_config.train_test_split_ratio,
+                                                   random_state=self.data_ingestion_config.random_state)
             logging.info("Performed train test split on the dataframe")
             logging.info(
                 "Exited split_data_as_train_test method of Data_Ingestion class"
@@ -79,8 +302,8 @@ class DataIngestion:
             os.makedirs(dir_path,exist_ok=True)
             
             logging.info(f"Exporting train and test file path.")
-            train_set.to_csv(self.data_ingestion_config.training_file_path,index=False,header=True)
-            test_set.to_csv(self.data_ingestion_config.testing_file_path,index=False,header=True)
+            save_dataframe(self.data_ingestion_config.training_file_path, train_set, dtypes=self._schema_dtypes)
+            save_dataframe(self.data_ingestion_config.testing_file_path, test_set, dtypes=self._schema_dtypes)
 
             logging.info(f"Exported train and test file path.")
         except Exception as e:
@@ -1,15 +1,25 @@
 import sys, os
 sys.path.append(os.getcwd())
 import sys
+import json
+import time
+import shutil
+import hashlib
+from dataclasses import asdict
 import numpy as np
 import pandas as pd
+import sklearn
+import imblearn
 
+from typing import Optional, Tuple
+
+from joblib import Parallel, delayed
 from imblearn.combine import SMOTEENN
 from imblearn.over_sampling import SMOTE
-from imblearn.combine import SMOTEENN
 from imblearn.under_sampling import EditedNearestNeighbours
+from sklearn.neighbors import NearestNeighbors
 
-from sklearn.pipeline import Pipeline
+from sklearn.pipeline import FeatureUnion, Pipeline
 from sklearn.preprocessing import (
     StandardScaler,
     OneHotEncoder,
@@ -18,7 +28,7 @@ from sklearn.preprocessing import (
 )
 from sklearn.compose import ColumnTransformer
 
-from wine_quality.constants import TARGET_COLUMN, SCHEMA_FILE_PATH
+from wine_quality.constants import TARGET_COLUMN, SCHEMA_FILE_PATH, DATA_TRANSFORMATION_CACHE_MANIFEST_FILE_NAME
 from wine_quality.entity.config_entity import DataTransformationConfig
 from wine_quality.entity.artifact_entity import (
     DataTransformationArtifact,
@@ -32,7 +42,18 @@ from wine_quality.utils.main_utils import (
     save_numpy_array_data,
     read_yaml_file,
     drop_columns,
+    read_dataframe,
+    save_dataframe,
+    iter_dataframe_chunks,
+    get_row_count,
+    create_numpy_memmap,
+    load_numpy_array_data,
+    hash_file,
+    link_or_copy,
+    read_json_file,
+    write_json_file,
 )
+from wine_quality.utils.preprocessing import SubsampledPowerTransformer, stratified_order
 # from wine_quality.entity.estimator import TargetValueMapping  # Uncomment if you have string labels
 
 
@@ -57,60 +78,140 @@ class DataTransformation:
             raise custom_Exception(e, sys)
 
     @staticmethod
-    def read_data(file_path) -> pd.DataFrame:
-        """Reads CSV into pandas DataFrame."""
+    def read_data(file_path, columns=None) -> pd.DataFrame:
+        """Reads the parquet split into pandas DataFrame, optionally only the given columns."""
         try:
-            return pd.read_csv(file_path)
+            return read_dataframe(file_path, columns=columns, memory_map=True)
         except Exception as e:
             raise custom_Exception(e, sys)
 
+    # output columns and elementwise transform steps per input column of every pipeline
+    PIPELINE_COST = {
+        "num_pipeline": {"width": 1, "steps": 2},          # power + scaler
+        "one_hot_pipeline": {"width": None, "steps": 1},   # width is the number of categories, known after fit
+        "ordinal_pipeline": {"width": 1, "steps": 1},
+        "transform_pipeline": {"width": 1, "steps": 1},    # power
+        "shared_power_pipeline": {"width": 2, "steps": 2}, # power once, fanned out to scaler + passthrough
+    }
+
+    def plan_transformers(self) -> dict:
+        """
+        Method Name :   plan_transformers
+        Description :   This method assigns the schema.yaml column groups to pipelines and resolves columns listed in
+                        more than one group, so every shared transform is computed once.
+                        overlap_mode "dedupe" keeps each column in its first group (num, one hot, ordinal, transform)
+                        and drops the duplicate outputs, "reuse" keeps the original layout but fits Yeo-Johnson once
+                        for columns in both num_features and transform_columns and fans its output out to both branches.
+
+        Output      :   dict with the columns of every pipeline, the overlapping columns and the estimated per-row cost
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            groups = {
+                "num_pipeline": self._schema_config.get("num_features", []),
+                "one_hot_pipeline": self._schema_config.get("oh_columns", []),
+                "ordinal_pipeline": self._schema_config.get("or_columns", []),
+                "transform_pipeline": self._schema_config.get("transform_columns", []),
+            }
+            mode = self.data_transformation_config.overlap_mode
+            if mode not in ("dedupe", "reuse"):
+                raise ValueError(f"Unknown overlap_mode {mode}, expected dedupe or reuse")
+
+            assignments = {}
+            for pipeline_name, columns in groups.items():
+                for column in columns:
+                    assignments.setdefault(column, []).append(pipeline_name)
+
+            pipeline_columns = {pipeline_name: [] for pipeline_name in self.PIPELINE_COST}
+            overlap = {}
+            for column, pipeline_names in assignments.items():
+                if len(pipeline_names) == 1:
+                    pipeline_columns[pipeline_names[0]].append(column)
+                    continue
+                overlap[column] = pipeline_names
+                if mode == "dedupe":
+                    pipeline_columns[pipeline_names[0]].append(column)
+                elif set(pipeline_names) == {"num_pipeline", "transform_pipeline"}:
+                    pipeline_columns["shared_power_pipeline"].append(column)
+                else:
+                    for pipeline_name in pipeline_names:
+                        pipeline_columns[pipeline_name].append(column)
+
+            if len(overlap) > 0:
+                logging.warning(f"{len(overlap)} columns are listed in more than one schema group "
+                                f"({sorted(overlap)}), overlap_mode={mode}: "
+                                + ("each column is transformed once, duplicate outputs are dropped" if mode == "dedupe"
+                                   else "Yeo-Johnson is fitted once per column and shared by both branches"))
+
+            def steps_per_row(columns_by_pipeline: dict) -> int:
+                return sum(self.PIPELINE_COST[pipeline_name]["steps"] * len(columns)
+                           for pipeline_name, columns in columns_by_pipeline.items())
+
+            plan = {
+                "mode": mode,
+                "pipeline_columns": {pipeline_name: columns for pipeline_name, columns in pipeline_columns.items()
+                                     if len(columns) > 0},
+                "overlap": overlap,
+                "steps_per_row": steps_per_row(pipeline_columns),
+                "unplanned_steps_per_row": steps_per_row(groups),
+            }
+            logging.info(f"Transformer plan: {plan['pipeline_columns']}, {plan['steps_per_row']} transform steps "
+                         f"per row (schema as listed: {plan['unplanned_steps_per_row']})")
+            return plan
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+    def get_power_transformer(self) -> SubsampledPowerTransformer:
+        config = self.data_transformation_config
+        return SubsampledPowerTransformer(method="yeo-johnson", subsample=config.power_subsample, tol=config.power_tol,
+                                          n_jobs=config.power_n_jobs, random_state=config.random_state)
+
     def get_data_transformer_object(self) -> ColumnTransformer:
         """
-        Creates preprocessing object dynamically using schema.yaml.
+        Creates preprocessing object dynamically using schema.yaml and the transformer plan.
         Handles numerical, ordinal, and one-hot columns in one unified transformer.
         """
         logging.info("Entered get_data_transformer_object method")
 
         try:
-            oh_columns = self._schema_config.get("oh_columns", [])
-            or_columns = self._schema_config.get("or_columns", [])
-            transform_columns = self._schema_config.get("transform_columns", [])
-            num_features = self._schema_config.get("num_features", [])
+            self.transformer_plan = self.plan_transformers()
 
             # Pipelines for different column groups
-            numeric_pipeline = Pipeline(
-                steps=[
-                    ("power", PowerTransformer(method="yeo-johnson")),
-                    ("scaler", StandardScaler())
-                ]
-            )
-
-            one_hot_pipeline = Pipeline(
-                steps=[
-                    ("onehot", OneHotEncoder(handle_unknown="ignore", sparse_output=False))
-                ]
-            )
-
-            ordinal_pipeline = Pipeline(
-                steps=[
-                    ("ordinal", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1))
-                ]
-            )
-
-            transform_pipeline = Pipeline(
-                steps=[
-                    ("transform", PowerTransformer(method="yeo-johnson"))
-                ]
-            )
+            pipelines = {
+                "num_pipeline": Pipeline(
+                    steps=[
+                        ("power", self.get_power_transformer()),
+                        ("scaler", StandardScaler())
+                    ]
+                ),
+                "one_hot_pipeline": Pipeline(
+                    steps=[
+                        ("onehot", OneHotEncoder(handle_unknown="ignore", sparse_output=False))
+                    ]
+                ),
+                "ordinal_pipeline": Pipeline(
+                    steps=[
+                        ("ordinal", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1))
+                    ]
+                ),
+                "transform_pipeline": Pipeline(
+                    steps=[
+                        ("transform", self.get_power_transformer())
+                    ]
+                ),
+                # one Yeo-Johnson fit feeding both the scaled (num) and the plain (transform) output
+                "shared_power_pipeline": Pipeline(
+                    steps=[
+                        ("power", self.get_power_transformer()),
+                        ("fan_out", FeatureUnion([("scaler", StandardScaler()), ("transform", "passthrough")]))
+                    ]
+                ),
+            }
 
             # Combine all in one ColumnTransformer
             preprocessor = ColumnTransformer(
-                transformers=[
-                    ("num_pipeline", numeric_pipeline, num_features),
-                    ("one_hot_pipeline", one_hot_pipeline, oh_columns),
-                    ("ordinal_pipeline", ordinal_pipeline, or_columns),
-                    ("transform_pipeline", transform_pipeline, transform_columns),
-                ],
+                transformers=[(pipeline_name, pipelines[pipeline_name], columns)
+                              for pipeline_name, columns in self.transformer_plan["pipeline_columns"].items()],
                 remainder="passthrough"
             )
 
@@ -120,82 +221,341 @@ class DataTransformation:
         except Exception as e:
             raise custom_Exception(e, sys) from e
 
-    def initiate_data_transformation(self) -> DataTransformationArtifact:
+    def get_input_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Model inputs of a split: everything but the target and the schema drop_columns."""
+        input_feature_df = df.drop(columns=[TARGET_COLUMN])
+        return drop_columns(df=input_feature_df, cols=self._schema_config.get("drop_columns", []))
+
+    def transform_to_memmap(self, preprocessor: ColumnTransformer, file_path: str, features_file_path: str,
+                            target_file_path: str) -> tuple:
         """
-        Executes transformation pipeline: preprocesses features, balances data,
-        and saves all outputs for model training.
+        Method Name :   transform_to_memmap
+        Description :   This method streams the split at file_path in chunks through the fitted preprocessor and
+                        writes features and target into preallocated, C-contiguous memory-mapped .npy files,
+                        so only one chunk of the split is in memory at a time
+
+        Output      :   (rows, feature width)
+        On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            if not self.data_validation_artifact.validation_status:
-                raise Exception(self.data_validation_artifact.message)
+            n_rows = get_row_count(file_path)
+            features = target = None
+            row = 0
+            for chunk in iter_dataframe_chunks(file_path, self.data_transformation_config.chunk_size):
+                transformed = preprocessor.transform(self.get_input_features(chunk))
+                if features is None:
+                    dtype = np.dtype(self.data_transformation_config.dtype)
+                    features = create_numpy_memmap(features_file_path, shape=(n_rows, transformed.shape[1]), dtype=dtype)
+                    target = create_numpy_memmap(target_file_path, shape=(n_rows,), dtype=dtype)
+                # the chunk is cast to the configured dtype while it is written
+                features[row:row + len(chunk)] = transformed
+                target[row:row + len(chunk)] = chunk[TARGET_COLUMN].to_numpy()
+                row += len(chunk)
+            if features is None:
+                raise ValueError(f"{file_path} has no rows")
+            features.flush()
+            target.flush()
+            logging.info(f"Transformed {row} rows of {file_path} into {features_file_path} and {target_file_path}")
+            return row, features.shape[1]
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
 
-            logging.info("Starting data transformation...")
+    def get_resampler(self, target: np.ndarray, n_jobs: Optional[int] = None):
+        """
+        imblearn sampler of the configured resampling_strategy for this target, None when there is nothing to do.
+        SMOTE needs k_neighbors + 1 rows of the minority class, k is lowered (or SMOTE skipped) for tiny classes.
+        """
+        config = self.data_transformation_config
+        strategy = config.resampling_strategy
+        if strategy not in ("none", "smote", "enn", "smoteenn"):
+            raise ValueError(f"Unknown resampling_strategy {strategy}, expected none, smote, enn or smoteenn")
+        n_jobs = config.resampling_n_jobs if n_jobs is None else n_jobs
+
+        smote = None
+        if strategy in ("smote", "smoteenn"):
+            _, class_counts = np.unique(target, return_counts=True)
+            k_neighbors = min(config.smote_k_neighbors, int(class_counts.min()) - 1)
+            if len(class_counts) < 2 or k_neighbors < 1:
+                logging.warning(f"Minority class has {class_counts.min()} rows, SMOTE skipped")
+            else:
+                smote = SMOTE(sampling_strategy="minority", random_state=config.random_state,
+                              k_neighbors=NearestNeighbors(n_neighbors=k_neighbors + 1, n_jobs=n_jobs))
+        enn = None
+        if strategy in ("enn", "smoteenn"):
+            enn = EditedNearestNeighbours(n_neighbors=config.enn_n_neighbors, n_jobs=n_jobs)
+
+        if smote is not None and enn is not None:
+            return SMOTEENN(sampling_strategy="minority", random_state=config.random_state, smote=smote, enn=enn)
+        return smote if smote is not None else enn
+
+    def resample(self, features: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Method Name :   resample
+        Description :   This method rebalances the classes of the transformed data with the configured strategy.
+                        At most resampling_max_rows (stratified) rows are resampled, the rest is kept as it is.
+                        In chunked mode the rows are split in stratified blocks of resampling_chunk_size that are
+                        resampled independently and in parallel, so neighbour searches are bounded by the block
+                        size instead of growing with the whole split.
+
+        Output      :   resampled features and target
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            config = self.data_transformation_config
+            if config.resampling_strategy == "none":
+                return features, target
+
+            order = stratified_order(target, random_state=config.random_state)
+            selected, kept = np.sort(order[:config.resampling_max_rows]), np.sort(order[config.resampling_max_rows:])
+            if len(kept) > 0:
+                logging.warning(f"Resampling {len(selected)} of {len(target)} rows (resampling_max_rows)")
+
+            chunked = (config.resampling_mode == "chunked" or
+                       (config.resampling_mode == "auto" and len(selected) > config.resampling_chunk_size))
+            if chunked:
+                # contiguous slices of a stratified order are stratified blocks
+                block_order = stratified_order(target[selected], random_state=config.random_state)
+                blocks = [np.sort(selected[block_order[start:start + config.resampling_chunk_size]])
+                          for start in range(0, len(selected), config.resampling_chunk_size)]
+
+                def resample_block(rows):
+                    sampler = self.get_resampler(target[rows], n_jobs=1)
+                    return (features[rows], target[rows]) if sampler is None else \
+                        sampler.fit_resample(features[rows], target[rows])
+
+                # neighbour queries release the GIL, threads avoid copying the blocks into workers
+                results = Parallel(n_jobs=config.resampling_n_jobs, prefer="threads")(
+                    delayed(resample_block)(rows) for rows in blocks)
+                logging.info(f"Resampled {len(selected)} rows in {len(blocks)} blocks")
+            else:
+                sampler = self.get_resampler(target[selected])
+                results = [(features[selected], target[selected]) if sampler is None else
+                           sampler.fit_resample(features[selected], target[selected])]
+
+            if len(kept) > 0:
+                results.append((features[kept], target[kept]))
+            return (np.concatenate([result[0] for result in results]),
+                    np.concatenate([np.asarray(result[1], dtype=features.dtype) for result in results]))
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
 
-            preprocessor = self.get_data_transformer_object()
+    @staticmethod
+    def close_memmap(array: np.ndarray) -> None:
+        """unmap an array opened by np.load(mmap_mode=...), an open map keeps its file locked on Windows"""
+        mmap = getattr(array, "_mmap", None)
+        if mmap is not None:
+            mmap.close()
 
-            # Load data
-            train_df = self.read_data(self.data_ingestion_artifact.trained_file_path)
-            test_df = self.read_data(self.data_ingestion_artifact.test_file_path)
+    def resample_arrays(self, features_file_path: str, target_file_path: str) -> dict:
+        """
+        resample the memory-mapped features / target and rewrite both files,
+        returns rows before / after and the time spent, the files are left untouched when nothing is resampled
+        """
+        try:
+            start = time.perf_counter()
+            features = load_numpy_array_data(features_file_path, mmap_mode="r")
+            target = load_numpy_array_data(target_file_path, mmap_mode="r")
+            report = {"rows": len(target), "resampled_rows": len(target)}
+            if self.get_resampler(np.asarray(target)) is None:
+                self.close_memmap(features)
+                self.close_memmap(target)
+                del features, target
+                report["seconds"] = time.perf_counter() - start
+                logging.info(f"Nothing to resample in {features_file_path} "
+                             f"({self.data_transformation_config.resampling_strategy})")
+                return report
+
+            target_dtype = target.dtype
+            # resample copies the rows it reads, no view of the maps outlives this call
+            features_resampled, target_resampled = self.resample(features, target)
+            self.close_memmap(features)
+            self.close_memmap(target)
+            del features, target
+            for file_path, array in ((features_file_path, np.ascontiguousarray(features_resampled)),
+                                     (target_file_path, np.ascontiguousarray(target_resampled, dtype=target_dtype))):
+                save_numpy_array_data(file_path + ".tmp", array=array)
+                os.replace(file_path + ".tmp", file_path)
+            report.update({"resampled_rows": len(target_resampled), "seconds": time.perf_counter() - start})
+            logging.info(f"Resampled {features_file_path} ({self.data_transformation_config.resampling_strategy}): "
+                         f"{report}")
+            return report
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
 
-            # Split input and target
-            input_feature_train_df = train_df.drop(columns=[TARGET_COLUMN], axis=1)
-            target_feature_train_df = train_df[TARGET_COLUMN]
-            input_feature_test_df = test_df.drop(columns=[TARGET_COLUMN], axis=1)
-            target_feature_test_df = test_df[TARGET_COLUMN]
+    def save_benchmark_sample(self) -> int:
+        """
+        Method Name :   save_benchmark_sample
+        Description :   This method saves the raw model inputs of random rows of the test split, held out from
+                        fitting, for the serving latency benchmark of the model trainer
 
-            # Drop columns specified in schema
-            drop_cols = self._schema_config.get("drop_columns", [])
-            input_feature_train_df = drop_columns(df=input_feature_train_df, cols=drop_cols)
-            input_feature_test_df = drop_columns(df=input_feature_test_df, cols=drop_cols)
+        Output      :   number of rows saved
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            config = self.data_transformation_config
+            test_df = self.read_data(self.data_ingestion_artifact.test_file_path)
+            sample_df = test_df.sample(n=min(config.benchmark_sample_rows, len(test_df)),
+                                       random_state=config.random_state)
+            save_dataframe(config.benchmark_sample_file_path, self.get_input_features(sample_df))
+            logging.info(f"Saved {len(sample_df)} benchmark rows to {config.benchmark_sample_file_path}")
+            return len(sample_df)
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
 
-            # Optional target mapping (uncomment if your target is string)
-            # target_feature_train_df = target_feature_train_df.replace(TargetValueMapping()._asdict())
-            # target_feature_test_df = target_feature_test_df.replace(TargetValueMapping()._asdict())
+    def get_output_paths(self) -> dict:
+        """file name in the cache -> path of this run, for every output of the transformation"""
+        config = self.data_transformation_config
+        paths = [config.transformed_object_file_path, config.transformed_train_file_path,
+                 config.transformed_test_file_path, config.transformed_train_target_file_path,
+                 config.transformed_test_target_file_path, config.benchmark_sample_file_path]
+        return {os.path.basename(path): path for path in paths}
 
-            # Transform data
-            input_feature_train_arr = preprocessor.fit_transform(input_feature_train_df)
-            input_feature_test_arr = preprocessor.transform(input_feature_test_df)
+    @staticmethod
+    def get_code_fingerprint() -> dict:
+        """sha256 of the source of the modules that compute the outputs, editing any of them invalidates the cache"""
+        modules = (__name__, SubsampledPowerTransformer.__module__, drop_columns.__module__)
+        return {module: hash_file(sys.modules[module].__file__) for module in modules}
 
-            logging.info("Applied preprocessing transformations successfully.")
+    def get_fingerprint(self) -> str:
+        """
+        Method Name :   get_fingerprint
+        Description :   This method hashes everything the transformation outputs depend on: the content of the
+                        ingested splits, schema.yaml, the transformation config (without paths and n_jobs, which do
+                        not change the outputs), the library versions of the pickled objects and the source of the
+                        transformation code
+
+        Output      :   sha256 hex digest
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            params = {key: value for key, value in asdict(self.data_transformation_config).items()
+                      if not key.endswith(("_path", "_dir", "n_jobs")) and key != "use_cache"}
+            fingerprint = {
+                "code": self.get_code_fingerprint(),
+                "train": hash_file(self.data_ingestion_artifact.trained_file_path),
+                "test": hash_file(self.data_ingestion_artifact.test_file_path),
+                "schema": self._schema_config,
+                "params": params,
+                "libraries": {"numpy": np.__version__, "scikit-learn": sklearn.__version__,
+                              "imbalanced-learn": imblearn.__version__},
+            }
+            return hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=str).encode()).hexdigest()
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
 
-            # Balance dataset with SMOTEENN
-            
-            # smt = SMOTEENN(sampling_strategy="minority", smote=SMOTE(k_neighbors=1))
+    def load_from_cache(self, fingerprint: str) -> Optional[DataTransformationArtifact]:
+        """
+        Method Name :   load_from_cache
+        Description :   This method hardlinks the cached outputs of an identical earlier run into this run's
+                        artifact directory
 
-            
+        Output      :   DataTransformationArtifact, or None when nothing is cached under the fingerprint
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            cache_dir = os.path.join(self.data_transformation_config.cache_dir, fingerprint)
+            manifest_file_path = os.path.join(cache_dir, DATA_TRANSFORMATION_CACHE_MANIFEST_FILE_NAME)
+            if not os.path.exists(manifest_file_path):
+                return None
+
+            for file_name, file_path in self.get_output_paths().items():
+                link_or_copy(os.path.join(cache_dir, file_name), file_path)
+            manifest = read_json_file(manifest_file_path)
+            config = self.data_transformation_config
+            data_transformation_artifact = DataTransformationArtifact(
+                transformed_object_file_path=config.transformed_object_file_path,
+                transformed_train_file_path=config.transformed_train_file_path,
+                transformed_test_file_path=config.transformed_test_file_path,
+                transformed_train_target_file_path=config.transformed_train_target_file_path,
+                transformed_test_target_file_path=config.transformed_test_target_file_path,
+                benchmark_sample_file_path=config.benchmark_sample_file_path,
+                **manifest["artifact"],
+                fingerprint=fingerprint,
+                cache_hit=True,
+            )
+            logging.info(f"Reused cached transformation {fingerprint} from {cache_dir}")
+            return data_transformation_artifact
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
 
-            # smt = SMOTEENN(
-            # sampling_strategy="minority",
-            # smote=SMOTE(k_neighbors=1),
-            # enn=EditedNearestNeighbours(n_neighbors=1)
-            #                 )
+    def save_to_cache(self, fingerprint: str, data_transformation_artifact: DataTransformationArtifact) -> None:
+        """
+        hardlink this run's outputs into the cache under the fingerprint, the entry is assembled in a temporary
+        directory and renamed, so a concurrent or interrupted run never sees a partial entry
+        """
+        try:
+            cache_dir = os.path.join(self.data_transformation_config.cache_dir, fingerprint)
+            if os.path.exists(cache_dir):
+                return
+            tmp_dir = f"{cache_dir}.tmp-{os.getpid()}"
+            for file_name, file_path in self.get_output_paths().items():
+                link_or_copy(file_path, os.path.join(tmp_dir, file_name))
+            artifact = {field: value for field, value in asdict(data_transformation_artifact).items()
+                        if not field.endswith("_path") and field not in ("fingerprint", "cache_hit")}
+            write_json_file(os.path.join(tmp_dir, DATA_TRANSFORMATION_CACHE_MANIFEST_FILE_NAME),
+                            {"fingerprint": fingerprint, "artifact": artifact})
+            try:
+                os.rename(tmp_dir, cache_dir)
+            except OSError:
+                # another run cached the same fingerprint first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            logging.info(f"Cached transformation {fingerprint} in {cache_dir}")
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+    def initiate_data_transformation(self) -> DataTransformationArtifact:
+        """
+        Executes transformation pipeline: preprocesses features, balances data,
+        and saves all outputs for model training.
+        """
+        try:
+            if not self.data_validation_artifact.validation_status:
+                raise Exception(self.data_validation_artifact.message)
 
-            smt = SMOTEENN(
-            sampling_strategy="minority",
-            smote=SMOTE(k_neighbors=1),
-            enn=EditedNearestNeighbours(n_neighbors=1)
-                )
+            logging.info("Starting data transformation...")
 
+            fingerprint = None
+            if self.data_transformation_config.use_cache:
+                fingerprint = self.get_fingerprint()
+                data_transformation_artifact = self.load_from_cache(fingerprint)
+                if data_transformation_artifact is not None:
+                    return data_transformation_artifact
 
+            preprocessor = self.get_data_transformer_object()
+            config = self.data_transformation_config
 
+            # Fit on the training split, it is the only full copy of the data held in memory
+            train_df = self.read_data(self.data_ingestion_artifact.trained_file_path)
+            input_feature_train_df = self.get_input_features(train_df)
+            target_feature_train_df = train_df[TARGET_COLUMN]
 
-            input_feature_train_final, target_feature_train_final = smt.fit_resample(
-             input_feature_train_arr, target_feature_train_df
-            )
-            input_feature_test_final, target_feature_test_final = smt.fit_resample(
-            input_feature_test_arr, target_feature_test_df
-            )
+            # Optional target mapping (uncomment if your target is string)
+            # target_feature_train_df = target_feature_train_df.replace(TargetValueMapping()._asdict())
 
-            logging.info("Applied SMOTEENN to handle class imbalance.")
+            # the target is passed so the Yeo-Johnson lambda subsample is stratified by quality
+            preprocessor.fit(input_feature_train_df, target_feature_train_df)
+            del train_df, input_feature_train_df, target_feature_train_df
+            save_object(config.transformed_object_file_path, preprocessor)
+
+            # Stream both splits through the fitted preprocessor into memory-mapped feature / target arrays
+            self.transform_to_memmap(preprocessor, self.data_ingestion_artifact.trained_file_path,
+                                     config.transformed_train_file_path, config.transformed_train_target_file_path)
+            transform_start = time.perf_counter()
+            n_test_rows, feature_width = self.transform_to_memmap(
+                preprocessor, self.data_ingestion_artifact.test_file_path,
+                config.transformed_test_file_path, config.transformed_test_target_file_path)
+            transform_seconds_per_row = (time.perf_counter() - transform_start) / max(n_test_rows, 1)
+            logging.info(f"Feature width {feature_width}, {self.transformer_plan['steps_per_row']} transform steps "
+                         f"and {transform_seconds_per_row * 1e6:.2f} us per row")
 
-            # Combine processed features with targets
-            train_arr = np.c_[input_feature_train_final, np.array(target_feature_train_final)]
-            test_arr = np.c_[input_feature_test_final, np.array(target_feature_test_final)]
+            logging.info("Applied preprocessing transformations successfully.")
 
-            # Save artifacts
-            save_object(self.data_transformation_config.transformed_object_file_path, preprocessor)
-            save_numpy_array_data(self.data_transformation_config.transformed_train_file_path, array=train_arr)
-            save_numpy_array_data(self.data_transformation_config.transformed_test_file_path, array=test_arr)
+            # Balance the classes of the training split (and of the test split only when asked for)
+            resampling_report = self.resample_arrays(config.transformed_train_file_path,
+                                                     config.transformed_train_target_file_path)
+            if config.resample_test:
+                self.resample_arrays(config.transformed_test_file_path, config.transformed_test_target_file_path)
+            self.save_benchmark_sample()
 
             logging.info("Saved preprocessor object and transformed arrays.")
 
@@ -203,7 +563,19 @@ class DataTransformation:
                 transformed_object_file_path=self.data_transformation_config.transformed_object_file_path,
                 transformed_train_file_path=self.data_transformation_config.transformed_train_file_path,
                 transformed_test_file_path=self.data_transformation_config.transformed_test_file_path,
+                transformed_train_target_file_path=self.data_transformation_config.transformed_train_target_file_path,
+                transformed_test_target_file_path=self.data_transformation_config.transformed_test_target_file_path,
+                feature_width=feature_width,
+                transform_steps_per_row=self.transformer_plan["steps_per_row"],
+                transform_seconds_per_row=transform_seconds_per_row,
+                resampling_seconds=resampling_report["seconds"],
+                resampled_train_rows=resampling_report["resampled_rows"],
+                fingerprint=fingerprint,
+                dtype=self.data_transformation_config.dtype,
+                benchmark_sample_file_path=self.data_transformation_config.benchmark_sample_file_path,
             )
+            if fingerprint is not None:
+                self.save_to_cache(fingerprint, data_transformation_artifact)
 
             logging.info("Data transformation complete.")
             return data_transformation_artifact
@@ -3,20 +3,15 @@ sys.path.append(os.getcwd())
 import json
 import sys
 
+import numpy as np
 import pandas as pd
- 
-
-
-from evidently.report import Report
-from evidently.metrics import DataDriftTable, DatasetDriftMetric
-
-
-
 from pandas import DataFrame
 
 from wine_quality.exception import custom_Exception
 from wine_quality.logger import logging
-from wine_quality.utils.main_utils import read_yaml_file, write_yaml_file
+from wine_quality.utils.main_utils import (read_yaml_file, write_json_file, get_schema_dtypes, read_dataframe,
+                                           iter_dataframe_chunks)
+from wine_quality.utils.drift_engine import DriftEngine
 from wine_quality.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
 from wine_quality.entity.config_entity import DataValidationConfig
 from wine_quality.constants import SCHEMA_FILE_PATH
@@ -35,56 +30,110 @@ class DataValidation:
         except Exception as e:
             raise custom_Exception(e,sys)
 
-    def validate_number_of_columns(self, dataframe: DataFrame) -> bool:
+    def _validate_chunk(self, chunk: DataFrame, report: dict, row_offset: int) -> None:
         """
-        Method Name :   validate_number_of_columns
-        Description :   This method validates the number of columns
-        
-        Output      :   Returns bool value based on validation results
-        On Failure  :   Write an exception log and then raise an exception
+        one vectorized pass over a chunk: dtype, null, range and domain violations of every schema column
+        are added to the report, offending rows are sampled
         """
-        try:
-            status = len(dataframe.columns) == len(self._schema_config["columns"])
-            logging.info(f"Is required column present: [{status}]")
-            return status
-        except Exception as e:
-            raise custom_Exception(e, sys)
-
-    def is_column_exist(self, df: DataFrame) -> bool:
+        invalid_rows = np.zeros(len(chunk), dtype=bool)
+        value_ranges = self._schema_config.get("value_ranges", {})
+        domain_value = self._schema_config.get("domain_value", {})
+
+        for column, dtype in report["_expected_dtypes"].items():
+            if column not in chunk.columns:
+                continue
+            series = chunk[column]
+            if dtype.kind in "iuf":
+                if series.dtype.kind in "iuf":
+                    values = series.to_numpy(dtype=np.float64)
+                    bad_type = np.zeros(len(chunk), dtype=bool)
+                else:
+                    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+                    bad_type = np.isnan(values) & series.notna().to_numpy()
+                is_null = np.isnan(values) & ~bad_type
+                if dtype.kind in "iu":
+                    bad_type |= ~np.isnan(values) & (values != np.floor(values))
+            else:
+                values = series.to_numpy()
+                is_null = series.isna().to_numpy()
+                bad_type = np.zeros(len(chunk), dtype=bool)
+            has_value = ~is_null & ~bad_type
+
+            out_of_range = np.zeros(len(chunk), dtype=bool)
+            if column in value_ranges:
+                lower, upper = value_ranges[column]
+                with np.errstate(invalid="ignore"):
+                    out_of_range = has_value & ((values < lower) | (values > upper))
+            out_of_domain = np.zeros(len(chunk), dtype=bool)
+            if column in domain_value:
+                out_of_domain = has_value & ~np.isin(values, domain_value[column])
+
+            counts = report["violations"][column]
+            counts["dtype"] += int(bad_type.sum())
+            counts["null"] += int(is_null.sum())
+            counts["range"] += int(out_of_range.sum())
+            counts["domain"] += int(out_of_domain.sum())
+            invalid_rows |= bad_type | is_null | out_of_range | out_of_domain
+
+        report["rows"] += len(chunk)
+        report["invalid_rows"] += int(invalid_rows.sum())
+        n_samples = self.data_validation_config.sample_invalid_rows - len(report["sample_invalid_rows"])
+        if n_samples > 0 and invalid_rows.any():
+            sample = chunk[invalid_rows].head(n_samples)
+            sample = sample.astype(object).where(sample.notna(), None)
+            for row, record in zip(np.flatnonzero(invalid_rows)[:n_samples], sample.to_dict(orient="records")):
+                report["sample_invalid_rows"].append({"row": int(row_offset + row), "values": record})
+
+    def validate_file(self, file_path: str) -> dict:
         """
-        Method Name :   is_column_exist
-        Description :   This method validates the existence of a numerical and categorical columns
+        Method Name :   validate_file
+        Description :   This method streams the file in chunks and checks columns, dtypes, nulls,
+                        value_ranges and domain_value of schema.yaml in a single pass with constant memory.
+                        Columns outside the schema do not fail the validation: the schema drop_columns are
+                        ignored, any other extra column is logged as a warning and listed in the report.
+                        Invalid rows are counted, the file only fails when their share is above
+                        max_invalid_row_share (or a schema column is missing)
         
-        Output      :   Returns bool value based on validation results
+        Output      :   Returns the validation report, report["status"] is the validation result
         On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            dataframe_columns = df.columns
-            missing_numerical_columns = []
-            missing_categorical_columns = []
-            for column in self._schema_config["numerical_columns"]:
-                if column not in dataframe_columns:
-                    missing_numerical_columns.append(column)
-
-            if len(missing_numerical_columns)>0:
-                logging.info(f"Missing numerical column: {missing_numerical_columns}")
-
-
-            for column in self._schema_config["categorical_columns"]:
-                if column not in dataframe_columns:
-                    missing_categorical_columns.append(column)
-
-            if len(missing_categorical_columns)>0:
-                logging.info(f"Missing categorical column: {missing_categorical_columns}")
-
-            return False if len(missing_categorical_columns)>0 or len(missing_numerical_columns)>0 else True
+            expected_dtypes = get_schema_dtypes(self._schema_config)
+            drop_columns = set(self._schema_config.get("drop_columns", []))
+            report = {"file_path": file_path, "rows": 0, "missing_columns": [], "unexpected_columns": [],
+                      "violations": {column: {"dtype": 0, "null": 0, "range": 0, "domain": 0}
+                                     for column in expected_dtypes},
+                      "invalid_rows": 0, "sample_invalid_rows": [], "_expected_dtypes": expected_dtypes}
+
+            for i, chunk in enumerate(iter_dataframe_chunks(file_path, chunk_size=self.data_validation_config.chunk_size)):
+                if i == 0:
+                    report["missing_columns"] = [column for column in expected_dtypes if column not in chunk.columns]
+                    report["unexpected_columns"] = [column for column in chunk.columns
+                                                    if column not in expected_dtypes and column not in drop_columns]
+                    if len(report["unexpected_columns"]) > 0:
+                        logging.warning(f"Unexpected columns {report['unexpected_columns']} in {file_path}, "
+                                        f"they are not validated")
+                self._validate_chunk(chunk, report, row_offset=report["rows"])
+
+            del report["_expected_dtypes"]
+            report["violations"] = {column: counts for column, counts in report["violations"].items()
+                                    if any(counts.values())}
+            report["invalid_row_share"] = report["invalid_rows"] / report["rows"] if report["rows"] else 0.0
+            report["status"] = (len(report["missing_columns"]) == 0
+                                and report["invalid_row_share"] <= self.data_validation_config.max_invalid_row_share)
+            if report["invalid_rows"] > 0:
+                logging.warning(f"{report['invalid_rows']} invalid rows ({report['invalid_row_share']:.2%}) in "
+                                f"{file_path}: {report['violations']}")
+            logging.info(f"Validated {file_path}: {report['rows']} rows, {report['invalid_rows']} invalid, "
+                         f"missing columns {report['missing_columns']}, unexpected columns {report['unexpected_columns']}")
+            return report
         except Exception as e:
             raise custom_Exception(e, sys) from e
 
     @staticmethod
-    def read_data(file_path) -> DataFrame:
+    def read_data(file_path, columns=None) -> DataFrame:
         try:
-            return pd.read_csv(file_path)
+            return read_dataframe(file_path, columns=columns, memory_map=True)
         except Exception as e:
             raise custom_Exception(e, sys)
 
@@ -99,19 +148,16 @@ class DataValidation:
   
 
         try:
-                report = Report(metrics=[
-                    DatasetDriftMetric(),
-                ])
-
-                report.run(reference_data=reference_df, current_data=current_df)
+                drift_engine = DriftEngine(drift_share=self.data_validation_config.drift_share,
+                                           max_workers=self.data_validation_config.drift_workers)
+                drift_report = drift_engine.run(reference_df=reference_df, current_df=current_df)
 
-                # Save report object as JSON
-                json_report = report.as_dict()
-                write_yaml_file(file_path=self.data_validation_config.drift_report_file_path, content=json_report)
+                # Save compact drift summary as JSON
+                write_json_file(file_path=self.data_validation_config.drift_report_file_path, content=drift_report)
 
-                n_features = json_report["metrics"][0]["result"]["number_of_columns"]
-                n_drifted_features = json_report["metrics"][0]["result"]["number_of_drifted_columns"]
-                drift_status = json_report["metrics"][0]["result"]["dataset_drift"]
+                n_features = drift_report["number_of_columns"]
+                n_drifted_features = drift_report["number_of_drifted_columns"]
+                drift_status = drift_report["dataset_drift"]
 
                 logging.info(f"{n_drifted_features}/{n_features} drift detected.")
 
@@ -127,6 +173,30 @@ class DataValidation:
 
 
 
+    def create_reference_profile(self, reference_df: DataFrame) -> dict:
+        """
+        Method Name :   create_reference_profile
+        Description :   This method summarises the training data into a compact reference profile
+                        (quantiles, fixed-edge histograms, min/max, null counts and schema domain values)
+                        that later drift checks compare against instead of the training rows
+        
+        Output      :   Returns the profile dict, also saved as json
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            drift_engine = DriftEngine(drift_share=self.data_validation_config.drift_share,
+                                       max_workers=self.data_validation_config.drift_workers)
+            profile = drift_engine.build_profile(reference_df,
+                                                 domain_value=self._schema_config.get("domain_value", {}),
+                                                 n_quantiles=self.data_validation_config.profile_quantiles,
+                                                 n_bins=self.data_validation_config.profile_bins)
+            write_json_file(file_path=self.data_validation_config.reference_profile_file_path, content=profile)
+            logging.info(f"Saved reference profile: {self.data_validation_config.reference_profile_file_path}")
+            return profile
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+
     def initiate_data_validation(self) -> DataValidationArtifact:
         """
         Method Name :   initiate_data_validation
@@ -139,37 +209,37 @@ class DataValidation:
         try:
             validation_error_msg = ""
             logging.info("Starting data validation")
-            train_df, test_df = (DataValidation.read_data(file_path=self.data_ingestion_artifact.trained_file_path),
-                                 DataValidation.read_data(file_path=self.data_ingestion_artifact.test_file_path))
-
-            status = self.validate_number_of_columns(dataframe=train_df)
-            logging.info(f"All required columns present in training dataframe: {status}")
-            if not status:
-                validation_error_msg += f"Columns are missing in training dataframe."
-            status = self.validate_number_of_columns(dataframe=test_df)
-
-            logging.info(f"All required columns present in testing dataframe: {status}")
-            if not status:
-                validation_error_msg += f"Columns are missing in test dataframe."
-
-            status = self.is_column_exist(df=train_df)
 
-            if not status:
-                validation_error_msg += f"Columns are missing in training dataframe."
-            status = self.is_column_exist(df=test_df)
+            # single streamed pass per file: columns, dtypes, nulls, ranges and target domain
+            schema_report = {"train": self.validate_file(self.data_ingestion_artifact.trained_file_path),
+                             "test": self.validate_file(self.data_ingestion_artifact.test_file_path)}
+            write_json_file(file_path=self.data_validation_config.schema_report_file_path, content=schema_report)
 
-            if not status:
-                validation_error_msg += f"columns are missing in test dataframe."
+            for split_name, report in schema_report.items():
+                if len(report["missing_columns"]) > 0:
+                    validation_error_msg += f"Columns {report['missing_columns']} are missing in {split_name} dataframe. "
+                if report["invalid_row_share"] > self.data_validation_config.max_invalid_row_share:
+                    validation_error_msg += (f"{report['invalid_rows']} invalid rows ({report['invalid_row_share']:.2%}"
+                                             f" > {self.data_validation_config.max_invalid_row_share:.2%}) in "
+                                             f"{split_name} dataframe "
+                                             f"(see {self.data_validation_config.schema_report_file_path}). ")
 
             validation_status = len(validation_error_msg) == 0
 
             if validation_status:
+                # drift and the reference profile only look at the schema columns, extra csv columns are left out
+                schema_columns = list(get_schema_dtypes(self._schema_config))
+                train_df, test_df = (DataValidation.read_data(file_path=self.data_ingestion_artifact.trained_file_path,
+                                                              columns=schema_columns),
+                                     DataValidation.read_data(file_path=self.data_ingestion_artifact.test_file_path,
+                                                              columns=schema_columns))
                 drift_status = self.detect_dataset_drift(train_df, test_df)
                 if drift_status:
                     logging.info(f"Drift detected.")
                     validation_error_msg = "Drift detected"
                 else:
                     validation_error_msg = "Drift not detected"
+                self.create_reference_profile(train_df)
             else:
                 logging.info(f"Validation_error: {validation_error_msg}")
                 
@@ -177,7 +247,9 @@ class DataValidation:
             data_validation_artifact = DataValidationArtifact(
                 validation_status=validation_status,
                 message=validation_error_msg,
-                drift_report_file_path=self.data_validation_config.drift_report_file_path
+                drift_report_file_path=self.data_validation_config.drift_report_file_path,
+                reference_profile_file_path=(self.data_validation_config.reference_profile_file_path
+                                             if validation_status else None)
             )
 
             logging.info(f"Data validation artifact: {data_validation_artifact}")
@@ -7,6 +7,7 @@ from wine_quality.exception import custom_Exception
 from wine_quality.constants import TARGET_COLUMN, CURRENT_YEAR
 from wine_quality.logger import logging
 import sys
+import numpy as np
 import pandas as pd
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 from typing import Optional
@@ -14,6 +15,7 @@ from wine_quality.entity.S3_estimator import WineEstimator
 from dataclasses import dataclass
 from wine_quality.entity.estimator import combined_Model_preproccessing
 from wine_quality.entity.estimator import TargetValueMapping
+from wine_quality.utils.main_utils import read_dataframe, load_object
 
 @dataclass
 class EvaluateModelResponse:
@@ -21,6 +23,7 @@ class EvaluateModelResponse:
     best_model_r2_score: float
     is_model_accepted: bool
     difference: float
+    inference_dtype_r2_delta: float = None
 
 
 class ModelEvaluation:
@@ -54,6 +57,35 @@ class ModelEvaluation:
         except Exception as e:
             raise  custom_Exception(e,sys)
 
+    def get_inference_dtype_r2_delta(self, x: pd.DataFrame, y: pd.Series) -> Optional[float]:
+        """
+        Method Name :   get_inference_dtype_r2_delta
+        Description :   This function scores the trained model on the raw test split once with its inputs cast to
+                        the reduced precision dtype it was trained on and once with float64 inputs. Both scores come
+                        from the same float32-trained model, so the delta is the rounding of the inputs at inference
+                        only, not the cost of training in reduced precision. It is reported, not used for acceptance.
+
+        Output      :   absolute r2 difference, None when the model already runs in float64
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            trained_model = load_object(file_path=self.model_trainer_artifact.trained_model_file_path)
+            dtype = getattr(trained_model, "dtype", None)
+            if dtype is None or np.dtype(dtype) == np.float64:
+                return None
+            r2_policy = r2_score(y, trained_model.predict(x))
+            trained_model.dtype = None
+            r2_float64 = r2_score(y, trained_model.predict(x))
+            inference_dtype_r2_delta = abs(r2_policy - r2_float64)
+            if inference_dtype_r2_delta > self.model_eval_config.inference_dtype_r2_tolerance:
+                logging.warning(f"Casting the inputs to {dtype} changes the test r2 by {inference_dtype_r2_delta:.6f}, "
+                                f"more than {self.model_eval_config.inference_dtype_r2_tolerance}")
+            else:
+                logging.info(f"Casting the inputs to {dtype} changes the test r2 by {inference_dtype_r2_delta:.6f}")
+            return inference_dtype_r2_delta
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
     def evaluate_model(self) -> EvaluateModelResponse:
         """
         Method Name :   evaluate_model
@@ -64,12 +96,12 @@ class ModelEvaluation:
         On Failure  :   Write an exception log and then raise an exception
         """
         try:
-            test_df = pd.read_csv(self.data_ingestion_artifact.test_file_path)
+            test_df = read_dataframe(self.data_ingestion_artifact.test_file_path, memory_map=True)
 
             x, y = test_df.drop(TARGET_COLUMN, axis=1), test_df[TARGET_COLUMN]
 
-            # trained_model = load_object(file_path=self.model_trainer_artifact.trained_model_file_path)
             trained_model_r2_score = self.model_trainer_artifact.metric_artifact.r2_score
+            inference_dtype_r2_delta = self.get_inference_dtype_r2_delta(x, y)
             best_model_r2_score = None
             best_model = self.get_best_model()
 
@@ -82,7 +114,8 @@ class ModelEvaluation:
             result = EvaluateModelResponse(trained_model_r2_score=trained_model_r2_score,
             best_model_r2_score=best_model_r2_score,
             is_model_accepted=trained_model_r2_score > tmp_best_model_score,
-            difference=trained_model_r2_score - tmp_best_model_score
+            difference=trained_model_r2_score - tmp_best_model_score,
+            inference_dtype_r2_delta=inference_dtype_r2_delta
                                             )
             
                                             
@@ -108,7 +141,9 @@ class ModelEvaluation:
                 is_model_accepted=evaluate_model_response.is_model_accepted,
                 s3_model_path=s3_model_path,
                 trained_model_path=self.model_trainer_artifact.trained_model_file_path,
-                changed_accuracy=evaluate_model_response.difference)
+                changed_accuracy=evaluate_model_response.difference,
+                inference_dtype_r2_delta=evaluate_model_response.inference_dtype_r2_delta,
+                reference_profile_path=self.model_trainer_artifact.reference_profile_file_path)
 
             logging.info(f"Model evaluation artifact: {model_evaluation_artifact}")
             return model_evaluation_artifact
@@ -39,6 +39,13 @@ class ModelPusher:
             self.wine_estimator.save_model(from_file=self.model_evaluation_artifact.trained_model_path,
                                            remove=False)
 
+            if self.model_evaluation_artifact.reference_profile_path is not None:
+                logging.info("Uploading reference profile next to the model")
+                self.s3.upload_file(self.model_evaluation_artifact.reference_profile_path,
+                                    to_filename=self.model_pusher_config.s3_reference_profile_key_path,
+                                    bucket_name=self.model_pusher_config.bucket_name,
+                                    remove=False)
+
 
             model_pusher_artifact = ModelPusherArtifact(bucket_name=self.model_pusher_config.bucket_name,
                                                         s3_model_path=self.model_pusher_config.s3_model_key_path)
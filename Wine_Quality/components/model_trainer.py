@@ -1,7 +1,9 @@
 import sys, os
 sys.path.append(os.getcwd())
 import sys
-from typing import Tuple
+import shutil
+import math
+from typing import Callable, Optional, Tuple
 
 import numpy as np
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
@@ -11,12 +13,17 @@ import mlflow.sklearn
 from wine_quality.utils.model_factory import ModelFactory
 from wine_quality.exception import custom_Exception
 from wine_quality.logger import logging
-from wine_quality.utils.main_utils import load_numpy_array_data, load_object, save_object
+from wine_quality.utils.main_utils import (load_numpy_array_data, load_object, read_dataframe, save_object,
+                                           write_json_file)
+from wine_quality.utils.preprocessing import stratified_order
+from wine_quality.utils.serving_benchmark import benchmark_model
 from wine_quality.entity.config_entity import ModelTrainerConfig
 from wine_quality.entity.artifact_entity import (
     DataTransformationArtifact,
+    DataValidationArtifact,
     ModelTrainerArtifact,
     RegressionMetricArtifact,
+    ServingBenchmarkArtifact,
 )
 from wine_quality.entity.estimator import combined_Model_preproccessing
 
@@ -26,38 +33,139 @@ class ModelTrainer:
         self,
         data_transformation_artifact: DataTransformationArtifact,
         model_trainer_config: ModelTrainerConfig,
+        data_validation_artifact: Optional[DataValidationArtifact] = None,
     ):
         """
         ModelTrainer uses transformed data and model config to train
         the best regression model defined in model.yaml.
+        The reference profile from data validation (if any) is saved next to the model.
         """
         self.data_transformation_artifact = data_transformation_artifact
         self.model_trainer_config = model_trainer_config
+        self.data_validation_artifact = data_validation_artifact
+
+    def load_transformed_data(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Memory-map the transformed features and targets (x_train, y_train, x_test, y_test).
+        Arrays saved with the target as last feature column (older artifacts) are split in memory.
+        """
+        try:
+            artifact = self.data_transformation_artifact
+            if artifact.transformed_train_target_file_path is not None:
+                return (load_numpy_array_data(artifact.transformed_train_file_path, mmap_mode="r"),
+                        load_numpy_array_data(artifact.transformed_train_target_file_path, mmap_mode="r"),
+                        load_numpy_array_data(artifact.transformed_test_file_path, mmap_mode="r"),
+                        load_numpy_array_data(artifact.transformed_test_target_file_path, mmap_mode="r"))
+
+            train = load_numpy_array_data(file_path=artifact.transformed_train_file_path)
+            test = load_numpy_array_data(file_path=artifact.transformed_test_file_path)
+            return (np.ascontiguousarray(train[:, :-1]), train[:, -1],
+                    np.ascontiguousarray(test[:, :-1]), test[:, -1])
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+    def get_serving_benchmark(self, repeats: int) -> Optional[Callable[[object], dict]]:
+        """
+        Benchmark of a fitted model as it is served: preprocessor + model on the raw benchmark sample saved by data
+        transformation. None when the transformation artifact has no sample (older artifacts).
+        """
+        try:
+            artifact = self.data_transformation_artifact
+            if not artifact.benchmark_sample_file_path or not os.path.exists(artifact.benchmark_sample_file_path):
+                logging.info("No benchmark sample, the model is chosen on its score only")
+                return None
+            preprocessing_obj = load_object(file_path=artifact.transformed_object_file_path)
+            sample = read_dataframe(artifact.benchmark_sample_file_path)
+
+            def benchmark(model) -> dict:
+                served_model = combined_Model_preproccessing(preprocessing_object=preprocessing_obj,
+                                                             trained_model_object=model, dtype=artifact.dtype)
+                return benchmark_model(served_model, sample, repeats=repeats)
+
+            return benchmark
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+    def get_search_sample(self, x_train: np.ndarray, y_train: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Method Name :   get_search_sample
+        Description :   Rows of the training data the hyperparameter search runs on when search_sample_size is set
+                        (an int is a number of rows, a float in (0, 1) a fraction), drawn stratified by quality so
+                        every quality keeps its share of the rows.
+
+        Output      :   sorted row indices, None to search on every row
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            sample_size = self.model_trainer_config.search_sample_size
+            if sample_size is None:
+                return None
+            if isinstance(sample_size, float):
+                if not 0 < sample_size < 1:
+                    raise ValueError(f"search_sample_size fraction must be in (0, 1), got {sample_size}")
+                sample_size = math.ceil(sample_size * len(y_train))
+            if sample_size >= len(y_train):
+                logging.info(f"search_sample_size {sample_size} covers all {len(y_train)} rows, searching on all rows")
+                return None
+            order = stratified_order(y_train, random_state=self.model_trainer_config.search_sample_random_state)
+            logging.info(f"Searching on a stratified sample of {sample_size} of {len(y_train)} training rows")
+            return np.sort(order[:sample_size])
+        except Exception as e:
+            raise custom_Exception(e, sys) from e
+
+    @staticmethod
+    def get_regression_metrics(model, x_test: np.ndarray, y_test: np.ndarray) -> RegressionMetricArtifact:
+        y_pred = model.predict(x_test)
+        return RegressionMetricArtifact(
+            r2_score=r2_score(y_test, y_pred),
+            mae=mean_absolute_error(y_test, y_pred),
+            mse=mean_squared_error(y_test, y_pred),
+        )
 
     def get_model_object_and_report(
-        self, train: np.ndarray, test: np.ndarray
+        self, x_train: np.ndarray, y_train: np.ndarray, x_test: np.ndarray, y_test: np.ndarray
     ) -> Tuple[dict, RegressionMetricArtifact]:
         """
-        Run model selection & hyperparameter tuning using ModelFactory + GridSearchCV.
+        Run model selection & hyperparameter tuning using ModelFactory (every model, candidate and fold on one
+        process pool, fold scores already in the search cache are not recomputed), the search report with per task
+        wall times is written next to the trained model dir. x_train / y_train are the memory-mapped transformed
+        arrays, the search workers map the same files instead of receiving copies. The finalists are benchmarked for
+        serving latency and size and chosen on the selection section of model.yaml.
+        With search_sample_size the search runs on a stratified subsample only and the chosen configuration is
+        refitted on every row; the metrics of the configuration fitted on the subsample are reported next to the
+        full ones (search_sample_metric_artifact of the detail dict).
         Returns best model detail dict and regression metric artifact.
         """
         try:
-            logging.info("Starting model selection using ModelFactory (GridSearchCV).")
+            logging.info("Starting model selection using ModelFactory.")
 
             model_factory = ModelFactory(
-                model_config_path=self.model_trainer_config.model_config_file_path
+                model_config_path=self.model_trainer_config.model_config_file_path,
+                search_cache_file_path=(self.model_trainer_config.search_cache_file_path
+                                        if self.model_trainer_config.use_search_cache else None),
             )
 
-            x_train, y_train = train[:, :-1], train[:, -1]
-            x_test, y_test = test[:, :-1], test[:, -1]
-
+            sample_index = self.get_search_sample(x_train, y_train)
             best_model_detail = model_factory.get_best_model(
-                X=x_train,
-                y=y_train,
+                X=x_train if sample_index is None else x_train[sample_index],
+                y=y_train if sample_index is None else y_train[sample_index],
                 base_score=self.model_trainer_config.expected_accuracy,
+                benchmark=self.get_serving_benchmark(model_factory.get_selection_settings()["benchmark_repeats"]),
+                X_refit=None if sample_index is None else x_train,
+                y_refit=None if sample_index is None else y_train,
             )
 
+            best_model_detail["search_sample_metric_artifact"] = None
+            if best_model_detail["search_sample_model"] is not None:
+                sample_metric_artifact = self.get_regression_metrics(best_model_detail["search_sample_model"],
+                                                                     x_test, y_test)
+                best_model_detail["search_sample_metric_artifact"] = sample_metric_artifact
+                best_model_detail["search_report"]["search_sample"]["metrics"] = sample_metric_artifact.__dict__
+
             best_model = best_model_detail["best_model"]
+            write_json_file(self.model_trainer_config.search_report_file_path, best_model_detail["search_report"])
+            logging.info(f"Search took {best_model_detail['search_report']['search_seconds']}s, report: "
+                         f"{self.model_trainer_config.search_report_file_path}")
 
             #MLFlow logging
             with mlflow.start_run(run_name="wine_quality_training"):
@@ -69,17 +177,8 @@ class ModelTrainer:
                     "No suitable model found above base score.", sys
                 )
 
-            y_pred = best_model.predict(x_test)
-
-            r2 = r2_score(y_test, y_pred)
-            mae = mean_absolute_error(y_test, y_pred)
-            mse = mean_squared_error(y_test, y_pred)
-
-            metric_artifact = RegressionMetricArtifact(
-                r2_score=r2,
-                mae=mae,
-                mse=mse,
-            )
+            metric_artifact = self.get_regression_metrics(best_model, x_test, y_test)
+            r2, mae, mse = metric_artifact.r2_score, metric_artifact.mae, metric_artifact.mse
 
 
             # MLFlow logging Metric
@@ -87,6 +186,12 @@ class ModelTrainer:
             mlflow.log_metric("r2_score", metric_artifact.r2_score)
             mlflow.log_metric("mae", metric_artifact.mae)
             mlflow.log_metric("mse", metric_artifact.mse)
+            if best_model_detail["serving_benchmark"] is not None:
+                mlflow.log_metric("p99_latency_ms", best_model_detail["serving_benchmark"]["p99_latency_ms"])
+                mlflow.log_metric("model_mb", best_model_detail["serving_benchmark"]["model_mb"])
+            if best_model_detail["search_sample_metric_artifact"] is not None:
+                mlflow.log_metric("search_sample_r2_score", best_model_detail["search_sample_metric_artifact"].r2_score)
+                mlflow.log_metric("search_sample_rows", best_model_detail["search_report"]["search_sample"]["rows"])
 
 
             logging.info(
@@ -111,15 +216,10 @@ class ModelTrainer:
         try:
             logging.info("Entered initiate_model_trainer method of ModelTrainer class")
 
-            train_arr = load_numpy_array_data(
-                file_path=self.data_transformation_artifact.transformed_train_file_path
-            )
-            test_arr = load_numpy_array_data(
-                file_path=self.data_transformation_artifact.transformed_test_file_path
-            )
+            x_train, y_train, x_test, y_test = self.load_transformed_data()
 
             best_model_detail, metric_artifact = self.get_model_object_and_report(
-                train=train_arr, test=test_arr
+                x_train=x_train, y_train=y_train, x_test=x_test, y_test=y_test
             )
 
             if best_model_detail["best_score"] < self.model_trainer_config.expected_accuracy:
@@ -137,6 +237,7 @@ class ModelTrainer:
             final_model = combined_Model_preproccessing(
                 preprocessing_object=preprocessing_obj,
                 trained_model_object=best_model_detail["best_model"],
+                dtype=self.data_transformation_artifact.dtype,
             )
 
             logging.info("Created combined model (preprocessor + regressor).")
@@ -146,9 +247,25 @@ class ModelTrainer:
                 final_model,
             )
 
+            reference_profile_file_path = None
+            if self.data_validation_artifact is not None and self.data_validation_artifact.reference_profile_file_path:
+                reference_profile_file_path = self.model_trainer_config.reference_profile_file_path
+                shutil.copyfile(self.data_validation_artifact.reference_profile_file_path,
+                                reference_profile_file_path)
+                logging.info(f"Saved reference profile next to the model: {reference_profile_file_path}")
+
+            serving_benchmark = None
+            if best_model_detail["serving_benchmark"] is not None:
+                serving_benchmark = ServingBenchmarkArtifact(**best_model_detail["serving_benchmark"])
+
             model_trainer_artifact = ModelTrainerArtifact(
                 trained_model_file_path=self.model_trainer_config.trained_model_file_path,
                 metric_artifact=metric_artifact,
+                reference_profile_file_path=reference_profile_file_path,
+                search_report_file_path=self.model_trainer_config.search_report_file_path,
+                serving_benchmark=serving_benchmark,
+                search_sample_rows=(best_model_detail["search_report"]["search_sample"] or {}).get("rows"),
+                search_sample_metric_artifact=best_model_detail["search_sample_metric_artifact"],
             )
 
             logging.info(f"Model trainer artifact: {model_trainer_artifact}")
@@ -4,7 +4,7 @@ from wine_quality.exception import custom_Exception
 from wine_quality.logger import logging
 
 import os
-from wine_quality.constants import DATABASE_NAME, MONGODB_URL_KEY
+from wine_quality.constants import DATABASE_NAME, MONGODB_URL_KEY, MONGODB_MAX_POOL_SIZE, MONGODB_READ_PREFERENCE
 import pymongo
 import certifi
 
@@ -20,13 +20,21 @@ class MongoDBClient:
     """
     client = None
 
-    def __init__(self, database_name=DATABASE_NAME) -> None:
+    def __init__(self, database_name=DATABASE_NAME, max_pool_size: int = MONGODB_MAX_POOL_SIZE,
+                 read_preference: str = MONGODB_READ_PREFERENCE) -> None:
+        """
+        :param max_pool_size: size of the connection pool shared by every thread of the process
+        :param read_preference: e.g. secondaryPreferred so training exports do not load the primary
+        the client is created once per process, the pool settings of the first caller are used
+        """
         try:
             if MongoDBClient.client is None:
                 mongo_db_url = os.getenv(MONGODB_URL_KEY)
                 if mongo_db_url is None:
                     raise Exception(f"Environment key: {MONGODB_URL_KEY} is not set.")
-                MongoDBClient.client = pymongo.MongoClient(mongo_db_url, tlsCAFile=ca)
+                MongoDBClient.client = pymongo.MongoClient(mongo_db_url, tlsCAFile=ca,
+                                                           maxPoolSize=max_pool_size,
+                                                           readPreference=read_preference)
             self.client = MongoDBClient.client
             self.database = self.client[database_name]
             self.database_name = database_name
@@ -13,18 +13,22 @@ MONGODB_URL="mongodb+srv://ibraahim:<db_password>@cluster0.jp7zpdr.mongodb.net/?
 
 
 MONGODB_URL_KEY = "MONGODB_URL" 
+MONGODB_MAX_POOL_SIZE: int = 16
+MONGODB_READ_PREFERENCE: str = "secondaryPreferred"
 
 PIPELINE_NAME: str = "wine"
 ARTIFACT_DIR: str = "artifact"
 
 
-FILE_NAME: str = "wine.csv"
+FILE_NAME: str = "wine.parquet"
 
 
-TRAIN_FILE_NAME: str = "train.csv"
-TEST_FILE_NAME: str = "test.csv"
+TRAIN_FILE_NAME: str = "train.parquet"
+TEST_FILE_NAME: str = "test.parquet"
+PARQUET_COMPRESSION: str = "zstd"
 
 MODEL_FILE_NAME = "model.pkl"
+REFERENCE_PROFILE_FILE_NAME = "reference_profile.json"
 
 CURRENT_YEAR = date.today().year
 
@@ -50,34 +54,91 @@ DATA_INGESTION_DIR_NAME: str = "data_ingestion"
 DATA_INGESTION_FEATURE_STORE_DIR: str = "feature_store"
 DATA_INGESTION_INGESTED_DIR: str = "ingested"
 DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO: float = 0.2
+# fixed so unchanged data gives the same splits (and reuses the cached transformation)
+DATA_INGESTION_RANDOM_STATE: int = 42
+DATA_INGESTION_EXPORT_BATCH_SIZE: int = 10000
+DATA_INGESTION_EXPORT_PARTITIONS: int = 4
+DATA_INGESTION_EXPORT_WORKERS: int = 4
+DATA_INGESTION_PARTITION_FIELD: str = "_id"
+DATA_INGESTION_PARTITION_SAMPLES: int = 32
+DATA_INGESTION_WRITE_PARTITION_FILES: bool = False
+# opt-in: only export documents newer than the watermark of the persistent feature store (artifact/feature_store)
+DATA_INGESTION_INCREMENTAL: bool = False
+DATA_INGESTION_PERSISTENT_FEATURE_STORE_DIR: str = os.path.join(ARTIFACT_DIR, "feature_store")
+DATA_INGESTION_WATERMARK_FILE_NAME: str = "watermark.yaml"
+# server-side ingest stamp written by wine-load ($currentDate), the watermark of incremental exports. _id is not
+# usable: ObjectIds come from the clients and concurrent unordered batches do not commit in _id order
+DATA_INGESTION_WATERMARK_FIELD: str = "ingested_at"
+# incremental exports stop at server time - lag, writes still in flight at export time are left to the next run
+DATA_INGESTION_WATERMARK_LAG_SECONDS: int = 120
+DATA_INGESTION_COMPACTION_THRESHOLD: int = 10
+# a document upserted again by wine-load is exported again with its new stamp, the feature store keeps the newest
+# row per key (rows without the key are all kept)
+DATA_INGESTION_DEDUPE_KEY: str = "Id"
 
 """
 
 artifact/
+├── feature_store/            # persistent, shared by every run when ingestion is incremental
+│   ├── watermark.yaml
+│   └── part_<TIMESTAMP>.parquet  # + the dedupe key and the ingest stamp
+├── transformation_cache/     # persistent, transformation outputs by fingerprint (hardlinked into each run)
+│   └── <fingerprint>/
+├── search_cache/             # persistent, CV fold scores of the model search (SQLite)
+│   └── cv_results.sqlite
 └── data_ingestion/
     ├── feature_store/
-    │   └── raw_data.csv
+    │   └── wine.parquet      # the export, or the whole persistent feature store when incremental
     └── ingested/
-        ├── train.csv
-        └── test.csv
+        ├── train.parquet
+        └── test.parquet
 """
 
 
 
 
+"""
+Bulk loader (wine-load) related constant start with DATA_LOADER VAR NAME
+"""
+DATA_LOADER_BATCH_SIZE: int = 10000
+DATA_LOADER_WORKERS: int = 4
+DATA_LOADER_UPSERT_KEY: str = DATA_INGESTION_DEDUPE_KEY
+# every written document gets the server time of its write ($currentDate) in this field, the incremental export
+# watermark (the batches are written concurrently and unordered, so _id order is not commit order)
+DATA_LOADER_INGEST_STAMP_FIELD: str = DATA_INGESTION_WATERMARK_FIELD
+
+
+
+
 """
 Data Validation realted contant start with DATA_VALIDATION VAR NAME
 """
 DATA_VALIDATION_DIR_NAME: str = "data_validation"
 DATA_VALIDATION_DRIFT_REPORT_DIR: str = "drift_report"
-DATA_VALIDATION_DRIFT_REPORT_FILE_NAME: str = "report.yaml"
+DATA_VALIDATION_DRIFT_REPORT_FILE_NAME: str = "report.json"
+DATA_VALIDATION_DRIFT_SHARE: float = 0.5
+DATA_VALIDATION_DRIFT_WORKERS: int = 4
+DATA_VALIDATION_SCHEMA_REPORT_DIR: str = "schema_report"
+DATA_VALIDATION_SCHEMA_REPORT_FILE_NAME: str = "schema_report.json"
+DATA_VALIDATION_CHUNK_SIZE: int = 100000
+DATA_VALIDATION_SAMPLE_INVALID_ROWS: int = 10
+# share of rows with a null, a wrong type or a value outside value_ranges / domain_value (schema.yaml) above which
+# validation fails the pipeline, fewer invalid rows are only reported
+DATA_VALIDATION_MAX_INVALID_ROW_SHARE: float = 0.05
+DATA_VALIDATION_REFERENCE_PROFILE_DIR: str = "reference_profile"
+DATA_VALIDATION_PROFILE_QUANTILES: int = 101
+DATA_VALIDATION_PROFILE_BINS: int = 20
 
 
 
 """
 data_validation/
     drift_report/
-        report.yaml
+        report.json
+    schema_report/
+        schema_report.json
+    reference_profile/
+        reference_profile.json    # copied next to model.pkl by the model trainer
 
 """
 
@@ -88,6 +149,41 @@ Data Transformation ralated constant start with DATA_TRANSFORMATION VAR NAME
 DATA_TRANSFORMATION_DIR_NAME: str = "data_transformation"
 DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR: str = "transformed"
 DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
+# Yeo-Johnson lambdas are estimated on a stratified subsample, doubled until two rounds transform the data alike
+# (mean shift of the standardized columns <= tol),
+# None fits them on every row
+DATA_TRANSFORMATION_POWER_SUBSAMPLE: int = 100000
+DATA_TRANSFORMATION_POWER_TOL: float = 0.01
+DATA_TRANSFORMATION_POWER_N_JOBS: int = -1
+DATA_TRANSFORMATION_RANDOM_STATE: int = 42
+# columns listed in several schema groups: "dedupe" transforms each once and drops the duplicate outputs,
+# "reuse" keeps the layout but shares one Yeo-Johnson fit between num_features and transform_columns
+DATA_TRANSFORMATION_OVERLAP_MODE: str = "dedupe"
+# rows streamed through the fitted preprocessor into the memory-mapped feature / target arrays at a time
+DATA_TRANSFORMATION_CHUNK_SIZE: int = 100000
+# dtype of the transformed arrays and of the model inputs at inference; the preprocessor itself computes in float64
+DATA_TRANSFORMATION_DTYPE: str = "float32"
+# class rebalancing of the transformed data: "none", "smote", "enn" or "smoteenn", applied to the training split
+# only unless RESAMPLE_TEST. mode "exact" searches neighbours over all rows, "chunked" resamples stratified blocks of
+# RESAMPLING_CHUNK_SIZE rows independently (neighbours are approximated within a block), "auto" chunks when the split
+# is larger than one block. Rows above RESAMPLING_MAX_ROWS are kept as they are.
+DATA_TRANSFORMATION_RESAMPLING_STRATEGY: str = "smoteenn"
+DATA_TRANSFORMATION_RESAMPLE_TEST: bool = False
+DATA_TRANSFORMATION_RESAMPLING_MODE: str = "auto"
+DATA_TRANSFORMATION_RESAMPLING_CHUNK_SIZE: int = 50000
+DATA_TRANSFORMATION_RESAMPLING_MAX_ROWS: int = 2000000
+DATA_TRANSFORMATION_RESAMPLING_N_JOBS: int = -1
+DATA_TRANSFORMATION_SMOTE_K_NEIGHBORS: int = 1
+DATA_TRANSFORMATION_ENN_N_NEIGHBORS: int = 1
+# transformation outputs are cached across runs under a fingerprint of the input splits, schema.yaml, the
+# transformation config, the library versions and the source of the transformation modules
+DATA_TRANSFORMATION_USE_CACHE: bool = True
+DATA_TRANSFORMATION_CACHE_DIR: str = os.path.join(ARTIFACT_DIR, "transformation_cache")
+DATA_TRANSFORMATION_CACHE_MANIFEST_FILE_NAME: str = "manifest.json"
+# raw (untransformed) model inputs of random test split rows, the model trainer times predictions of the finalists
+# (preprocessor included) on them
+DATA_TRANSFORMATION_BENCHMARK_SAMPLE_FILE_NAME: str = "benchmark_sample.parquet"
+DATA_TRANSFORMATION_BENCHMARK_SAMPLE_ROWS: int = 1000
 
 
 
@@ -96,6 +192,9 @@ DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR: str = "transformed_object"
 ├── artifacts/
 │   └── data_transformation/
 │       ├── transformed/          # Final processed CSV/Numpy arrays/clean data
+│       │   ├── train.npy, test.npy                 # features, C-contiguous, DATA_TRANSFORMATION_DTYPE (float32)
+│       │   ├── train_target.npy, test_target.npy   # target, same dtype
+│       │   └── benchmark_sample.parquet            # raw test rows for the serving benchmark
 │       └── transformed_object/   # Pickle/scaler/encoder/model prep objects
 │
 └── (your code files...)
@@ -110,6 +209,15 @@ MODEL_TRAINER_TRAINED_MODEL_DIR: str = "trained_model"
 MODEL_TRAINER_TRAINED_MODEL_NAME: str = "model.pkl"
 MODEL_TRAINER_EXPECTED_SCORE: float = -10
 MODEL_TRAINER_MODEL_CONFIG_FILE_PATH: str = os.path.join("config", "model.yaml")
+MODEL_TRAINER_SEARCH_REPORT_FILE_NAME: str = "search_report.json"
+# CV fold scores of the model search are kept across runs, keyed on the estimator, its parameters, the folds and a
+# hash of the transformed training data, so reruns and grid edits only evaluate new points
+MODEL_TRAINER_USE_SEARCH_CACHE: bool = True
+MODEL_TRAINER_SEARCH_CACHE_FILE_PATH: str = os.path.join(ARTIFACT_DIR, "search_cache", "cv_results.sqlite")
+# rows the hyperparameter search runs on: None searches on every training row, an int is a number of rows and a float
+# in (0, 1) a fraction, drawn stratified by quality; only the chosen configuration is then refitted on every row
+MODEL_TRAINER_SEARCH_SAMPLE_SIZE = None
+MODEL_TRAINER_SEARCH_SAMPLE_RANDOM_STATE: int = 42
 
 
 
@@ -123,10 +231,21 @@ MODEL_TRAINER_MODEL_CONFIG_FILE_PATH: str = os.path.join("config", "model.yaml")
 MODEL EVALUATION related constants
 """
 MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE: float = 0.02
+# r2 change on the test split above which casting the inputs of the trained model to DATA_TRANSFORMATION_DTYPE at
+# inference (instead of feeding float64) is logged as a warning, reported only, it does not decide acceptance
+MODEL_EVALUATION_INFERENCE_DTYPE_R2_TOLERANCE: float = 0.001
 MODEL_BUCKET_NAME = "wine-project-s3-bucket"
 MODEL_PUSHER_S3_KEY = "model-registry"
 
 
 
+DRIFT_MONITOR_WINDOW_SECONDS: float = 60
+DRIFT_MONITOR_MIN_WINDOW_ROWS: int = 100
+# the prediction service retries loading the reference profile after this delay, doubled up to the max
+DRIFT_MONITOR_RETRY_SECONDS: float = 30
+DRIFT_MONITOR_MAX_RETRY_SECONDS: float = 600
+
+
+
 APP_HOST = "0.0.0.0"
 APP_PORT = 8080
\ No newline at end of file
@@ -1,10 +1,16 @@
 from wine_quality.exception import custom_Exception
-from wine_quality.constants import  DATABASE_NAME
+from wine_quality.constants import  DATABASE_NAME, SCHEMA_FILE_PATH, DATA_INGESTION_EXPORT_BATCH_SIZE
+from wine_quality.constants import DATA_INGESTION_PARTITION_FIELD, DATA_INGESTION_PARTITION_SAMPLES
+from wine_quality.logger import logging
 from wine_quality.configuration.mongo_db_connection import MongoDBClient
+from wine_quality.utils.main_utils import read_yaml_file, get_schema_dtypes
 import sys
-import pandas as pd 
+import math
+import pandas as pd
 
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+from typing import List, Optional
 import numpy as np
 
 
@@ -21,11 +27,92 @@ class winedata:
         """
         try:
             self.mongo_client = MongoDBClient(database_name=DATABASE_NAME)
+            self._schema_dtypes = get_schema_dtypes(read_yaml_file(file_path=SCHEMA_FILE_PATH))
         except Exception as e:
             raise custom_Exception(e,sys)
-        
 
-    def export_collection_as_dataframe(self,collection_name:str,database_name:Optional[str]=None)->pd.DataFrame:
+
+    def get_collection(self,collection_name:str,database_name:Optional[str]=None):
+        """
+        return the pymongo collection object from the default or the given database
+        """
+        if database_name is None:
+            return self.mongo_client.database[collection_name]
+        return self.mongo_client.client[database_name][collection_name]
+
+
+    def _export_dtypes(self,extra_columns:Optional[dict]=None)->dict:
+        return {**self._schema_dtypes, **(extra_columns or {})}
+
+
+    def get_projection(self,extra_columns:Optional[dict]=None)->dict:
+        """
+        server side projection built from schema.yaml: only the columns we keep are sent over the wire,
+        `_id` and the drop_columns never leave the database unless asked for in extra_columns (column -> dtype)
+        """
+        projection = {column: 1 for column in self._export_dtypes(extra_columns)}
+        projection.setdefault("_id", 0)
+        return projection
+
+
+    def _new_buffers(self,size:int,extra_columns:Optional[dict]=None)->dict:
+        return {column: np.empty(size, dtype=dtype) for column, dtype in self._export_dtypes(extra_columns).items()}
+
+
+    @staticmethod
+    def _grow_buffers(buffers:dict,size:int)->dict:
+        grown = {}
+        for column, buffer in buffers.items():
+            grown[column] = np.empty(size, dtype=buffer.dtype)
+            grown[column][:len(buffer)] = buffer
+        return grown
+
+
+    @staticmethod
+    def _is_missing(value)->bool:
+        return value is None or (isinstance(value, float) and math.isnan(value)) or value == "na"
+
+
+    @staticmethod
+    def _fill_buffers(cursor,buffers:dict,size:int,batch_size:int=DATA_INGESTION_EXPORT_BATCH_SIZE,start:int=0)->int:
+        """
+        write documents from the cursor into the typed column buffers one cursor batch at a time, from row `start`:
+        every column of the batch is collected in a list and assigned to its buffer slice with a single vectorized
+        conversion, returns the number of rows in the buffers (stops when they are full)
+        """
+        row = start
+        while row < size:
+            batch = list(islice(cursor, min(batch_size, size - row)))
+            if not batch:
+                break
+            end = row + len(batch)
+            for column in list(buffers):
+                values = [document.get(column) for document in batch]
+                missing = [i for i, value in enumerate(values) if winedata._is_missing(value)]
+                if missing:
+                    if buffers[column].dtype.kind in "iub":
+                        # integer columns can not hold NaN, upcast only this column
+                        buffers[column] = buffers[column].astype(np.float64)
+                    missing_value = np.datetime64("NaT") if buffers[column].dtype.kind == "M" else np.nan
+                    for i in missing:
+                        values[i] = missing_value
+                buffers[column][row:end] = np.asarray(values, dtype=buffers[column].dtype)
+            row = end
+        return row
+
+
+    @staticmethod
+    def _buffers_to_dataframe(buffers:dict,rows:int)->pd.DataFrame:
+        columns = {}
+        for column, buffer in buffers.items():
+            columns[column] = buffer if rows == len(buffer) else buffer[:rows].copy()
+        return pd.DataFrame(columns, copy=False)
+
+
+    def export_collection_as_dataframe(self,collection_name:str,database_name:Optional[str]=None,
+                                       query:Optional[dict]=None,
+                                       batch_size:int=DATA_INGESTION_EXPORT_BATCH_SIZE,
+                                       extra_columns:Optional[dict]=None)->pd.DataFrame:
         try:
             """
             export entire collectin as dataframe:
@@ -33,17 +120,124 @@ class winedata:
             """
 
             """
-            this place happpens the fetching and changing into dataframe
+            this place happpens the fetching and changing into dataframe,
+            the column buffers are allocated from the document count and filled in place
+            so there is no intermediate list of dicts
             """
-            if database_name is None:
-                collection = self.mongo_client.database[collection_name]
-            else:
-                collection = self.mongo_client[database_name][collection_name]
-
-            df = pd.DataFrame(list(collection.find()))
-            if "_id" and "id" in df.columns.to_list():
-                df = df.drop(columns=["_id","id"], axis=1)
-            df.replace({"na":np.nan},inplace=True)
-            return df
+            collection = self.get_collection(collection_name, database_name)
+            query = query or {}
+            capacity = max(collection.count_documents(query), 1)
+            buffers = self._new_buffers(capacity, extra_columns)
+            cursor = collection.find(query, projection=self.get_projection(extra_columns), batch_size=batch_size)
+            rows = self._fill_buffers(cursor, buffers, capacity, batch_size)
+            # the count and the read can see different states (writes in between, or another replica set member
+            # with secondaryPreferred): documents left in the cursor grow the buffers instead of being dropped
+            while rows == capacity:
+                pending = next(cursor, None)
+                if pending is None:
+                    break
+                capacity *= 2
+                buffers = self._grow_buffers(buffers, capacity)
+                cursor = chain([pending], cursor)
+                rows = self._fill_buffers(cursor, buffers, capacity, batch_size, start=rows)
+            return self._buffers_to_dataframe(buffers, rows)
+        except Exception as e:
+            raise custom_Exception(e,sys)
+
+
+    def get_max_value(self,collection_name:str,field:str,database_name:Optional[str]=None,query:Optional[dict]=None):
+        """
+        highest value of `field` in the collection (None when it is empty), used as ingestion high-water mark
+        """
+        try:
+            collection = self.get_collection(collection_name, database_name)
+            projection = {field: 1} if field == "_id" else {field: 1, "_id": 0}
+            for document in collection.find(query or {}, projection=projection).sort(field, -1).limit(1):
+                return document.get(field)
+            return None
+        except Exception as e:
+            raise custom_Exception(e,sys)
+
+
+    def get_server_time(self):
+        """
+        current time of the mongo server (naive UTC, as the dates pymongo returns), the clock of $currentDate stamps
+        """
+        try:
+            return self.mongo_client.client.admin.command("hello")["localTime"]
+        except Exception as e:
+            raise custom_Exception(e,sys)
+
+
+    def get_partition_bounds(self,collection_name:str,n_partitions:int,field:str=DATA_INGESTION_PARTITION_FIELD,
+                             database_name:Optional[str]=None,query:Optional[dict]=None,
+                             samples_per_partition:int=DATA_INGESTION_PARTITION_SAMPLES)->list:
+        """
+        find n_partitions - 1 split points on `field` by sampling it server side ($sample),
+        returns the sorted, de-duplicated split values
+        """
+        try:
+            collection = self.get_collection(collection_name, database_name)
+            pipeline = [
+                {"$match": query or {}},
+                {"$sample": {"size": n_partitions * samples_per_partition}},
+                {"$project": {field: 1} if field == "_id" else {field: 1, "_id": 0}},
+            ]
+            samples = sorted(document[field] for document in collection.aggregate(pipeline) if field in document)
+            if len(samples) == 0 or n_partitions < 2:
+                return []
+            bounds = []
+            for i in range(1, n_partitions):
+                value = samples[(i * len(samples)) // n_partitions]
+                if len(bounds) == 0 or value > bounds[-1]:
+                    bounds.append(value)
+            return bounds
+        except Exception as e:
+            raise custom_Exception(e,sys)
+
+
+    @staticmethod
+    def get_partition_queries(bounds:list,field:str=DATA_INGESTION_PARTITION_FIELD,query:Optional[dict]=None)->List[dict]:
+        """
+        turn split points into len(bounds) + 1 half open range queries [lower, upper) covering the whole collection
+        """
+        edges = [None] + list(bounds) + [None]
+        queries = []
+        for lower, upper in zip(edges[:-1], edges[1:]):
+            condition = {}
+            if lower is not None:
+                condition["$gte"] = lower
+            if upper is not None:
+                condition["$lt"] = upper
+            partition_query = {field: condition} if condition else {}
+            if query and partition_query:
+                partition_query = {"$and": [query, partition_query]}
+            elif query:
+                partition_query = query
+            queries.append(partition_query)
+        return queries
+
+
+    def export_collection_in_partitions(self,collection_name:str,n_partitions:int,max_workers:int,
+                                        field:str=DATA_INGESTION_PARTITION_FIELD,
+                                        database_name:Optional[str]=None,
+                                        query:Optional[dict]=None,
+                                        extra_columns:Optional[dict]=None)->List[pd.DataFrame]:
+        """
+        export the collection as n_partitions `field` ranges read concurrently,
+        every thread borrows its own connection from the shared MongoDBClient pool,
+        returns one dataframe per range in range order
+        """
+        try:
+            bounds = self.get_partition_bounds(collection_name, n_partitions, field=field,
+                                               database_name=database_name, query=query)
+            queries = self.get_partition_queries(bounds, field=field, query=query)
+            logging.info(f"Exporting {collection_name} as {len(queries)} partitions on {field} with {max_workers} workers")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(
+                    lambda partition_query: self.export_collection_as_dataframe(
+                        collection_name=collection_name, database_name=database_name, query=partition_query,
+                        extra_columns=extra_columns),
+                    queries))
         except Exception as e:
-            raise custom_Exception(e,sys)
\ No newline at end of file
+            raise custom_Exception(e,sys)
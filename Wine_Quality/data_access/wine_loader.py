@@ -0,0 +1,172 @@
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+from pymongo import ASCENDING, InsertOne, UpdateOne
+
+from wine_quality.exception import custom_Exception
+from wine_quality.logger import logging
+from wine_quality.configuration.mongo_db_connection import MongoDBClient
+from wine_quality.constants import (DATABASE_NAME, DATA_INGESTION_COLLECTION_NAME, DATA_INGESTION_WATERMARK_FIELD,
+                                    DATA_INGESTION_PARTITION_FIELD, DATA_LOADER_BATCH_SIZE, DATA_LOADER_WORKERS,
+                                    DATA_LOADER_UPSERT_KEY, DATA_LOADER_INGEST_STAMP_FIELD, MONGODB_MAX_POOL_SIZE)
+
+
+class WineLoader:
+    """
+    This class bulk loads a CSV/Parquet file into the wine mongo collection,
+    the file is streamed in batches and the batches are written by parallel workers
+
+    The batches are unordered and concurrent, so documents do not commit in _id order and a reader can see a
+    document whose _id is below ones committed later. Every document is therefore stamped with the server time of
+    its write in stamp_field, which incremental ingestion uses as its watermark together with a lag
+    (DATA_INGESTION_WATERMARK_LAG_SECONDS) longer than a batch takes to write. Upserts get $currentDate; inserts
+    are plain InsertOne stamped with the server clock (local clock + an offset measured once per loader) when the
+    batch is sent, so the stamp also precedes the commit.
+    """
+
+    def __init__(self, collection_name: str = DATA_INGESTION_COLLECTION_NAME, database_name: str = DATABASE_NAME,
+                 batch_size: int = DATA_LOADER_BATCH_SIZE, workers: int = DATA_LOADER_WORKERS,
+                 upsert_key: Optional[str] = None, stamp_field: str = DATA_LOADER_INGEST_STAMP_FIELD):
+        """
+        :param batch_size: rows per bulk_write call
+        :param workers: number of batches written concurrently
+        :param upsert_key: when set, rows are upserted on this field instead of inserted
+        :param stamp_field: field set to the server time of the write
+        """
+        try:
+            self.mongo_client = MongoDBClient(database_name=database_name,
+                                              max_pool_size=max(workers, MONGODB_MAX_POOL_SIZE))
+            self.collection = self.mongo_client.database[collection_name]
+            self.batch_size = batch_size
+            self.workers = workers
+            self.upsert_key = upsert_key
+            self.stamp_field = stamp_field
+            self._clock_offset = None
+        except Exception as e:
+            raise custom_Exception(e, sys)
+
+    @staticmethod
+    def iter_file_batches(file_path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+        """
+        stream a csv or parquet file as dataframes of at most batch_size rows
+        """
+        if file_path.endswith(".parquet"):
+            for record_batch in pq.ParquetFile(file_path).iter_batches(batch_size=batch_size):
+                yield record_batch.to_pandas()
+        else:
+            yield from pd.read_csv(file_path, chunksize=batch_size)
+
+    @staticmethod
+    def _utcnow() -> datetime:
+        # naive UTC, as the dates pymongo returns
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def server_now(self) -> datetime:
+        """
+        current server time from the local clock and the server clock offset, measured once per loader
+        so stamping an inserted batch costs no round trip
+        """
+        if self._clock_offset is None:
+            self._clock_offset = self.mongo_client.client.admin.command("hello")["localTime"] - self._utcnow()
+        return self._utcnow() + self._clock_offset
+
+    def write_batch(self, dataframe: pd.DataFrame) -> int:
+        """
+        write one batch, unordered so the server does not stop or serialise on individual documents,
+        every document gets the server time of its write in stamp_field; returns the number of rows written
+        """
+        documents = dataframe.to_dict(orient="records")
+        if self.upsert_key is None:
+            stamp = self.server_now()
+            operations = [InsertOne({**document, self.stamp_field: stamp}) for document in documents]
+        else:
+            # an updated document is stamped again, so the next incremental export picks it up
+            stamp = {"$currentDate": {self.stamp_field: True}}
+            operations = [UpdateOne({self.upsert_key: document[self.upsert_key]}, {"$set": document, **stamp},
+                                    upsert=True)
+                          for document in documents]
+        self.collection.bulk_write(operations, ordered=False)
+        return len(documents)
+
+    def create_indexes(self) -> list:
+        """
+        create the indexes used by upserts and by the incremental / range partitioned exports
+        (_id is always indexed)
+        """
+        try:
+            index_names = []
+            if self.upsert_key is not None:
+                index_names.append(self.collection.create_index([(self.upsert_key, ASCENDING)], unique=True))
+            for field in {DATA_INGESTION_WATERMARK_FIELD, DATA_INGESTION_PARTITION_FIELD, self.stamp_field}:
+                if field != "_id" and field != self.upsert_key:
+                    index_names.append(self.collection.create_index([(field, ASCENDING)]))
+            logging.info(f"Created indexes: {index_names}")
+            return index_names
+        except Exception as e:
+            raise custom_Exception(e, sys)
+
+    def load(self, file_path: str) -> dict:
+        """
+        Method Name :   load
+        Description :   This method streams file_path into the collection with parallel workers
+
+        Output      :   dict with rows, seconds and rows_per_second
+        On Failure  :   Write an exception log and then raise an exception
+        """
+        try:
+            logging.info(f"Loading {file_path} into {self.collection.full_name} "
+                         f"(batch_size={self.batch_size}, workers={self.workers}, upsert_key={self.upsert_key})")
+            start = time.perf_counter()
+            rows = 0
+            pending = set()
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for batch in self.iter_file_batches(file_path, self.batch_size):
+                    # keep at most 2 batches per worker in memory
+                    if len(pending) >= 2 * self.workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        rows += sum(future.result() for future in done)
+                    pending.add(executor.submit(self.write_batch, batch))
+                rows += sum(future.result() for future in pending)
+            seconds = time.perf_counter() - start
+            report = {"rows": rows, "seconds": round(seconds, 3),
+                      "rows_per_second": round(rows / seconds, 1) if seconds > 0 else float("inf")}
+            logging.info(f"Loaded {file_path}: {report}")
+            return report
+        except Exception as e:
+            raise custom_Exception(e, sys)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="wine-load",
+                                     description="Bulk load a CSV/Parquet file into the wine mongo collection")
+    parser.add_argument("file_path", help="csv or parquet file, e.g. Data/WineQT.csv")
+    parser.add_argument("--database", default=DATABASE_NAME)
+    parser.add_argument("--collection", default=DATA_INGESTION_COLLECTION_NAME)
+    parser.add_argument("--batch-size", type=int, default=DATA_LOADER_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DATA_LOADER_WORKERS)
+    parser.add_argument("--upsert", action="store_true",
+                        help="upsert rows by --upsert-key instead of inserting them (refresh an existing collection)")
+    parser.add_argument("--upsert-key", default=DATA_LOADER_UPSERT_KEY)
+    parser.add_argument("--create-indexes", action="store_true",
+                        help="create the indexes used by upserts, incremental and partitioned exports")
+    parser.add_argument("--drop", action="store_true", help="drop the collection before loading (reseed)")
+    args = parser.parse_args(argv)
+
+    loader = WineLoader(collection_name=args.collection, database_name=args.database, batch_size=args.batch_size,
+                        workers=args.workers, upsert_key=args.upsert_key if args.upsert else None)
+    if args.drop:
+        loader.collection.drop()
+    if args.create_indexes:
+        loader.create_indexes()
+    report = loader.load(args.file_path)
+    print(f"Loaded {report['rows']} rows in {report['seconds']}s ({report['rows_per_second']} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
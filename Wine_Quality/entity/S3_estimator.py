@@ -2,6 +2,7 @@ from wine_quality.cloud_storage.aws_storage import SimpleStorageService
 from wine_quality.exception import custom_Exception 
 from wine_quality.entity.estimator import combined_Model_preproccessing
 import sys
+import json
 from pandas import DataFrame
 
 
@@ -45,6 +46,20 @@ class WineEstimator:
 
         # return self.s3.load_model(self.model_path,bucket_name=self.bucket_name)
 
+    def load_reference_profile(self,profile_path)->dict:
+        """
+        Load the reference profile saved next to the model in the bucket
+        :param profile_path: Location of the profile json in bucket
+        :return: profile dict
+        """
+        try:
+            if not self.s3.s3_key_path_available(bucket_name=self.bucket_name, s3_key=profile_path):
+                raise Exception(f"Reference profile not found in S3 at path: {profile_path}")
+            file_object = self.s3.get_file_object(profile_path, bucket_name=self.bucket_name)
+            return json.loads(self.s3.read_object(file_object))
+        except Exception as e:
+            raise custom_Exception(e, sys)
+
     def save_model(self,from_file,remove:bool=False)->None:
         """
         Save the model to the model_path
@@ -20,6 +20,7 @@ class DataValidationArtifact:
     validation_status:bool
     message: str
     drift_report_file_path: str
+    reference_profile_file_path: str = None
 
 
 
@@ -28,6 +29,17 @@ class DataTransformationArtifact:
     transformed_object_file_path:str 
     transformed_train_file_path:str
     transformed_test_file_path:str
+    feature_width:int = None
+    transform_steps_per_row:int = None
+    transform_seconds_per_row:float = None
+    transformed_train_target_file_path:str = None
+    transformed_test_target_file_path:str = None
+    resampling_seconds:float = None
+    resampled_train_rows:int = None
+    fingerprint:str = None
+    cache_hit:bool = False
+    dtype:str = "float64"
+    benchmark_sample_file_path:str = None
 
 
 
@@ -41,10 +53,26 @@ class RegressionMetricArtifact:
 
 
 
+@dataclass
+class ServingBenchmarkArtifact:
+    p50_latency_ms: float       # single row predict, preprocessor included
+    p99_latency_ms: float
+    batch_rows: int
+    batch_latency_ms: float     # one predict call on batch_rows rows
+    rows_per_second: float
+    model_mb: float             # pickled preprocessor + model
+
+
+
 @dataclass
 class ModelTrainerArtifact:
     trained_model_file_path:str 
     metric_artifact: RegressionMetricArtifact
+    reference_profile_file_path: str = None
+    search_report_file_path: str = None
+    serving_benchmark: ServingBenchmarkArtifact = None
+    search_sample_rows: int = None      # rows the search ran on when it ran on a subsample
+    search_sample_metric_artifact: RegressionMetricArtifact = None   # chosen params fitted on the subsample only
     
 
 
@@ -54,6 +82,8 @@ class ModelEvaluationArtifact:
     changed_accuracy:float
     s3_model_path:str 
     trained_model_path:str
+    reference_profile_path: str = None
+    inference_dtype_r2_delta: float = None
 
 
 
@@ -4,6 +4,7 @@ from wine_quality.exception import custom_Exception
 from wine_quality.constants import *
 from datetime import datetime
 from dataclasses import dataclass
+from typing import Optional, Union
 
 TIMESTAMP = datetime.now().strftime("%m_%d_%Y_%H_%M_%S")
 
@@ -22,7 +23,19 @@ class DataIngestionConfig:
     training_file_path: str = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TRAIN_FILE_NAME)
     testing_file_path: str = os.path.join(data_ingestion_dir, DATA_INGESTION_INGESTED_DIR, TEST_FILE_NAME)
     train_test_split_ratio: float = DATA_INGESTION_TRAIN_TEST_SPLIT_RATIO
+    random_state: int = DATA_INGESTION_RANDOM_STATE
     collection_name: str = DATA_INGESTION_COLLECTION_NAME
+    export_partitions: int = DATA_INGESTION_EXPORT_PARTITIONS
+    export_workers: int = DATA_INGESTION_EXPORT_WORKERS
+    partition_field: str = DATA_INGESTION_PARTITION_FIELD
+    write_partition_files: bool = DATA_INGESTION_WRITE_PARTITION_FILES
+    incremental: bool = DATA_INGESTION_INCREMENTAL
+    persistent_feature_store_dir: str = DATA_INGESTION_PERSISTENT_FEATURE_STORE_DIR
+    watermark_file_path: str = os.path.join(DATA_INGESTION_PERSISTENT_FEATURE_STORE_DIR, DATA_INGESTION_WATERMARK_FILE_NAME)
+    watermark_field: str = DATA_INGESTION_WATERMARK_FIELD
+    watermark_lag_seconds: int = DATA_INGESTION_WATERMARK_LAG_SECONDS
+    compaction_threshold: int = DATA_INGESTION_COMPACTION_THRESHOLD
+    dedupe_key: Optional[str] = DATA_INGESTION_DEDUPE_KEY
 
 
 
@@ -32,26 +45,70 @@ class DataValidationConfig:
     data_validation_dir: str = os.path.join(training_pipeline_config.artifact_dir, DATA_VALIDATION_DIR_NAME)
     drift_report_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_DRIFT_REPORT_DIR,
                                                DATA_VALIDATION_DRIFT_REPORT_FILE_NAME)
+    schema_report_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_SCHEMA_REPORT_DIR,
+                                                DATA_VALIDATION_SCHEMA_REPORT_FILE_NAME)
+    chunk_size: int = DATA_VALIDATION_CHUNK_SIZE
+    sample_invalid_rows: int = DATA_VALIDATION_SAMPLE_INVALID_ROWS
+    max_invalid_row_share: float = DATA_VALIDATION_MAX_INVALID_ROW_SHARE
+    drift_share: float = DATA_VALIDATION_DRIFT_SHARE
+    drift_workers: int = DATA_VALIDATION_DRIFT_WORKERS
+    reference_profile_file_path: str = os.path.join(data_validation_dir, DATA_VALIDATION_REFERENCE_PROFILE_DIR,
+                                                    REFERENCE_PROFILE_FILE_NAME)
+    profile_quantiles: int = DATA_VALIDATION_PROFILE_QUANTILES
+    profile_bins: int = DATA_VALIDATION_PROFILE_BINS
     
 
 @dataclass
 class DataTransformationConfig:
     data_transformation_dir: str = os.path.join(training_pipeline_config.artifact_dir, DATA_TRANSFORMATION_DIR_NAME)
     transformed_train_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
-                                                    TRAIN_FILE_NAME.replace("csv", "npy"))
+                                                    TRAIN_FILE_NAME.replace("parquet", "npy"))
     transformed_test_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
-                                                   TEST_FILE_NAME.replace("csv", "npy"))
+                                                   TEST_FILE_NAME.replace("parquet", "npy"))
+    transformed_train_target_file_path: str = os.path.join(data_transformation_dir,
+                                                           DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                           TRAIN_FILE_NAME.replace(".parquet", "_target.npy"))
+    transformed_test_target_file_path: str = os.path.join(data_transformation_dir,
+                                                          DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                          TEST_FILE_NAME.replace(".parquet", "_target.npy"))
     transformed_object_file_path: str = os.path.join(data_transformation_dir,
                                                      DATA_TRANSFORMATION_TRANSFORMED_OBJECT_DIR,
                                                      PREPROCSSING_OBJECT_FILE_NAME)
+    benchmark_sample_file_path: str = os.path.join(data_transformation_dir, DATA_TRANSFORMATION_TRANSFORMED_DATA_DIR,
+                                                   DATA_TRANSFORMATION_BENCHMARK_SAMPLE_FILE_NAME)
+    benchmark_sample_rows: int = DATA_TRANSFORMATION_BENCHMARK_SAMPLE_ROWS
+    power_subsample: int = DATA_TRANSFORMATION_POWER_SUBSAMPLE
+    power_tol: float = DATA_TRANSFORMATION_POWER_TOL
+    power_n_jobs: int = DATA_TRANSFORMATION_POWER_N_JOBS
+    random_state: int = DATA_TRANSFORMATION_RANDOM_STATE
+    overlap_mode: str = DATA_TRANSFORMATION_OVERLAP_MODE
+    chunk_size: int = DATA_TRANSFORMATION_CHUNK_SIZE
+    dtype: str = DATA_TRANSFORMATION_DTYPE
+    resampling_strategy: str = DATA_TRANSFORMATION_RESAMPLING_STRATEGY
+    resample_test: bool = DATA_TRANSFORMATION_RESAMPLE_TEST
+    resampling_mode: str = DATA_TRANSFORMATION_RESAMPLING_MODE
+    resampling_chunk_size: int = DATA_TRANSFORMATION_RESAMPLING_CHUNK_SIZE
+    resampling_max_rows: int = DATA_TRANSFORMATION_RESAMPLING_MAX_ROWS
+    resampling_n_jobs: int = DATA_TRANSFORMATION_RESAMPLING_N_JOBS
+    smote_k_neighbors: int = DATA_TRANSFORMATION_SMOTE_K_NEIGHBORS
+    enn_n_neighbors: int = DATA_TRANSFORMATION_ENN_N_NEIGHBORS
+    use_cache: bool = DATA_TRANSFORMATION_USE_CACHE
+    cache_dir: str = DATA_TRANSFORMATION_CACHE_DIR
     
 
 @dataclass
 class ModelTrainerConfig:
     model_trainer_dir: str = os.path.join(training_pipeline_config.artifact_dir, MODEL_TRAINER_DIR_NAME)
     trained_model_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR, MODEL_FILE_NAME)
+    reference_profile_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_TRAINED_MODEL_DIR,
+                                                    REFERENCE_PROFILE_FILE_NAME)
+    search_report_file_path: str = os.path.join(model_trainer_dir, MODEL_TRAINER_SEARCH_REPORT_FILE_NAME)
     expected_accuracy: float = MODEL_TRAINER_EXPECTED_SCORE
     model_config_file_path: str = MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
+    use_search_cache: bool = MODEL_TRAINER_USE_SEARCH_CACHE
+    search_cache_file_path: str = MODEL_TRAINER_SEARCH_CACHE_FILE_PATH
+    search_sample_size: Optional[Union[int, float]] = MODEL_TRAINER_SEARCH_SAMPLE_SIZE
+    search_sample_random_state: int = MODEL_TRAINER_SEARCH_SAMPLE_RANDOM_STATE
 
 
 
@@ -59,6 +116,7 @@ class ModelTrainerConfig:
 @dataclass
 class ModelEvaluationConfig:
     changed_threshold_score: float = MODEL_EVALUATION_CHANGED_THRESHOLD_SCORE
+    inference_dtype_r2_tolerance: float = MODEL_EVALUATION_INFERENCE_DTYPE_R2_TOLERANCE
     bucket_name: str = MODEL_BUCKET_NAME
     s3_model_key_path: str = MODEL_FILE_NAME
 
@@ -69,10 +127,12 @@ class ModelEvaluationConfig:
 class ModelPusherConfig:
     bucket_name: str = MODEL_BUCKET_NAME
     s3_model_key_path: str = MODEL_FILE_NAME
+    s3_reference_profile_key_path: str = REFERENCE_PROFILE_FILE_NAME
 
 
 
 @dataclass
 class wine_PredictorConfig:
     model_file_path: str = MODEL_FILE_NAME
-    model_bucket_name: str = MODEL_BUCKET_NAME
\ No newline at end of file
+    model_bucket_name: str = MODEL_BUCKET_NAME
+    reference_profile_file_path: str = REFERENCE_PROFILE_FILE_NAME
\ No newline at end of file
@@ -22,13 +22,15 @@ class TargetValueMapping:
 
 
 class combined_Model_preproccessing:
-    def __init__(self, preprocessing_object: Pipeline, trained_model_object: object):
+    def __init__(self, preprocessing_object: Pipeline, trained_model_object: object, dtype: str = None):
         """
         :param preprocessing_object: Input Object of preprocesser
         :param trained_model_object: Input Object of trained model 
+        :param dtype: dtype the model was trained on, transformed features are cast to it (None keeps float64)
         """
         self.preprocessing_object = preprocessing_object
         self.trained_model_object = trained_model_object
+        self.dtype = dtype
 
     def predict(self, dataframe: DataFrame) -> DataFrame:
         """
@@ -42,6 +44,10 @@ class combined_Model_preproccessing:
             logging.info("Using the trained model to get predictions")
 
             transformed_feature = self.preprocessing_object.transform(dataframe)
+            # models pickled before the dtype policy have no dtype attribute
+            dtype = getattr(self, "dtype", None)
+            if dtype is not None:
+                transformed_feature = transformed_feature.astype(dtype, copy=False)
 
             logging.info("Used the trained model to get predictions")
             return self.trained_model_object.predict(transformed_feature)
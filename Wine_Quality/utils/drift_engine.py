@@ -0,0 +1,285 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pandas import DataFrame, Series
+from scipy import stats
+from scipy.spatial.distance import jensenshannon
+
+
+class DriftEngine:
+    """
+    Column-wise data drift between a reference and a current dataframe, computed with NumPy on sorted / binned
+    arrays. The per-column test and the dataset decision follow the defaults of Evidently's DatasetDriftMetric:
+
+    - reference <= 1000 rows: KS (numeric), chi-square (<= 5 values) or z-test (2 values), drift when p < 0.05
+    - reference >  1000 rows: normed Wasserstein (numeric) or Jensen-Shannon (<= 5 values), drift when > 0.1
+    - dataset drift when the share of drifted columns >= drift_share
+
+    KS statistic, PSI and normed Wasserstein distance are reported for every numeric column.
+
+    build_profile summarises a reference dataframe (quantiles, fixed-edge histograms, min/max, nulls, domain values)
+    into a small json profile, compare_to_profile / compare_bin_counts check current data against it without
+    the reference rows.
+    """
+
+    SMALL_REFERENCE_SIZE = 1000
+    CATEGORICAL_MAX_VALUES = 5
+    P_VALUE_THRESHOLD = 0.05
+    DISTANCE_THRESHOLD = 0.1
+    N_BINS = 10
+    EMPTY_BIN_SHARE = 0.0001
+    PSI_THRESHOLD = 0.2
+    PROFILE_QUANTILES = 101
+    PROFILE_BINS = 20
+
+    def __init__(self, drift_share: float = 0.5, max_workers: int = 4):
+        self.drift_share = drift_share
+        self.max_workers = max_workers
+
+    @staticmethod
+    def ks_statistic(reference_sorted: np.ndarray, current_sorted: np.ndarray) -> float:
+        """Two sample KS statistic from already sorted arrays."""
+        values = np.concatenate([reference_sorted, current_sorted])
+        cdf_reference = np.searchsorted(reference_sorted, values, side="right") / len(reference_sorted)
+        cdf_current = np.searchsorted(current_sorted, values, side="right") / len(current_sorted)
+        return float(np.max(np.abs(cdf_reference - cdf_current)))
+
+    @staticmethod
+    def wasserstein_distance(reference_sorted: np.ndarray, current_sorted: np.ndarray) -> float:
+        """First Wasserstein distance, the area between the two empirical CDFs, from already sorted arrays."""
+        values = np.sort(np.concatenate([reference_sorted, current_sorted]))
+        deltas = np.diff(values)
+        cdf_reference = np.searchsorted(reference_sorted, values[:-1], side="right") / len(reference_sorted)
+        cdf_current = np.searchsorted(current_sorted, values[:-1], side="right") / len(current_sorted)
+        return float(np.sum(np.abs(cdf_reference - cdf_current) * deltas))
+
+    @classmethod
+    def psi(cls, reference_sorted: np.ndarray, current_sorted: np.ndarray, n_bins: int = N_BINS) -> float:
+        """Population stability index on reference quantile bins."""
+        edges = np.unique(np.quantile(reference_sorted, np.linspace(0, 1, n_bins + 1)))
+        if len(edges) < 2:
+            return 0.0
+        reference_share = cls._bin_shares(reference_sorted, edges)
+        current_share = cls._bin_shares(current_sorted, edges)
+        return float(np.sum((current_share - reference_share) * np.log(current_share / reference_share)))
+
+    @staticmethod
+    def bin_counts(values_sorted: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        """Histogram of sorted values on len(edges) - 1 bins, values outside the edges go to the first / last bin."""
+        # interior edges only: everything below / above the reference range falls in the first / last bin
+        return np.diff(np.searchsorted(values_sorted, edges[1:-1], side="left"),
+                       prepend=0, append=len(values_sorted))
+
+    @classmethod
+    def _bin_shares(cls, values_sorted: np.ndarray, edges: np.ndarray) -> np.ndarray:
+        shares = cls.bin_counts(values_sorted, edges) / len(values_sorted)
+        return np.where(shares == 0, cls.EMPTY_BIN_SHARE, shares)
+
+    @classmethod
+    def _histogram_shares(cls, reference: np.ndarray, current: np.ndarray):
+        edges = np.histogram_bin_edges(np.concatenate([reference, current]), bins=cls.N_BINS)
+        reference_share = np.histogram(reference, bins=edges)[0] / len(reference)
+        current_share = np.histogram(current, bins=edges)[0] / len(current)
+        return (np.where(reference_share == 0, cls.EMPTY_BIN_SHARE, reference_share),
+                np.where(current_share == 0, cls.EMPTY_BIN_SHARE, current_share))
+
+    @staticmethod
+    def _value_counts(reference: np.ndarray, current: np.ndarray):
+        keys, inverse = np.unique(np.concatenate([reference, current]), return_inverse=True)
+        reference_counts = np.bincount(inverse[:len(reference)], minlength=len(keys))
+        current_counts = np.bincount(inverse[len(reference):], minlength=len(keys))
+        return keys, reference_counts, current_counts
+
+    def column_drift(self, reference: Series, current: Series) -> dict:
+        """Drift test for one column, returns a json serialisable dict."""
+        reference = reference.dropna().to_numpy()
+        current = current.dropna().to_numpy()
+        result = {"reference_rows": int(len(reference)), "current_rows": int(len(current))}
+        if len(reference) == 0 or len(current) == 0:
+            result.update({"stattest": None, "drift_detected": False})
+            return result
+
+        is_numeric = np.issubdtype(reference.dtype, np.number) and np.issubdtype(current.dtype, np.number)
+        keys, reference_counts, current_counts = (None, None, None)
+        if is_numeric:
+            reference_sorted = np.sort(reference)
+            current_sorted = np.sort(current)
+            n_values = len(np.union1d(reference_sorted, current_sorted))
+            result.update({
+                "ks_statistic": self.ks_statistic(reference_sorted, current_sorted),
+                "psi": self.psi(reference_sorted, current_sorted),
+                "wasserstein_normed": self.wasserstein_distance(reference_sorted, current_sorted)
+                                      / max(float(np.std(reference_sorted)), 0.001),
+            })
+        else:
+            keys, reference_counts, current_counts = self._value_counts(reference.astype(str), current.astype(str))
+            n_values = len(keys)
+        categorical = not is_numeric or n_values <= self.CATEGORICAL_MAX_VALUES
+
+        if len(reference) <= self.SMALL_REFERENCE_SIZE:
+            if categorical:
+                if keys is None:
+                    keys, reference_counts, current_counts = self._value_counts(reference, current)
+                if n_values <= 2:
+                    stattest, score = "z", self._z_test(reference_counts, current_counts)
+                else:
+                    stattest = "chisquare"
+                    expected = reference_counts * (len(current) / len(reference))
+                    # f_obs = current counts, f_exp = reference shares scaled to the current rows (Evidently)
+                    score = float(stats.chisquare(current_counts, expected)[1])
+            else:
+                stattest = "ks"
+                score = float(stats.ks_2samp(reference_sorted, current_sorted)[1])
+            threshold, drift_detected = self.P_VALUE_THRESHOLD, score < self.P_VALUE_THRESHOLD
+        else:
+            if categorical:
+                stattest = "jensenshannon"
+                if is_numeric:
+                    reference_share, current_share = self._histogram_shares(reference, current)
+                else:
+                    reference_share = np.where(reference_counts == 0, self.EMPTY_BIN_SHARE,
+                                               reference_counts / len(reference))
+                    current_share = np.where(current_counts == 0, self.EMPTY_BIN_SHARE, current_counts / len(current))
+                score = float(jensenshannon(reference_share, current_share))
+            else:
+                stattest, score = "wasserstein", result["wasserstein_normed"]
+            threshold, drift_detected = self.DISTANCE_THRESHOLD, score > self.DISTANCE_THRESHOLD
+
+        result.update({"stattest": stattest, "threshold": threshold, "score": score,
+                       "drift_detected": bool(drift_detected)})
+        return result
+
+    @staticmethod
+    def _z_test(reference_counts: np.ndarray, current_counts: np.ndarray) -> float:
+        """Two proportion z-test on the first value of a binary column."""
+        n_reference, n_current = reference_counts.sum(), current_counts.sum()
+        p_reference, p_current = reference_counts[0] / n_reference, current_counts[0] / n_current
+        p_pooled = (reference_counts[0] + current_counts[0]) / (n_reference + n_current)
+        std = np.sqrt(p_pooled * (1 - p_pooled) * (1 / n_reference + 1 / n_current))
+        if std == 0:
+            return 1.0
+        return float(2 * stats.norm.sf(abs(p_current - p_reference) / std))
+
+    def run(self, reference_df: DataFrame, current_df: DataFrame) -> dict:
+        """Drift summary of every column shared by both dataframes, columns are tested in parallel."""
+        columns = [column for column in reference_df.columns if column in current_df.columns]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda column: self.column_drift(reference_df[column], current_df[column]),
+                                        columns))
+        n_drifted = sum(result["drift_detected"] for result in results)
+        share = n_drifted / len(columns) if columns else 0.0
+        return {
+            "dataset_drift": bool(columns) and share >= self.drift_share,
+            "drift_share": self.drift_share,
+            "number_of_columns": len(columns),
+            "number_of_drifted_columns": n_drifted,
+            "share_of_drifted_columns": share,
+            "columns": dict(zip(columns, results)),
+        }
+
+    @staticmethod
+    def _to_float(value) -> float:
+        value = float(value)
+        return None if np.isnan(value) else value
+
+    def column_profile(self, column: Series, n_quantiles: int = PROFILE_QUANTILES, n_bins: int = PROFILE_BINS,
+                       domain_values: list = None) -> dict:
+        """Reference statistics of one column."""
+        values = column.dropna().to_numpy()
+        profile = {"dtype": str(column.dtype), "count": int(len(values)), "null_count": int(column.isna().sum())}
+        if domain_values is not None:
+            profile["domain_values"] = list(domain_values)
+        if len(values) == 0:
+            return profile
+        if not np.issubdtype(values.dtype, np.number):
+            keys, counts = np.unique(values.astype(str), return_counts=True)
+            profile["value_counts"] = dict(zip(keys.tolist(), counts.tolist()))
+            return profile
+
+        values_sorted = np.sort(values)
+        edges = np.unique(np.quantile(values_sorted, np.linspace(0, 1, n_bins + 1)))
+        if len(edges) < 2:
+            edges = np.array([values_sorted[0], values_sorted[0]])
+        profile.update({
+            "min": self._to_float(values_sorted[0]),
+            "max": self._to_float(values_sorted[-1]),
+            "mean": self._to_float(np.mean(values_sorted)),
+            "std": self._to_float(np.std(values_sorted)),
+            "quantiles": np.quantile(values_sorted, np.linspace(0, 1, n_quantiles)).tolist(),
+            "bin_edges": edges.tolist(),
+            "bin_counts": self.bin_counts(values_sorted, edges).tolist(),
+        })
+        keys, counts = np.unique(values_sorted, return_counts=True)
+        if len(keys) <= n_bins:
+            profile["value_counts"] = {str(key): int(count) for key, count in zip(keys.tolist(), counts.tolist())}
+        return profile
+
+    def build_profile(self, df: DataFrame, domain_value: dict = None, n_quantiles: int = PROFILE_QUANTILES,
+                      n_bins: int = PROFILE_BINS) -> dict:
+        """Compact reference profile of every column of df, columns are profiled in parallel."""
+        domain_value = domain_value or {}
+        columns = list(df.columns)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            profiles = list(executor.map(
+                lambda column: self.column_profile(df[column], n_quantiles=n_quantiles, n_bins=n_bins,
+                                                   domain_values=domain_value.get(column)),
+                columns))
+        return {"n_rows": int(len(df)), "n_quantiles": n_quantiles, "n_bins": n_bins,
+                "columns": dict(zip(columns, profiles))}
+
+    @classmethod
+    def compare_bin_counts(cls, column_profile: dict, current_counts: np.ndarray) -> dict:
+        """PSI and binned KS statistic of a current histogram on the profile bin edges, O(bins)."""
+        reference_counts = np.asarray(column_profile["bin_counts"], dtype=float)
+        current_counts = np.asarray(current_counts, dtype=float)
+        if current_counts.sum() == 0 or reference_counts.sum() == 0:
+            return {"psi": 0.0, "ks_statistic_binned": 0.0}
+        reference_share = reference_counts / reference_counts.sum()
+        current_share = current_counts / current_counts.sum()
+        ks_statistic = float(np.max(np.abs(np.cumsum(reference_share) - np.cumsum(current_share))))
+        reference_share = np.where(reference_share == 0, cls.EMPTY_BIN_SHARE, reference_share)
+        current_share = np.where(current_share == 0, cls.EMPTY_BIN_SHARE, current_share)
+        psi = float(np.sum((current_share - reference_share) * np.log(current_share / reference_share)))
+        return {"psi": psi, "ks_statistic_binned": ks_statistic}
+
+    def compare_column_to_profile(self, column_profile: dict, column: Series) -> dict:
+        """Current column against its reference profile, the reference rows are not needed."""
+        values = column.dropna().to_numpy()
+        result = {"current_rows": int(len(values)), "null_count": int(column.isna().sum())}
+        if "domain_values" in column_profile:
+            result["domain_violations"] = int((~np.isin(values, column_profile["domain_values"])).sum())
+        if len(values) == 0 or "bin_edges" not in column_profile or not np.issubdtype(values.dtype, np.number):
+            result["drift_detected"] = False
+            return result
+
+        values_sorted = np.sort(values)
+        edges = np.asarray(column_profile["bin_edges"])
+        result.update(self.compare_bin_counts(column_profile, self.bin_counts(values_sorted, edges)))
+        reference_quantiles = np.asarray(column_profile["quantiles"])
+        current_quantiles = np.quantile(values_sorted, np.linspace(0, 1, len(reference_quantiles)))
+        # W1 is the L1 distance between the quantile functions
+        result["wasserstein_normed"] = float(np.mean(np.abs(reference_quantiles - current_quantiles))
+                                             / max(column_profile["std"] or 0.0, 0.001))
+        result["out_of_range"] = int(np.searchsorted(values_sorted, column_profile["min"], side="left")
+                                     + len(values_sorted)
+                                     - np.searchsorted(values_sorted, column_profile["max"], side="right"))
+        result["drift_detected"] = bool(result["psi"] > self.PSI_THRESHOLD)
+        return result
+
+    def compare_to_profile(self, profile: dict, current_df: DataFrame) -> dict:
+        """Drift summary of current_df against a reference profile built by build_profile."""
+        columns = [column for column in profile["columns"] if column in current_df.columns]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(
+                lambda column: self.compare_column_to_profile(profile["columns"][column], current_df[column]),
+                columns))
+        n_drifted = sum(result["drift_detected"] for result in results)
+        share = n_drifted / len(columns) if columns else 0.0
+        return {
+            "dataset_drift": bool(columns) and share >= self.drift_share,
+            "drift_share": self.drift_share,
+            "number_of_columns": len(columns),
+            "number_of_drifted_columns": n_drifted,
+            "share_of_drifted_columns": share,
+            "columns": dict(zip(columns, results)),
+        }
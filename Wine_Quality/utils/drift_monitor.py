@@ -0,0 +1,144 @@
+import threading
+import time
+
+import numpy as np
+from pandas import DataFrame
+
+from wine_quality.constants import TARGET_COLUMN
+from wine_quality.utils.drift_engine import DriftEngine
+
+
+class DriftMonitor:
+    """
+    Online input drift monitoring for the prediction service.
+
+    Every serving thread counts its requests into its own fixed-bin histograms (the bin edges of the reference
+    profile), so update() never takes a lock. A background thread periodically merges the per-thread shards and
+    computes windowed PSI / binned KS of the traffic seen since the previous window against the reference profile.
+    Reading a shard while its owner thread updates it can at worst miss that in-flight batch until the next merge.
+    """
+
+    def __init__(self, profile: dict, window_seconds: float = 60, min_window_rows: int = 100,
+                 drift_engine: DriftEngine = None, exclude_columns: tuple = (TARGET_COLUMN,)):
+        """
+        :param profile: reference profile built by DriftEngine.build_profile
+        :param window_seconds: how often the background thread evaluates drift
+        :param min_window_rows: windows with fewer rows keep accumulating instead of being evaluated
+        :param exclude_columns: profile columns that are not model inputs (the target)
+        """
+        self.profile = profile
+        self.window_seconds = window_seconds
+        self.min_window_rows = min_window_rows
+        self.drift_engine = drift_engine or DriftEngine()
+        self.columns = [column for column, column_profile in profile["columns"].items()
+                        if "bin_edges" in column_profile and column not in exclude_columns]
+        self._interior_edges = {column: np.asarray(profile["columns"][column]["bin_edges"][1:-1], dtype=float)
+                                for column in self.columns}
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+        self._window_start = self._empty_counts()
+        self._stop = threading.Event()
+        self._thread = None
+        self.metrics = {"window_rows": 0, "total_rows": 0, "evaluated_at": None, "dataset_drift": False,
+                        "columns": {}}
+
+    def _empty_counts(self) -> dict:
+        counts = {column: np.zeros(len(edges) + 1, dtype=np.int64) for column, edges in self._interior_edges.items()}
+        counts["_rows"] = np.zeros(1, dtype=np.int64)
+        return counts
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._empty_counts()
+            # the lock is only taken once per thread, when its shard is registered
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def update(self, dataframe: DataFrame) -> None:
+        """Add a batch of raw model inputs to this thread's histograms."""
+        shard = self._shard()
+        for column in self.columns:
+            if column not in dataframe.columns:
+                continue
+            values = dataframe[column].to_numpy(dtype=float)
+            values = values[~np.isnan(values)]
+            edges = self._interior_edges[column]
+            shard[column] += np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+        shard["_rows"] += len(dataframe)
+
+    def merge(self) -> dict:
+        """Sum of every thread's histograms since start."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals = self._empty_counts()
+        for shard in shards:
+            for key, counts in shard.items():
+                totals[key] += counts
+        return totals
+
+    def compute_metrics(self) -> dict:
+        """Evaluate the current window against the reference profile and start a new window."""
+        totals = self.merge()
+        window_rows = int(totals["_rows"][0] - self._window_start["_rows"][0])
+        if window_rows < self.min_window_rows:
+            self.metrics["total_rows"] = int(totals["_rows"][0])
+            return self.metrics
+
+        columns = {}
+        for column in self.columns:
+            window_counts = totals[column] - self._window_start[column]
+            result = self.drift_engine.compare_bin_counts(self.profile["columns"][column], window_counts)
+            result["drift_detected"] = bool(result["psi"] > self.drift_engine.PSI_THRESHOLD)
+            columns[column] = result
+        n_drifted = sum(result["drift_detected"] for result in columns.values())
+        self.metrics = {
+            "window_rows": window_rows,
+            "total_rows": int(totals["_rows"][0]),
+            "evaluated_at": time.time(),
+            "dataset_drift": bool(columns) and n_drifted / len(columns) >= self.drift_engine.drift_share,
+            "columns": columns,
+        }
+        self._window_start = totals
+        return self.metrics
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.window_seconds):
+            self.compute_metrics()
+
+    def start(self) -> "DriftMonitor":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def prometheus_metrics(self) -> str:
+        """Latest window in the Prometheus text exposition format."""
+        metrics = self.metrics
+        lines = [
+            "# TYPE wine_drift_input_rows_total counter",
+            f"wine_drift_input_rows_total {metrics['total_rows']}",
+            "# TYPE wine_drift_window_rows gauge",
+            f"wine_drift_window_rows {metrics['window_rows']}",
+            "# TYPE wine_drift_dataset_drift gauge",
+            f"wine_drift_dataset_drift {int(metrics['dataset_drift'])}",
+            "# TYPE wine_drift_psi gauge",
+        ]
+        lines += [f'wine_drift_psi{{feature="{column}"}} {result["psi"]}'
+                  for column, result in metrics["columns"].items()]
+        lines.append("# TYPE wine_drift_ks gauge")
+        lines += [f'wine_drift_ks{{feature="{column}"}} {result["ks_statistic_binned"]}'
+                  for column, result in metrics["columns"].items()]
+        lines.append("# TYPE wine_drift_detected gauge")
+        lines += [f'wine_drift_detected{{feature="{column}"}} {int(result["drift_detected"])}'
+                  for column, result in metrics["columns"].items()]
+        return "\n".join(lines) + "\n"
@@ -1,13 +1,28 @@
 import os
 import sys
+import json
+import hashlib
+import shutil
+
+from typing import Iterator, List, Optional
 
 import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
 import dill
 import yaml
 from pandas import DataFrame
 
 from wine_quality.exception import custom_Exception
 from wine_quality.logger import logging
+from wine_quality.constants import PARQUET_COMPRESSION
+
+
+SCHEMA_DTYPE_MAPPING = {
+    "int": "int64",
+    "float": "float64",
+    "object": "object",
+}
 
 
 def read_yaml_file(file_path: str) -> dict:
@@ -19,6 +34,43 @@ def read_yaml_file(file_path: str) -> dict:
         raise custom_Exception(e, sys) from e
 
 
+def write_json_file(file_path: str, content: object) -> None:
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as file:
+            json.dump(content, file, indent=2)
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def read_json_file(file_path: str) -> dict:
+    try:
+        with open(file_path, "r") as file:
+            return json.load(file)
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def get_schema_dtypes(schema_config: dict, exclude_drop_columns: bool = True) -> dict:
+    """
+    map the `columns` section of schema.yaml to numpy dtypes
+    schema_config: dict loaded from schema.yaml
+    exclude_drop_columns: skip the columns listed under `drop_columns`
+    return: dict of column name -> numpy dtype, in schema order
+    """
+    try:
+        drop_cols = set(schema_config.get("drop_columns", [])) if exclude_drop_columns else set()
+        dtypes = {}
+        for column in schema_config["columns"]:
+            for column_name, column_type in column.items():
+                if column_name in drop_cols:
+                    continue
+                dtypes[column_name] = np.dtype(SCHEMA_DTYPE_MAPPING.get(column_type, "object"))
+        return dtypes
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
 def write_yaml_file(file_path: str, content: object, replace: bool = False) -> None:
     try:
         if replace:
@@ -31,6 +83,59 @@ def write_yaml_file(file_path: str, content: object, replace: bool = False) -> N
         raise custom_Exception(e, sys) from e
 
 
+def save_dataframe(file_path: str, dataframe: DataFrame, dtypes: Optional[dict] = None) -> None:
+    """
+    save a dataframe as compressed parquet
+    file_path: str location of file to save
+    dataframe: DataFrame to save
+    dtypes: column -> dtype from schema.yaml, columns present in the dataframe are cast before writing
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if dtypes:
+            # integer columns holding NaN stay float, they can not be cast without losing the missing values
+            dataframe = dataframe.astype({column: dtype for column, dtype in dtypes.items()
+                                          if column in dataframe.columns and dtype != np.dtype("object")
+                                          and not (dtype.kind in "iu" and dataframe[column].isna().any())})
+        dataframe.to_parquet(file_path, engine="pyarrow", compression=PARQUET_COMPRESSION, index=False)
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def read_dataframe(file_path: str, columns: Optional[List[str]] = None, memory_map: bool = False,
+                   dtypes: Optional[dict] = None) -> DataFrame:
+    """
+    read a parquet (or legacy csv) file into a dataframe
+    file_path: str location of file to read
+    columns: only read these columns, parquet skips the other column chunks entirely
+    memory_map: memory-map the parquet file instead of reading it into a buffer
+    dtypes: column -> dtype, only used for csv files (parquet keeps the types it was written with)
+    """
+    try:
+        if file_path.endswith(".csv"):
+            return pd.read_csv(file_path, usecols=columns, dtype=dtypes)
+        return pd.read_parquet(file_path, engine="pyarrow", columns=columns, memory_map=memory_map)
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def iter_dataframe_chunks(file_path: str, chunk_size: int, columns: Optional[List[str]] = None) -> Iterator[DataFrame]:
+    """
+    stream a parquet (or csv) file as dataframes of at most chunk_size rows
+    file_path: str location of file to read
+    chunk_size: rows per chunk
+    columns: only read these columns
+    """
+    try:
+        if file_path.endswith(".csv"):
+            yield from pd.read_csv(file_path, chunksize=chunk_size, usecols=columns)
+        else:
+            for record_batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunk_size, columns=columns):
+                yield record_batch.to_pandas()
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
 def load_object(file_path: str) -> object:
     logging.info("Entered the load_object method of utils")
 
@@ -61,19 +166,79 @@ def save_numpy_array_data(file_path: str, array: np.array):
         raise custom_Exception(e, sys) from e
 
 
-def load_numpy_array_data(file_path: str) -> np.array:
+def load_numpy_array_data(file_path: str, mmap_mode: Optional[str] = None) -> np.array:
     """
     load numpy array data from file
     file_path: str location of file to load
+    mmap_mode: None reads the array into memory, "r" / "r+" / "c" memory-map it (see np.load)
     return: np.array data loaded
     """
     try:
+        if mmap_mode is not None:
+            return np.load(file_path, mmap_mode=mmap_mode)
         with open(file_path, 'rb') as file_obj:
             return np.load(file_obj)
     except Exception as e:
         raise custom_Exception(e, sys) from e
 
 
+def create_numpy_memmap(file_path: str, shape: tuple, dtype=np.float64) -> np.memmap:
+    """
+    preallocate a C-contiguous .npy file of the given shape and return it memory-mapped for writing,
+    the array is filled in place and flushed to disk page by page
+    file_path: str location of file to create
+    """
+    try:
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        return np.lib.format.open_memmap(file_path, mode="w+", dtype=dtype, shape=shape)
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def get_row_count(file_path: str) -> int:
+    """
+    number of rows of a parquet (from its footer, without reading data) or csv file
+    """
+    try:
+        if file_path.endswith(".csv"):
+            with open(file_path, "rb") as file_obj:
+                return max(sum(1 for _ in file_obj) - 1, 0)
+        return pq.ParquetFile(file_path).metadata.num_rows
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def hash_file(file_path: str, block_size: int = 1 << 20) -> str:
+    """
+    sha256 hex digest of the file content, read in blocks
+    """
+    try:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file_obj:
+            for block in iter(lambda: file_obj.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    """
+    hardlink src to dst (no data is copied), falling back to a copy across file systems,
+    an existing dst is replaced
+    """
+    try:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    except Exception as e:
+        raise custom_Exception(e, sys) from e
+
+
 def save_object(file_path: str, obj: object) -> None:
     logging.info("Entered the save_object method of utils")
 
@@ -98,7 +263,8 @@ def drop_columns(df: DataFrame, cols: list)-> DataFrame:
     logging.info("Entered drop_columns methon of utils")
 
     try:
-        df = df.drop(columns=cols, axis=1)
+        cols = [col for col in cols if col in df.columns]
+        df = df.drop(columns=cols)
 
         logging.info("Exited the drop_columns method of utils")
         
@@ -1,56 +1,452 @@
 import importlib
+import math
+import time
+from typing import Callable, Optional
+
 import yaml
-from sklearn.model_selection import GridSearchCV
+import numpy as np
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, ParameterSampler, check_cv
+
+from wine_quality.logger import logging
+from wine_quality.utils.search_cache import SearchCache, hash_arrays
+from wine_quality.utils.search_data import SearchData
+from wine_quality.utils.search_executor import SearchExecutor, SearchTask, shared_fit_params
+from wine_quality.utils.search_planner import SearchPlanner
 
 class ModelFactory:
-    def __init__(self, model_config_path: str):
+    """
+    Hyperparameter search over the models of model.yaml.
+
+    grid_search.strategy (global) or search.strategy (per model) picks how candidates are searched:
+    - grid: every point of search_param_grid
+    - randomized: n_iter points sampled from search_param_grid
+    - halving: successive halving, all candidates start on min_resources of the resource (rows of the training
+      folds, n_samples, or a parameter such as n_estimators) and only the best 1/factor go on to factor times more,
+      the last round runs on max_resources so the scores compare with the other models
+    grid_search.budget_seconds bounds the wall time of the whole search, unfinished candidates are left out.
+    With dry_run.enabled the search is first estimated by SearchPlanner, which can abort it or shrink the grids.
+    The search can run on a subsample of the training rows, only the finalists are then refitted on every row.
+
+    Candidates of a forest or boosting model that differ only in n_estimators share one fit per fold: the largest
+    ensemble is fitted and the smaller ones are scored from its first trees / boosting stages (within every round of
+    halving on n_samples; halving on n_estimators itself leaves nothing to share). KNN candidates that
+    differ only in algorithm, n_neighbors and weights share one neighbor query of the largest k per fold.
+    Every other candidate, HistGradientBoostingRegressor included (early stopping, each fit bins its own fold), is
+    fitted on its own.
+
+    The best n_finalists candidates of every model can be benchmarked for serving latency and size (selection
+    section), the model is then chosen on constraints and a weighted objective instead of the score alone.
+
+    With a search_cache_file_path the fold scores are kept across runs (SearchCache), only the (candidate, fold)
+    pairs never scored on the same data and folds are evaluated.
+    """
+
+    SEARCH_DEFAULTS = {
+        "strategy": "grid",
+        "n_iter": 10,
+        "factor": 3,
+        "resource": "n_samples",
+        "min_resources": None,
+        "max_resources": None,
+        "random_state": 42,
+    }
+
+    SELECTION_DEFAULTS = {
+        "n_finalists": 1,
+        "benchmark_repeats": 100,
+        "constraints": {},
+        "weights": {},
+    }
+
+    def __init__(self, model_config_path: str, search_cache_file_path: Optional[str] = None):
         with open(model_config_path, 'r') as file:
             self.config = yaml.safe_load(file)
+        self.search_cache_file_path = search_cache_file_path
 
     def _import_class(self, module_name: str, class_name: str):
         """Dynamically import any sklearn model from YAML."""
         module = importlib.import_module(module_name)
         return getattr(module, class_name)
 
-    def get_best_model(self, X, y, base_score: float):
-        """Run GridSearchCV for all models and return the best one."""
+    def get_search_executor(self) -> SearchExecutor:
+        """Process pool for the search, sized by the search_executor section of model.yaml."""
+        executor_config = self.config.get("search_executor", {})
+        return SearchExecutor(
+            n_jobs=executor_config.get("n_jobs", -1),
+            inner_max_num_threads=executor_config.get("inner_max_num_threads", 1),
+            backend=executor_config.get("backend", "loky"),
+            verbose=self.config["grid_search"]["params"].get("verbose", 0),
+        )
+
+    def get_search_settings(self, model_info: dict) -> dict:
+        """Search settings of a model: defaults < global grid_search section < the model's own search section."""
+        grid_search = self.config["grid_search"]
+        settings = dict(self.SEARCH_DEFAULTS)
+        settings.update({key: grid_search[key] for key in self.SEARCH_DEFAULTS if key in grid_search})
+        settings.update(model_info.get("search", {}))
+        if settings["strategy"] not in ("grid", "randomized", "halving"):
+            raise ValueError(f"Unknown search strategy {settings['strategy']}, expected grid, randomized or halving")
+        return settings
+
+    def get_selection_settings(self) -> dict:
+        """selection section of model.yaml over SELECTION_DEFAULTS"""
+        settings = dict(self.SELECTION_DEFAULTS)
+        settings.update(self.config.get("selection") or {})
+        settings["constraints"] = settings["constraints"] or {}
+        settings["weights"] = settings["weights"] or {}
+        return settings
+
+    @staticmethod
+    def _refit(finalist: dict, searches: dict, executor: SearchExecutor, X, y) -> None:
+        start = time.perf_counter()
+        finalist["model"] = executor.refit(searches[finalist["model_key"]]["estimator"], finalist["params"], X, y)
+        finalist["refit_seconds"] = round(time.perf_counter() - start, 3)
+
+    def select_model(self, finalists: list, searches: dict, executor: SearchExecutor, X, y,
+                     benchmark: Optional[Callable[[object], dict]] = None) -> Optional[dict]:
+        """
+        Refit the finalist to train on all rows and return it (finalists are ordered best score first).
+        Without a benchmark the best score wins. With one, every finalist is refitted and benchmarked, finalists
+        above a constraint (max_<measurement>) are dropped and the highest score - sum(weight * measurement) wins.
+        """
+        if len(finalists) == 0:
+            return None
+        if benchmark is None:
+            chosen = finalists[0]
+            self._refit(chosen, searches, executor, X, y)
+            return chosen
+
+        settings = self.get_selection_settings()
+        for finalist in finalists:
+            self._refit(finalist, searches, executor, X, y)
+            measurements = benchmark(finalist["model"])
+            unknown = [name for name in list(settings["weights"]) + [name.removeprefix("max_") for name in
+                                                                     settings["constraints"]]
+                       if name not in measurements]
+            if unknown:
+                raise ValueError(f"Unknown serving measurements {unknown} in selection, expected {list(measurements)}")
+            finalist["measurements"] = measurements
+            finalist["violations"] = [name for name, limit in settings["constraints"].items()
+                                      if limit is not None and measurements[name.removeprefix("max_")] > limit]
+            finalist["objective"] = finalist["score"] - sum(weight * measurements[name]
+                                                            for name, weight in settings["weights"].items() if weight)
+            logging.info(f"Finalist {finalist['model_name']} {finalist['params']}: score {finalist['score']:.4f}, "
+                         f"objective {finalist['objective']:.4f}, violations {finalist['violations']}")
+
+        feasible = [finalist for finalist in finalists if not finalist["violations"]]
+        chosen = max(feasible, key=lambda finalist: finalist["objective"]) if feasible else None
+        for finalist in finalists:
+            finalist["selected"] = finalist is chosen
+            if finalist is not chosen:
+                del finalist["model"]
+        if chosen is None:
+            logging.info("No finalist meets the serving constraints")
+        return chosen
+
+    def get_candidates(self, param_grid: dict, settings: dict) -> list:
+        """Parameter sets to evaluate for a model."""
+        if settings["strategy"] == "halving" and settings["resource"] != "n_samples":
+            if settings["resource"] in param_grid:
+                # the resource is set by the halving schedule, not searched
+                logging.info(f"{settings['resource']} is the halving resource, dropped from the grid")
+                param_grid = {key: values for key, values in param_grid.items() if key != settings["resource"]}
+        if settings["strategy"] == "randomized":
+            n_candidates = len(ParameterGrid(param_grid))
+            return list(ParameterSampler(param_grid, n_iter=min(settings["n_iter"], n_candidates),
+                                         random_state=settings["random_state"]))
+        return list(ParameterGrid(param_grid))
+
+    @staticmethod
+    def get_resource_schedule(settings: dict, n_candidates: int, max_resources: int) -> list:
+        """
+        Resource of every halving round, the smallest is chosen so the last round uses max_resources
+        (scikit-learn's min_resources="exhaust")
+        """
+        factor = settings["factor"]
+        n_rounds = max(1, math.ceil(math.log(max(n_candidates, 1), factor)) + 1)
+        min_resources = settings["min_resources"] or max(1, int(max_resources / factor ** (n_rounds - 1)))
+        schedule = []
+        resource = min_resources
+        while len(schedule) < n_rounds - 1 and resource < max_resources:
+            schedule.append(int(resource))
+            resource *= factor
+        schedule.append(int(max_resources))
+        return schedule
+
+    @staticmethod
+    def group_shared_fits(estimator, candidates: dict) -> list:
+        """
+        Groups the candidates (index -> params) that can be scored from one fit per fold: forest / boosting
+        candidates differing only in n_estimators, KNN candidates differing only in algorithm, n_neighbors and
+        weights. Returns (candidate index, params to fit, {candidate index: params} or None) per task.
+        """
+        groups = {}
+        for candidate, params in candidates.items():
+            shared = shared_fit_params(clone(estimator).set_params(**params))
+            # repr() so that list or None valued parameters can be part of the key
+            key = (shared, tuple(sorted((name, repr(value)) for name, value in params.items() if name not in shared)))
+            groups.setdefault(key, []).append(candidate)
+
+        fits = []
+        for (shared, _), members in groups.items():
+            if len(shared) == 0 or len(members) == 1:
+                fits += [(candidate, candidates[candidate], None) for candidate in members]
+                continue
+            common = {name: value for name, value in candidates[members[0]].items() if name not in shared}
+            fits.append((members[0], common, {candidate: candidates[candidate] for candidate in members}))
+        return sorted(fits, key=lambda fit: fit[0])
+
+    @staticmethod
+    def _serve_from_cache(cache: SearchCache, search: dict, key: str, members: dict, data: SearchData, fold: int,
+                          n_train: Optional[int], data_hash: str, fold_hashes: dict, scoring, cached_results: list,
+                          cache_entries: dict) -> dict:
+        """
+        Adds the cached fold results of the members (candidate index -> params) to cached_results and returns the
+        members still to evaluate, whose cache keys are kept in cache_entries to store their results.
+        """
+        rows = (fold, n_train)
+        if rows not in fold_hashes:
+            fold_hashes[rows] = cache.fold_hash(*data.fold(fold, n_train))
+        keys = {candidate: cache.key(search["estimator"], params, data_hash, fold_hashes[rows], scoring)
+                for candidate, params in members.items()}
+        hits = cache.get(keys.values())
+        missing = {}
+        for candidate, params in members.items():
+            hit = hits.get(keys[candidate])
+            if hit is None:
+                missing[candidate] = params
+                cache_entries[(key, candidate, fold)] = {
+                    "key": keys[candidate], "estimator": search["class"], "data_hash": data_hash,
+                    "fold_hash": fold_hashes[rows], "scoring": scoring}
+                continue
+            cached_results.append({"model_key": key, "candidate": candidate, "params": params, "fold": fold,
+                                   **hit, "shared_fit": False, "cached": True})
+        search["n_cached"] += len(members) - len(missing)
+        return missing
+
+    @staticmethod
+    def _task_cost(model, params: dict) -> float:
+        """Rough relative fit cost of a candidate, only used to start the longest fits first."""
+        merged = {**model.get_params(), **params}
+        return float(merged.get("n_estimators") or merged.get("max_iter") or 1) * float(merged.get("max_depth") or 1)
+
+    def _run_rounds(self, searches: dict, executor: SearchExecutor, data: SearchData, scoring,
+                    deadline: Optional[float], cache: Optional[SearchCache]) -> list:
+        """Run the rounds of every search (updating their scores, survivors and rounds), returns all fold results."""
+        results = []
+        data_hash = hash_arrays(data.X, data.y) if cache is not None else None
+        fold_hashes = {}
+
+        # every round runs the current candidates of all models on the pool together
+        while True:
+            tasks = []
+            cached_results = []
+            cache_entries = {}
+            for key, search in searches.items():
+                if search["round"] >= len(search["schedule"]):
+                    continue
+                resource = search["schedule"][search["round"]]
+                candidates = {}
+                for candidate in search["alive"]:
+                    params = dict(search["candidates"][candidate])
+                    if resource is not None and search["settings"]["resource"] != "n_samples":
+                        params[search["settings"]["resource"]] = resource
+                    candidates[candidate] = params
+                fits = self.group_shared_fits(search["estimator"], candidates)
+                search["n_fits"] = len(fits)
+                search["n_cached"] = 0
+                for candidate, params, shared_candidates in fits:
+                    members = shared_candidates or {candidate: params}
+                    cost = max(self._task_cost(search["estimator"], member) for member in members.values())
+                    n_train = resource if search["settings"]["resource"] == "n_samples" else None
+                    for fold in range(data.n_folds):
+                        task_candidate, task_shared = candidate, shared_candidates
+                        if cache is not None:
+                            missing = self._serve_from_cache(cache, search, key, members, data, fold, n_train,
+                                                             data_hash, fold_hashes, scoring, cached_results,
+                                                             cache_entries)
+                            if len(missing) == 0:
+                                continue
+                            if shared_candidates is not None:
+                                task_candidate, task_shared = min(missing), missing
+                        tasks.append(SearchTask(key, task_candidate, params, fold, n_train, cost=cost,
+                                                shared_candidates=task_shared))
+            if len(tasks) == 0 and len(cached_results) == 0:
+                break
+            if deadline is not None:
+                # candidate by candidate, so a cut by the budget leaves whole candidates scored
+                tasks.sort(key=lambda task: (task.candidate, task.model_key, task.fold))
+            round_results = []
+            if len(tasks) > 0:
+                round_results = executor.run({key: search["estimator"] for key, search in searches.items()},
+                                             tasks, data, scoring, deadline=deadline)
+            for result in round_results:
+                result["cached"] = False
+            if cache is not None:
+                cache.put([{**cache_entries[(result["model_key"], result["candidate"], result["fold"])], **result}
+                           for result in round_results])
+            round_results += cached_results
+            results += round_results
+
+            for key, search in searches.items():
+                if search["round"] >= len(search["schedule"]):
+                    continue
+                fold_scores = {candidate: [np.nan] * data.n_folds for candidate in search["alive"]}
+                params = {}
+                errors = []
+                for result in round_results:
+                    if result["model_key"] == key:
+                        fold_scores[result["candidate"]][result["fold"]] = result["score"]
+                        params[result["candidate"]] = result["params"]
+                        if result.get("error") is not None:
+                            errors.append(result["error"])
+                # every fit of the model ran and failed (none was cancelled by the budget), as GridSearchCV does
+                if len(errors) > 0 and len(errors) == len(search["alive"]) * data.n_folds:
+                    raise ValueError(f"All the {len(errors)} fits of {search['class']} failed, first error: "
+                                     f"{errors[0]}")
+                # a candidate with a missing fold (cancelled by the budget) is not scored
+                scores = {candidate: float(np.mean(values)) for candidate, values in fold_scores.items()
+                          if not np.any(np.isnan(values))}
+                search["rounds"].append({"resource": search["schedule"][search["round"]],
+                                         "n_candidates": len(search["alive"]), "n_fits": search["n_fits"],
+                                         "n_cached": search["n_cached"], "n_scored": len(scores)})
+                if len(scores) > 0:
+                    search["scores"] = {candidate: (score, params[candidate]) for candidate, score in scores.items()}
+                search["round"] += 1
+                n_keep = math.ceil(len(search["alive"]) / search["settings"]["factor"])
+                # grid order breaks ties, like GridSearchCV's rank_test_score
+                # a lone survivor still runs up to max_resources, so its score compares with the other models
+                search["alive"] = sorted(sorted(scores, key=lambda candidate: -scores[candidate])[:n_keep])
+
+            if deadline is not None and time.perf_counter() > deadline:
+                logging.info("Search budget exhausted")
+                break
+        return results
+
+    def get_searches(self, n_train_rows: int) -> dict:
+        """
+        Search state of every model of model_selection: estimator, settings, candidates, halving schedule
+        (n_train_rows is the size of the smallest training fold, the n_samples resource)
+        """
+        searches = {}
+        for key, model_info in self.config["model_selection"].items():
+            model_class = self._import_class(model_info["module"], model_info["class"])
+            estimator = model_class(**model_info["params"])
+            settings = self.get_search_settings(model_info)
+            candidates = self.get_candidates(model_info["search_param_grid"], settings)
+            schedule = [None]
+            if settings["strategy"] == "halving" and settings["resource"] in shared_fit_params(estimator):
+                logging.info(f"{model_info['class']} halves on {settings['resource']}: all candidates of a round "
+                             f"have the same {settings['resource']}, so none are scored from a shared fit")
+            if settings["strategy"] == "halving":
+                if settings["resource"] == "n_samples":
+                    max_resources = min(settings["max_resources"] or n_train_rows, n_train_rows)
+                else:
+                    max_resources = (settings["max_resources"] or
+                                     max(model_info["search_param_grid"].get(settings["resource"],
+                                                                             [estimator.get_params()[settings["resource"]]])))
+                schedule = self.get_resource_schedule(settings, len(candidates), max_resources)
+            searches[key] = {"class": model_info["class"], "estimator": estimator, "settings": settings,
+                             "candidates": candidates, "alive": list(range(len(candidates))),
+                             "schedule": schedule, "round": 0, "scores": None, "rounds": []}
+        return searches
+
+    def get_best_model(self, X, y, base_score: float, benchmark: Optional[Callable[[object], dict]] = None,
+                       X_refit=None, y_refit=None):
+        """
+        Search every model on one process pool with its strategy and return the best one.
+        benchmark(fitted model) -> serving measurements makes the choice between the finalists latency and size
+        aware (select_model).
+        With X_refit / y_refit the search only ranks the configurations on X / y (a subsample) and the finalists
+        are refitted on X_refit / y_refit (every row), the chosen configuration fitted on the subsample is returned
+        as search_sample_model for comparison.
+        """
+        search_on_sample = X_refit is not None
+        if not search_on_sample:
+            X_refit, y_refit = X, y
         grid_params = self.config["grid_search"]["params"]
-        models = self.config["model_selection"]
 
-        best_model = None
-        best_score = base_score
-        best_model_name = None
-        best_params = None
+        # same folds for every candidate, as GridSearchCV(cv=...) does for a regressor
+        folds = list(check_cv(grid_params.get("cv", 5), y, classifier=False).split(X, y))
+        scoring = grid_params.get("scoring")
+        # rows of the training folds in a fixed random order, a prefix is a random subsample for n_samples halving
+        rng = np.random.RandomState(self.SEARCH_DEFAULTS["random_state"])
+        shuffled_folds = [(rng.permutation(train_index), test_index) for train_index, test_index in folds]
+        n_train_rows = min(len(train_index) for train_index, _ in folds)
+
+        search_plan = None
+        if (self.config.get("dry_run") or {}).get("enabled"):
+            # may abort, or shrink the grids to the budget before they are built
+            search_plan = SearchPlanner(self).plan(X, y)
+        searches = self.get_searches(n_train_rows)
+        budget_seconds = self.config["grid_search"].get("budget_seconds")
 
-        for key, model_info in models.items():
-            module_name = model_info["module"]
-            class_name = model_info["class"]
-            params = model_info["params"]
-            param_grid = model_info["search_param_grid"]
+        executor = self.get_search_executor()
+        start = time.perf_counter()
+        deadline = start + budget_seconds if budget_seconds else None
+        cache = SearchCache(self.search_cache_file_path) if self.search_cache_file_path else None
+        with SearchData(X, y, shuffled_folds, temp_folder=self.config.get("search_executor", {}).get("temp_folder")) \
+                as data:
+            results = self._run_rounds(searches, executor, data, scoring, deadline, cache)
 
-            model_class = self._import_class(module_name, class_name)
-            model = model_class(**params)
+        search_seconds = time.perf_counter() - start
 
-            grid_search = GridSearchCV(
-                estimator=model,
-                param_grid=param_grid,
-                **grid_params
-            )
+        model_scores = {}
+        finalists = []
+        n_finalists = self.get_selection_settings()["n_finalists"]
+        for key, search in searches.items():
+            if not search["scores"]:
+                logging.info(f"No candidate of {search['class']} finished")
+                continue
+            # grid order breaks ties, like GridSearchCV's rank_test_score
+            ranked = sorted(sorted(search["scores"]), key=lambda candidate: -search["scores"][candidate][0])
+            score, params = search["scores"][ranked[0]]
+            model_scores[search["class"]] = score
 
-            grid_search.fit(X, y)
-            score = grid_search.best_score_
+            print(f"Model: {search['class']}, Score: {score:.4f} ({search['settings']['strategy']})")
 
-            print(f"Model: {class_name}, Score: {score:.4f}")
+            finalists += [{"model_key": key, "model_name": search["class"], "params": search["scores"][candidate][1],
+                           "score": search["scores"][candidate][0]}
+                          for candidate in ranked[:n_finalists] if search["scores"][candidate][0] > base_score]
+        # best score first, a tie keeps the order of model.yaml
+        finalists.sort(key=lambda finalist: -finalist["score"])
+        chosen = self.select_model(finalists, searches, executor, X_refit, y_refit, benchmark)
+        search_sample_model = None
+        if search_on_sample and chosen is not None:
+            search_sample_model = executor.refit(searches[chosen["model_key"]]["estimator"], chosen["params"], X, y)
+        if cache is not None:
+            cache.close()
 
-            if score > best_score:
-                best_model = grid_search.best_estimator_
-                best_score = score
-                best_model_name = class_name
-                best_params = grid_search.best_params_
+        best_model = chosen["model"] if chosen is not None else None
+        best_score = chosen["score"] if chosen is not None else base_score
+        best_model_name = chosen["model_name"] if chosen is not None else None
+        best_params = chosen["params"] if chosen is not None else None
 
         return {
             "best_model_name": best_model_name,
             "best_model": best_model,
             "best_score": best_score,
-            "best_params": best_params
+            "best_params": best_params,
+            "search_sample_model": search_sample_model,
+            "serving_benchmark": chosen.get("measurements") if chosen is not None else None,
+            "search_report": {
+                "search_seconds": round(search_seconds, 3),
+                "task_seconds": round(sum(result["seconds"] for result in results if not result["cached"]), 3),
+                "budget_seconds": budget_seconds,
+                "n_jobs": executor.n_jobs,
+                "inner_max_num_threads": executor.inner_max_num_threads,
+                "cache": None if cache is None else {"file_path": cache.file_path, "hits": cache.hits,
+                                                     "misses": cache.misses},
+                "plan": search_plan,
+                "search_sample": {"rows": len(X), "refit_rows": len(X_refit)} if search_on_sample else None,
+                "model_scores": model_scores,
+                "models": {search["class"]: {"strategy": search["settings"]["strategy"],
+                                             "n_candidates": len(search["candidates"]),
+                                             "rounds": search["rounds"]}
+                           for search in searches.values()},
+                "selection": [{name: value for name, value in finalist.items() if name not in ("model", "model_key")}
+                              for finalist in finalists],
+                "tasks": results,
+            },
         }
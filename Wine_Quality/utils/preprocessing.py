@@ -0,0 +1,222 @@
+from numbers import Integral, Real
+
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import special, stats
+from sklearn.base import BaseEstimator, OneToOneFeatureMixin, TransformerMixin
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils.validation import check_is_fitted
+
+from wine_quality.logger import logging
+
+
+def stratified_order(y, random_state=None) -> np.ndarray:
+    """
+    row order whose every prefix (and every contiguous block) is a random sample holding each class of y in its
+    population share, so growing a prefix grows the sample without redrawing it
+    """
+    rng = np.random.RandomState(random_state)
+    y = np.asarray(y)
+    # every class is shuffled, then rows are ranked by their relative position inside their class
+    position = np.empty(len(y), dtype=np.float64)
+    for label in np.unique(y):
+        members = np.flatnonzero(y == label)
+        position[rng.permutation(members)] = (np.arange(len(members)) + rng.uniform()) / len(members)
+    return np.argsort(position, kind="stable")
+
+
+def _normmax(column: np.ndarray, method: str) -> float:
+    """maximum likelihood lambda of one column, NaNs ignored"""
+    values = column[~np.isnan(column)]
+    if method == "yeo-johnson":
+        return float(stats.yeojohnson_normmax(values))
+    return float(stats.boxcox_normmax(values, method="mle"))
+
+
+class SubsampledPowerTransformer(OneToOneFeatureMixin, TransformerMixin, BaseEstimator):
+    """
+    Yeo-Johnson (or Box-Cox) power transform like scikit-learn's PowerTransformer, with the lambdas estimated on a
+    stratified subsample of the rows and the per column optimizations run in parallel.
+
+    The subsample starts at `subsample` rows and is doubled (each sample contains the previous one) until the lambdas
+    of two rounds give equivalent transforms, i.e. no standardized column moves on average by more than `tol`
+    standard deviations, or the whole dataset is used. Lambdas are compared through the transform because for
+    some columns (density) the likelihood is flat and lambda itself keeps moving without changing the output.
+    Transforming and fitting the standard scaler always use every row, so only the lambda estimation is approximated.
+
+    Only public APIs are used: lambdas are the maximum likelihood estimates of scipy.stats.yeojohnson_normmax /
+    boxcox_normmax (those of PowerTransformer up to the optimizer tolerance when the data has at most `subsample`
+    rows), standardization is a StandardScaler. NaNs are ignored in fit and kept in transform.
+    """
+
+    # below this many rows starting worker processes costs more than the per column fits
+    MIN_PARALLEL_ROWS = 50_000
+
+    def __init__(self, method="yeo-johnson", *, standardize=True, copy=True, subsample=100_000, tol=1e-2,
+                 n_jobs=None, random_state=None):
+        """
+        :param method: "yeo-johnson" or "box-cox" (strictly positive data only)
+        :param standardize: zero mean, unit variance output
+        :param subsample: rows of the first lambda estimation round, None estimates on every row
+        :param tol: largest mean absolute change, in standard deviations, of a transformed column between two rounds
+                    that counts as converged
+        :param n_jobs: worker processes the columns are optimized in (joblib semantics, -1 uses every core)
+        :param random_state: seed of the subsample
+        """
+        self.method = method
+        self.standardize = standardize
+        self.copy = copy
+        self.subsample = subsample
+        self.tol = tol
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+
+    def _check_params(self) -> None:
+        if self.method not in ("yeo-johnson", "box-cox"):
+            raise ValueError(f"method must be 'yeo-johnson' or 'box-cox', got {self.method!r}")
+        if self.subsample is not None and (not isinstance(self.subsample, Integral) or self.subsample < 1):
+            raise ValueError(f"subsample must be a positive int or None, got {self.subsample!r}")
+        if not isinstance(self.tol, Real) or self.tol < 0:
+            raise ValueError(f"tol must be a non negative number, got {self.tol!r}")
+
+    def _validate_input(self, X, reset: bool, copy: bool) -> np.ndarray:
+        """X as a 2D float64 array, records the input features on fit (reset) and checks them on transform"""
+        columns = getattr(X, "columns", None)
+        X = np.array(X, dtype=np.float64) if copy else np.asarray(X, dtype=np.float64)
+        if X.ndim != 2:
+            raise ValueError(f"Expected a 2D array, got an array of shape {X.shape}")
+        if np.isinf(X).any():
+            raise ValueError("Input X contains infinity")
+        if self.method == "box-cox" and np.nanmin(X, initial=np.inf) <= 0:
+            raise ValueError("The Box-Cox transformation can only be applied to strictly positive data")
+        if reset:
+            self.n_features_in_ = X.shape[1]
+            if columns is not None:
+                self.feature_names_in_ = np.asarray(columns, dtype=object)
+            elif hasattr(self, "feature_names_in_"):
+                del self.feature_names_in_
+        elif X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but {type(self).__name__} is expecting "
+                             f"{self.n_features_in_} features as input")
+        return X
+
+    def _power(self, column: np.ndarray, lmbda: float) -> np.ndarray:
+        with np.errstate(invalid="ignore", over="ignore"):
+            if self.method == "yeo-johnson":
+                return stats.yeojohnson(column, lmbda)
+            return special.boxcox(column, lmbda)
+
+    def _sample_order(self, n_samples: int, y=None) -> np.ndarray:
+        if y is None or len(y) != n_samples:
+            return np.random.RandomState(self.random_state).permutation(n_samples)
+        return stratified_order(y, random_state=self.random_state)
+
+    def _optimize_columns(self, X: np.ndarray, columns: list) -> np.ndarray:
+        # scipy's Brent search is a Python loop holding the GIL, so columns are fitted in processes, not threads
+        n_jobs = self.n_jobs if len(X) >= self.MIN_PARALLEL_ROWS else 1
+        lambdas = Parallel(n_jobs=n_jobs)(
+            delayed(_normmax)(np.ascontiguousarray(X[:, i]), self.method) for i in columns)
+        return np.asarray(lambdas, dtype=np.float64)
+
+    def _transform_shift(self, sample: np.ndarray, columns: list, previous: np.ndarray, current: np.ndarray) -> float:
+        """largest mean absolute difference between the standardized transforms of the two lambda vectors"""
+        shift = 0.0
+        for j, i in enumerate(columns):
+            a = self._power(sample[:, i], previous[j])
+            b = self._power(sample[:, i], current[j])
+            with np.errstate(invalid="ignore"):
+                a = (a - np.nanmean(a)) / (np.nanstd(a) or 1.0)
+                b = (b - np.nanmean(b)) / (np.nanstd(b) or 1.0)
+                shift = max(shift, float(np.nanmean(np.abs(a - b))))
+        return shift
+
+    def estimate_lambdas(self, X: np.ndarray, y=None) -> np.ndarray:
+        """Power lambdas of every column of X, estimated on growing subsamples until they converge."""
+        n_samples, n_features = X.shape
+        lambdas = np.ones(n_features, dtype=np.float64)
+        # constant features keep lambda=1 (identity), like PowerTransformer
+        with np.errstate(invalid="ignore"):
+            columns = [i for i in range(n_features) if not np.nanmax(X[:, i]) == np.nanmin(X[:, i])]
+        self.n_samples_lambdas_ = n_samples
+        self.n_lambda_rounds_ = 1
+        if len(columns) == 0:
+            return lambdas
+
+        if self.subsample is None or n_samples <= self.subsample:
+            lambdas[columns] = self._optimize_columns(X, columns)
+            return lambdas
+
+        order = self._sample_order(n_samples, y)
+        sample_size = self.subsample
+        previous = None
+        n_rounds = 0
+        while True:
+            n_rounds += 1
+            sample = X[np.sort(order[:sample_size])]
+            current = self._optimize_columns(sample, columns)
+            if previous is not None and self._transform_shift(sample, columns, previous, current) <= self.tol:
+                break
+            if sample_size >= n_samples:
+                break
+            previous = current
+            sample_size = min(2 * sample_size, n_samples)
+
+        lambdas[columns] = current
+        self.n_samples_lambdas_ = sample_size
+        self.n_lambda_rounds_ = n_rounds
+        logging.info(f"{self.method} lambdas estimated on {sample_size} of {n_samples} rows in {n_rounds} rounds")
+        return lambdas
+
+    def _fit(self, X, y=None, force_transform: bool = False) -> np.ndarray:
+        self._check_params()
+        # fit() alone never changes X in place, whatever copy is
+        X = self._validate_input(X, reset=True, copy=self.copy or not force_transform)
+        self.lambdas_ = self.estimate_lambdas(X, y)
+        for i, lmbda in enumerate(self.lambdas_):
+            X[:, i] = self._power(X[:, i], lmbda)
+        if self.standardize:
+            self.scaler_ = StandardScaler(copy=False).fit(X)
+            X = self.scaler_.transform(X)
+        return X
+
+    def fit(self, X, y=None):
+        """Estimate the lambdas (y, when given, stratifies the subsample) and the standardization."""
+        self._fit(X, y)
+        return self
+
+    def fit_transform(self, X, y=None, **fit_params):
+        return self._fit(X, y, force_transform=True)
+
+    def transform(self, X):
+        check_is_fitted(self, "lambdas_")
+        X = self._validate_input(X, reset=False, copy=self.copy)
+        for i, lmbda in enumerate(self.lambdas_):
+            X[:, i] = self._power(X[:, i], lmbda)
+        if self.standardize:
+            X = self.scaler_.transform(X)
+        return X
+
+    def inverse_transform(self, X):
+        check_is_fitted(self, "lambdas_")
+        X = np.array(X, dtype=np.float64) if self.copy else np.asarray(X, dtype=np.float64)
+        if self.standardize:
+            X = self.scaler_.inverse_transform(X)
+        with np.errstate(invalid="ignore", over="ignore"):
+            for i, lmbda in enumerate(self.lambdas_):
+                X[:, i] = (self._yeo_johnson_inverse(X[:, i], lmbda) if self.method == "yeo-johnson"
+                           else special.inv_boxcox(X[:, i], lmbda))
+        return X
+
+    @staticmethod
+    def _yeo_johnson_inverse(x: np.ndarray, lmbda: float) -> np.ndarray:
+        out = np.empty_like(x)
+        positive = x >= 0
+        if abs(lmbda) < np.spacing(1.0):
+            out[positive] = np.expm1(x[positive])
+        else:
+            out[positive] = np.power(x[positive] * lmbda + 1, 1 / lmbda) - 1
+        if abs(lmbda - 2) > np.spacing(1.0):
+            out[~positive] = 1 - np.power(-(2 - lmbda) * x[~positive] + 1, 1 / (2 - lmbda))
+        else:
+            out[~positive] = -np.expm1(-x[~positive])
+        return out
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List
+
+import numpy as np
+import sklearn
+from sklearn.base import clone
+
+from wine_quality.logger import logging
+
+
+def hash_arrays(*arrays, block_rows: int = 100_000) -> str:
+    """sha256 hex digest of the shape, dtype and content of the arrays, memory-mapped arrays are read in blocks"""
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.asarray(array)
+        digest.update(f"{array.shape}{array.dtype.str}".encode())
+        for start in range(0, max(len(array), 1), block_rows):
+            digest.update(np.ascontiguousarray(array[start:start + block_rows]).tobytes())
+    return digest.hexdigest()
+
+
+class SearchCache:
+    """
+    CV results of the model search kept across runs in SQLite, one row per evaluated fold.
+
+    A row is keyed on the estimator class, all of its parameters, the train / test rows of the fold, the training
+    data, the scoring and the scikit-learn version, so a rerun on the same transformed data, or a grid with a few
+    new values, only evaluates the points that were never scored. Failed fits (nan scores) are not stored.
+    """
+
+    def __init__(self, file_path: str):
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cv_results ("
+            "key TEXT PRIMARY KEY, estimator TEXT NOT NULL, params TEXT NOT NULL, data_hash TEXT NOT NULL, "
+            "fold_hash TEXT NOT NULL, fold INTEGER, scoring TEXT, score REAL, fit_seconds REAL, seconds REAL, "
+            "created_at REAL)")
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def estimator_params(estimator, params: dict) -> str:
+        """Every parameter of the estimator with the candidate parameters set, as canonical JSON."""
+        all_params = clone(estimator).set_params(**params).get_params(deep=False)
+        return json.dumps(all_params, sort_keys=True, default=repr)
+
+    @staticmethod
+    def fold_hash(train_index: np.ndarray, test_index: np.ndarray) -> str:
+        return hash_arrays(train_index, test_index)
+
+    def key(self, estimator, params: dict, data_hash: str, fold_hash: str, scoring) -> str:
+        estimator_name = f"{type(estimator).__module__}.{type(estimator).__name__}"
+        payload = json.dumps([estimator_name, self.estimator_params(estimator, params), data_hash, fold_hash,
+                              repr(scoring), sklearn.__version__])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, keys: Iterable[str]) -> Dict[str, dict]:
+        """Stored fold results of the keys that are in the cache."""
+        keys = list(keys)
+        rows = {}
+        # sqlite limits the number of bound parameters of one statement
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            cursor = self.connection.execute(
+                f"SELECT key, score, fit_seconds, seconds FROM cv_results "
+                f"WHERE key IN ({','.join('?' * len(batch))})", batch)
+            rows.update({key: {"score": score, "fit_seconds": fit_seconds, "seconds": seconds}
+                         for key, score, fit_seconds, seconds in cursor})
+        self.hits += len(rows)
+        self.misses += len(keys) - len(rows)
+        return rows
+
+    def put(self, entries: List[dict]) -> None:
+        """Store fold results, each entry holds key, estimator, params, data_hash, fold_hash and the result."""
+        rows = [(entry["key"], entry["estimator"], json.dumps(entry["params"], sort_keys=True, default=repr),
+                 entry["data_hash"], entry["fold_hash"], entry["fold"], repr(entry["scoring"]), entry["score"],
+                 entry["fit_seconds"], entry["seconds"], time.time())
+                for entry in entries if np.isfinite(entry["score"])]
+        self.connection.executemany("INSERT OR REPLACE INTO cv_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    rows)
+        self.connection.commit()
+        logging.info(f"Stored {len(rows)} CV results in {self.file_path}")
+
+    def close(self) -> None:
+        self.connection.close()
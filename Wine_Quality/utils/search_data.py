@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from wine_quality.logger import logging
+
+# arrays opened by this process (a search worker keeps them across tasks), by file path
+_OPEN_ARRAYS: Dict[str, np.ndarray] = {}
+
+
+def _open(file_path: str) -> np.ndarray:
+    array = _OPEN_ARRAYS.get(file_path)
+    if array is None:
+        # maps of the files of finished searches are released
+        for stale_path in [path for path in _OPEN_ARRAYS if not os.path.exists(path)]:
+            del _OPEN_ARRAYS[stale_path]
+        array = np.load(file_path, mmap_mode="r")
+        _OPEN_ARRAYS[file_path] = array
+    return array
+
+
+def _npy_file(array) -> Optional[str]:
+    """path of the .npy file the array is the whole memory map of, None for any other array"""
+    file_path = getattr(array, "filename", None)
+    if not isinstance(array, np.memmap) or file_path is None or not str(file_path).endswith(".npy"):
+        return None
+    opened = np.load(file_path, mmap_mode="r")
+    if opened.shape != array.shape or opened.dtype != array.dtype or opened.offset != array.offset:
+        return None
+    return str(file_path)
+
+
+class SearchData:
+    """
+    Training arrays and CV folds of a model search as read-only memory-mapped .npy files, computed once for all
+    models. Pickling a SearchData only sends the file paths, so every search task gets a handle and a fold number
+    and the workers map the same pages instead of receiving copies: memory stays flat with the number of workers.
+
+    Arrays that already are memory-mapped .npy files (the transformed data of the trainer) are used in place, other
+    arrays are written once to temp_folder (/dev/shm when available, i.e. shared memory), removed by close().
+    """
+
+    def __init__(self, X, y, folds: List[Tuple[np.ndarray, np.ndarray]], temp_folder: Optional[str] = None):
+        """
+        :param folds: (train rows in a random order, test rows) per fold, a prefix of the train rows is a random
+                      subsample of the fold
+        """
+        if temp_folder is None and os.path.isdir("/dev/shm"):
+            temp_folder = "/dev/shm"
+        self.folder = tempfile.mkdtemp(prefix="wine_search_", dir=temp_folder)
+        self.X_path = _npy_file(X) or self._save("X.npy", np.ascontiguousarray(X))
+        self.y_path = _npy_file(y) or self._save("y.npy", np.ascontiguousarray(y))
+        self.fold_paths = [(self._save(f"fold_{fold}_train.npy", np.asarray(train_order, dtype=np.int64)),
+                            self._save(f"fold_{fold}_test.npy", np.sort(np.asarray(test_index, dtype=np.int64))))
+                           for fold, (train_order, test_index) in enumerate(folds)]
+        self.n_train_rows = min(len(train_order) for train_order, _ in folds)
+        logging.info(f"Search data: X={self.X_path}, y={self.y_path}, {len(folds)} folds in {self.folder}")
+
+    def _save(self, file_name: str, array: np.ndarray) -> str:
+        file_path = os.path.join(self.folder, file_name)
+        np.save(file_path, array)
+        return file_path
+
+    @property
+    def X(self) -> np.ndarray:
+        return _open(self.X_path)
+
+    @property
+    def y(self) -> np.ndarray:
+        return _open(self.y_path)
+
+    @property
+    def n_folds(self) -> int:
+        return len(self.fold_paths)
+
+    def fold(self, fold: int, n_train: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """sorted train and test rows of the fold, n_train keeps a random subsample of the train rows"""
+        train_path, test_path = self.fold_paths[fold]
+        train_order = _open(train_path)
+        return np.sort(train_order[:n_train] if n_train is not None else train_order), np.asarray(_open(test_path))
+
+    def close(self) -> None:
+        for file_path in [self.X_path, self.y_path] + [path for paths in self.fold_paths for path in paths]:
+            _OPEN_ARRAYS.pop(file_path, None)
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def __enter__(self) -> "SearchData":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,249 @@
+import time
+import warnings
+from dataclasses import dataclass
+from numbers import Integral
+from typing import Dict, List, Optional
+
+import numpy as np
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import BaseEstimator, RegressorMixin, clone, is_regressor
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+from sklearn.metrics import check_scoring
+from sklearn.neighbors import KNeighborsRegressor
+
+from wine_quality.logger import logging
+from wine_quality.utils.search_data import SearchData
+
+
+ENSEMBLE_SIZE_PARAM = "n_estimators"
+NEIGHBOR_GRID_PARAMS = ("algorithm", "n_neighbors", "weights")
+
+
+@dataclass
+class SearchTask:
+    """
+    One fit/score of a candidate: model key, index of its parameter set, fold of the SearchData and the number of
+    its train rows to fit on (None: all, else a random subsample). shared_candidates (candidate index -> params) are all scored from this task's single fit, params then only
+    holds the parameters they have in common.
+    """
+    model_key: str
+    candidate: int
+    params: dict
+    fold: int
+    n_train: Optional[int] = None
+    cost: float = 1.0
+    shared_candidates: Optional[Dict[int, dict]] = None
+
+
+class FixedPredictions(RegressorMixin, BaseEstimator):
+    """Stands in for a fitted regressor inside a scorer and returns precomputed predictions."""
+
+    def __init__(self, predictions=None):
+        self.predictions = predictions
+
+    def predict(self, X):
+        return self.predictions
+
+
+def supports_ensemble_prefix(estimator) -> bool:
+    """
+    True when a fitted ensemble of n_estimators=N also gives the predictions of every smaller n_estimators:
+    forests average their first n trees, boosting stops its staged predictions at stage n.
+    Early stopping is excluded since the size of the fit then depends on n_estimators.
+    """
+    if isinstance(estimator, (RandomForestRegressor, ExtraTreesRegressor)):
+        return True
+    return (is_regressor(estimator) and hasattr(estimator, "staged_predict")
+            and getattr(estimator, "n_iter_no_change", None) is None)
+
+
+def shared_fit_params(estimator) -> tuple:
+    """Parameters in which candidates of the (unfitted) estimator may differ and still be scored from one fit."""
+    if isinstance(estimator, KNeighborsRegressor):
+        if estimator.weights in ("uniform", "distance") and isinstance(estimator.n_neighbors, Integral):
+            return NEIGHBOR_GRID_PARAMS
+        return ()
+    if supports_ensemble_prefix(estimator) and isinstance(estimator.n_estimators, Integral):
+        return (ENSEMBLE_SIZE_PARAM,)
+    return ()
+
+
+def staged_predictions(model, X, sizes: list):
+    """Yield (n, predictions of the first n estimators of the fitted ensemble) for every n of sizes, ascending."""
+    wanted = set(sizes)
+    if hasattr(model, "staged_predict"):
+        for n, prediction in enumerate(model.staged_predict(X), start=1):
+            if n in wanted:
+                yield n, prediction
+            if n >= max(wanted):
+                break
+        return
+    # same float64 accumulation of the tree predictions as ForestRegressor.predict
+    total = None
+    for n, tree in enumerate(model.estimators_, start=1):
+        prediction = tree.predict(X)
+        total = prediction.astype(np.float64) if total is None else total + prediction
+        if n in wanted:
+            yield n, total / n
+
+
+def neighbor_predictions(distances: np.ndarray, y_neighbors: np.ndarray, weights: str) -> np.ndarray:
+    """KNeighborsRegressor.predict from the distances / targets of the k nearest neighbors of every row."""
+    if weights == "uniform":
+        return np.mean(y_neighbors, axis=1)
+    # 1 / distance, a row with a zero distance neighbor only averages its zero distance neighbors (as sklearn)
+    with np.errstate(divide="ignore"):
+        inverse = 1.0 / distances
+    inf_mask = np.isinf(inverse)
+    inf_row = np.any(inf_mask, axis=1)
+    inverse[inf_row] = inf_mask[inf_row]
+    if y_neighbors.ndim == 3:
+        inverse = inverse[:, :, np.newaxis]
+    return np.sum(y_neighbors * inverse, axis=1) / np.sum(inverse, axis=1)
+
+
+def score_ensemble_sizes(candidates: Dict[int, BaseEstimator], X_train, y_train, X_test, y_test, scoring):
+    """
+    Ensemble candidates differing only in n_estimators: the largest is fitted and every size is scored from the
+    prefix of its trees / stages. Returns the scores and fit seconds (split evenly) by candidate.
+    """
+    start = time.perf_counter()
+    sizes = {}
+    for candidate, model in candidates.items():
+        sizes.setdefault(model.n_estimators, []).append(candidate)
+    model = candidates[sizes[max(sizes)][0]].fit(X_train, y_train)
+    fit_seconds = (time.perf_counter() - start) / len(candidates)
+    scorer = check_scoring(model, scoring=scoring)
+    scores = {}
+    for size, prediction in staged_predictions(model, X_test, sorted(sizes)):
+        score = float(scorer(FixedPredictions(prediction), X_test, y_test))
+        scores.update({candidate: score for candidate in sizes[size]})
+    return scores, {candidate: fit_seconds for candidate in candidates}
+
+
+def score_neighbor_grid(candidates: Dict[int, BaseEstimator], X_train, y_train, X_test, y_test, scoring):
+    """
+    KNN candidates differing only in algorithm, n_neighbors and weights: all algorithms find the same neighbors,
+    so one index (of the first candidate's algorithm) is built and queried for the largest k, and the scores of
+    every n_neighbors / weights pair are reduced from its distances and indices.
+    Returns the scores and fit seconds (the index build and query, split evenly) by candidate.
+    """
+    start = time.perf_counter()
+    n_query = min(max(model.n_neighbors for model in candidates.values()), len(X_train))
+    index = clone(candidates[min(candidates)]).set_params(n_neighbors=n_query).fit(X_train, y_train)
+    distances, indices = index.kneighbors(X_test, n_neighbors=n_query)
+    fit_seconds = (time.perf_counter() - start) / len(candidates)
+
+    y_neighbors = np.asarray(y_train)[indices]
+    scorer = check_scoring(index, scoring=scoring)
+    scores = {}
+    for candidate, model in candidates.items():
+        if model.n_neighbors > n_query:
+            # more neighbors than training rows, KNeighborsRegressor.predict fails too
+            continue
+        prediction = neighbor_predictions(distances[:, :model.n_neighbors], y_neighbors[:, :model.n_neighbors],
+                                          model.weights)
+        scores[candidate] = float(scorer(FixedPredictions(prediction), X_test, y_test))
+    return scores, {candidate: fit_seconds for candidate in candidates}
+
+
+def run_search_task(estimator, task: SearchTask, data: SearchData, scoring) -> List[dict]:
+    """
+    Fit a clone of the estimator with the task parameters on the train fold and score it on the test fold.
+    With task.shared_candidates every candidate of the task is scored from one fit (score_ensemble_sizes or
+    score_neighbor_grid), one result per candidate; the wall time of the task is split evenly over these results.
+    A candidate that fails (or is not scored) gets a NaN score and its error, and is logged with its parameters.
+    """
+    start = time.perf_counter()
+    candidates = task.shared_candidates or {task.candidate: task.params}
+    scores, fit_seconds = {}, {}
+    error = None
+    try:
+        X, y = data.X, data.y
+        train_index, test_index = data.fold(task.fold, task.n_train)
+        X_train, y_train = X[train_index], y[train_index]
+        X_test, y_test = X[test_index], y[test_index]
+        if task.shared_candidates is None:
+            model = clone(estimator).set_params(**task.params).fit(X_train, y_train)
+            fit_seconds[task.candidate] = time.perf_counter() - start
+            scores[task.candidate] = float(check_scoring(model, scoring=scoring)(model, X_test, y_test))
+        else:
+            models = {candidate: clone(estimator).set_params(**params) for candidate, params in candidates.items()}
+            score_shared = (score_neighbor_grid if isinstance(estimator, KNeighborsRegressor)
+                            else score_ensemble_sizes)
+            scores, fit_seconds = score_shared(models, X_train, y_train, X_test, y_test, scoring)
+    except Exception as e:
+        # like GridSearchCV(error_score=nan), a failing candidate is ranked last instead of stopping the search
+        error = f"{type(e).__name__}: {e}"
+    errors = {candidate: error or "not scored" for candidate in candidates if candidate not in scores}
+    for candidate, candidate_error in errors.items():
+        logging.warning(f"{task.model_key} candidate {candidate} {candidates[candidate]} fold {task.fold} failed: "
+                        f"{candidate_error}")
+    seconds = (time.perf_counter() - start) / len(candidates)
+    return [{
+        "model_key": task.model_key,
+        "candidate": candidate,
+        "params": params,
+        "fold": task.fold,
+        "score": scores.get(candidate, float("nan")),
+        "fit_seconds": round(fit_seconds.get(candidate, seconds), 4),
+        "seconds": round(seconds, 4),
+        "shared_fit": task.shared_candidates is not None,
+        "error": errors.get(candidate),
+    } for candidate, params in candidates.items()]
+
+
+class SearchExecutor:
+    """
+    Runs every (model, parameters, fold) task of a model search on one process pool, so all model families are
+    searched concurrently instead of one GridSearchCV after the other.
+
+    Workers are loky processes; inner_max_num_threads caps the BLAS / OpenMP threads inside each worker so that
+    n_jobs workers x inner threads does not oversubscribe the cores. Tasks only carry a SearchData handle and a
+    fold number, the workers memory-map the training arrays and folds themselves.
+    """
+
+    def __init__(self, n_jobs: int = -1, inner_max_num_threads: Optional[int] = 1, backend: str = "loky",
+                 verbose: int = 0):
+        self.n_jobs = n_jobs
+        self.inner_max_num_threads = inner_max_num_threads
+        self.backend = backend
+        self.verbose = verbose
+
+    def run(self, estimators: dict, tasks: List[SearchTask], data: SearchData, scoring,
+            deadline: Optional[float] = None) -> List[dict]:
+        """
+        Run the tasks (estimators maps model_key -> unfitted estimator), most expensive first so that long fits do
+        not end up alone at the tail of the schedule. Returns one result per candidate and fold, each with its wall
+        time (a task with shared_candidates gives one result per candidate).
+        With a deadline (time.perf_counter() value) the tasks run in the given order and whatever has not
+        finished by then is cancelled, only the finished results are returned.
+        """
+        ordered = tasks if deadline is not None else sorted(tasks, key=lambda task: task.cost, reverse=True)
+        start = time.perf_counter()
+        results = []
+        n_done = 0
+        with parallel_config(backend=self.backend, inner_max_num_threads=self.inner_max_num_threads):
+            parallel = Parallel(n_jobs=self.n_jobs, verbose=self.verbose, return_as="generator_unordered")
+            results_iterator = parallel(
+                delayed(run_search_task)(estimators[task.model_key], task, data, scoring) for task in ordered)
+            with warnings.catch_warnings():
+                # joblib warns about the tasks it cancels when the budget is hit
+                warnings.simplefilter("ignore", UserWarning)
+                for task_results in results_iterator:
+                    results += task_results
+                    n_done += 1
+                    if deadline is not None and time.perf_counter() > deadline and n_done < len(ordered):
+                        logging.info(f"Search budget exhausted, {len(ordered) - n_done} tasks cancelled")
+                        break
+                results_iterator.close()
+        wall_seconds = time.perf_counter() - start
+        task_seconds = sum(result["seconds"] for result in results)
+        logging.info(f"Ran {n_done} search tasks ({len(results)} scores) in {wall_seconds:.2f}s wall "
+                     f"({task_seconds:.2f}s of task time, n_jobs={self.n_jobs})")
+        return results
+
+    @staticmethod
+    def refit(estimator, params: dict, X, y):
+        """Fit a clone of the estimator with the given parameters on all rows."""
+        return clone(estimator).set_params(**params).fit(X, y)
@@ -0,0 +1,245 @@
+import argparse
+import math
+import time
+import tracemalloc
+
+import numpy as np
+from joblib import effective_n_jobs
+from sklearn.base import clone
+from sklearn.model_selection import check_cv
+
+from wine_quality.constants import MODEL_TRAINER_MODEL_CONFIG_FILE_PATH
+from wine_quality.logger import logging
+
+
+class SearchPlanner:
+    """
+    Dry run of a ModelFactory search: a few candidates of every model are fitted (and predict the rows they were
+    not fitted on) on subsamples of increasing size, the CPU time and memory of the whole search are extrapolated
+    from the observed scaling.
+
+    Time: per model, time ~ cost^cost_exponent (cost is ModelFactory._task_cost) fitted over the sampled candidates
+    at the largest subsample and time ~ rows^exponent fitted over the subsample sizes, summed over the tasks the
+    search would run (shared fits, folds and halving rounds included). Memory: peak Python / numpy allocations of
+    one fit of the most expensive candidate (tracemalloc, native allocations of compiled estimators are not seen)
+    scaled linearly to the training fold.
+
+    on_budget decides what happens when the estimated wall time exceeds grid_search.budget_seconds:
+    "warn" only logs, "abort" raises, "shrink" turns grid / randomized models into randomized searches with fewer
+    candidates so the estimate fits the budget (halving models are left as they are).
+    """
+
+    DEFAULTS = {
+        "n_configs": 3,
+        "sample_rows": [500, 2000],
+        "on_budget": "warn",
+        "random_state": 42,
+    }
+
+    def __init__(self, model_factory):
+        self.model_factory = model_factory
+        self.settings = dict(self.DEFAULTS)
+        self.settings.update(model_factory.config.get("dry_run") or {})
+        if self.settings["on_budget"] not in ("warn", "abort", "shrink"):
+            raise ValueError(f"Unknown dry_run.on_budget {self.settings['on_budget']}, expected warn, abort or shrink")
+
+    def sample_candidates(self, search: dict, rng: np.random.RandomState) -> list:
+        """the cheapest and the most expensive candidate by task cost, plus random others, n_configs in total"""
+        costs = [self.model_factory._task_cost(search["estimator"], params) for params in search["candidates"]]
+        order = list(np.argsort(costs, kind="stable"))
+        chosen = [order[0], order[-1]][:self.settings["n_configs"]]
+        others = [index for index in order if index not in chosen]
+        n_others = min(max(self.settings["n_configs"] - len(chosen), 0), len(others))
+        chosen += list(rng.choice(others, size=n_others, replace=False)) if n_others else []
+        return sorted(set(int(index) for index in chosen))
+
+    def measure(self, estimator, params: dict, X, y, n_rows: int, rng: np.random.RandomState,
+                trace_memory: bool = False) -> float:
+        """
+        seconds of fitting on n_rows random rows and predicting as many other rows,
+        with trace_memory the peak allocated bytes instead (tracing slows the fit down)
+        """
+        rows = rng.permutation(len(X))
+        train_rows, test_rows = np.sort(rows[:n_rows]), np.sort(rows[n_rows:2 * n_rows])
+        X_train, y_train = np.asarray(X[train_rows]), np.asarray(y[train_rows])
+        X_test = np.asarray(X[test_rows]) if len(test_rows) else X_train
+        model = clone(estimator).set_params(**params)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            model.fit(X_train, y_train)
+            model.predict(X_test)
+            if trace_memory:
+                return tracemalloc.get_traced_memory()[1]
+            return time.perf_counter() - start
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+
+    @staticmethod
+    def log_slope(x: list, y: list, low: float, high: float, default: float) -> float:
+        """slope of log(y) on log(x), clipped to [low, high] (timer noise on tiny fits), default without 2 points"""
+        points = [(math.log(a), math.log(b)) for a, b in zip(x, y) if a > 0 and b > 0]
+        if len({a for a, _ in points}) < 2:
+            return default
+        slope = float(np.polyfit([a for a, _ in points], [b for _, b in points], 1)[0])
+        return min(max(slope, low), high)
+
+    def plan_model(self, search: dict, X, y, n_train_rows: int, n_folds: int, rng: np.random.RandomState) -> dict:
+        """measured scaling and extrapolated CPU seconds / memory of one model's search"""
+        factory = self.model_factory
+        settings = search["settings"]
+        sample_rows = sorted({min(int(rows), n_train_rows, len(X) // 2) for rows in self.settings["sample_rows"]})
+        resource = settings["resource"] if settings["strategy"] == "halving" else None
+
+        costs, seconds, exponents = [], [], []
+        for candidate in self.sample_candidates(search, rng):
+            params = dict(search["candidates"][candidate])
+            if resource is not None and resource != "n_samples":
+                params[resource] = search["schedule"][-1]
+            timings = [self.measure(search["estimator"], params, X, y, rows, rng) for rows in sample_rows]
+            costs.append(factory._task_cost(search["estimator"], params))
+            seconds.append(timings[-1])
+            exponents.append(self.log_slope(sample_rows, timings, 0.5, 2.5, 1.0))
+        exponent = float(np.median(exponents))
+        cost_exponent = self.log_slope(costs, seconds, 0.0, 1.5, 1.0)
+        # seconds of a task = unit * cost^cost_exponent * (rows / largest sample)^exponent
+        unit = float(np.median([t / cost ** cost_exponent for t, cost in zip(seconds, costs)]))
+        expensive = dict(max(search["candidates"], key=lambda params: factory._task_cost(search["estimator"], params)))
+        if resource is not None and resource != "n_samples":
+            expensive[resource] = search["schedule"][-1]
+        bytes_per_row = self.measure(search["estimator"], expensive, X, y, sample_rows[-1], rng,
+                                     trace_memory=True) / sample_rows[-1]
+
+        # the tasks the search would run, survivors of a halving round taken as the first candidates
+        cpu_seconds, n_fits = 0.0, 0
+        alive = list(range(len(search["candidates"])))
+        for round_resource in search["schedule"]:
+            candidates = {}
+            for candidate in alive:
+                params = dict(search["candidates"][candidate])
+                if round_resource is not None and resource != "n_samples":
+                    params[resource] = round_resource
+                candidates[candidate] = params
+            rows = round_resource if round_resource is not None and resource == "n_samples" else n_train_rows
+            for candidate, params, shared in factory.group_shared_fits(search["estimator"], candidates):
+                members = shared or {candidate: params}
+                cost = max(factory._task_cost(search["estimator"], member) for member in members.values())
+                cpu_seconds += n_folds * unit * cost ** cost_exponent * (rows / sample_rows[-1]) ** exponent
+                n_fits += n_folds
+            alive = alive[:math.ceil(len(alive) / settings["factor"])]
+
+        return {"strategy": settings["strategy"], "n_candidates": len(search["candidates"]), "n_fits": n_fits,
+                "sample_rows": sample_rows, "exponent": round(exponent, 3), "cost_exponent": round(cost_exponent, 3),
+                "cpu_seconds": round(cpu_seconds, 2), "memory_mb": round(bytes_per_row * n_train_rows / 2 ** 20, 2)}
+
+    def estimate(self, X, y) -> dict:
+        """per model and total estimated CPU seconds, wall seconds on the search executor and peak memory"""
+        factory = self.model_factory
+        start = time.perf_counter()
+        grid_params = factory.config["grid_search"]["params"]
+        folds = list(check_cv(grid_params.get("cv", 5), y, classifier=False).split(X, y))
+        n_train_rows = min(len(train_index) for train_index, _ in folds)
+        n_jobs = effective_n_jobs(factory.config.get("search_executor", {}).get("n_jobs", -1))
+        rng = np.random.RandomState(self.settings["random_state"])
+
+        models = {search["class"]: self.plan_model(search, X, y, n_train_rows, len(folds), rng)
+                  for search in factory.get_searches(n_train_rows).values()}
+        cpu_seconds = sum(model["cpu_seconds"] for model in models.values())
+        return {
+            "n_train_rows": n_train_rows,
+            "n_folds": len(folds),
+            "n_jobs": n_jobs,
+            "models": models,
+            "cpu_seconds": round(cpu_seconds, 2),
+            "wall_seconds": round(cpu_seconds / n_jobs, 2),
+            # every worker may be fitting the most memory hungry model at once
+            "peak_memory_mb": round(max((model["memory_mb"] for model in models.values()), default=0) * n_jobs, 2),
+            "budget_seconds": factory.config["grid_search"].get("budget_seconds"),
+            "dry_run_seconds": round(time.perf_counter() - start, 2),
+        }
+
+    def shrink(self, plan: dict) -> dict:
+        """
+        n_iter of every grid / randomized model so that the estimated wall time fits the budget, the models share
+        what is left of the budget after the halving models in proportion to their estimate.
+        Updates model_selection of the factory config and returns class -> n_iter.
+        """
+        factory = self.model_factory
+        budget_cpu = plan["budget_seconds"] * plan["n_jobs"]
+        shrinkable = {key: model_info for key, model_info in factory.config["model_selection"].items()
+                      if factory.get_search_settings(model_info)["strategy"] != "halving"}
+        fixed_cpu = sum(model["cpu_seconds"] for name, model in plan["models"].items()
+                        if name not in {model_info["class"] for model_info in shrinkable.values()})
+        shrinkable_cpu = plan["cpu_seconds"] - fixed_cpu
+        share = max(budget_cpu - fixed_cpu, 0) / shrinkable_cpu if shrinkable_cpu > 0 else 1.0
+        n_iters = {}
+        for model_info in shrinkable.values():
+            n_candidates = plan["models"][model_info["class"]]["n_candidates"]
+            n_iter = max(1, math.floor(n_candidates * share))
+            if n_iter < n_candidates:
+                model_info["search"] = {**model_info.get("search", {}), "strategy": "randomized", "n_iter": n_iter}
+                n_iters[model_info["class"]] = n_iter
+        return n_iters
+
+    @staticmethod
+    def format_plan(plan: dict) -> str:
+        width = max([len("model")] + [len(name) for name in plan["models"]]) + 2
+        lines = [f"{'model':<{width}}{'strategy':<12}{'candidates':>11}{'fits':>7}{'exponent':>10}{'cpu s':>11}"
+                 f"{'memory MB':>11}"]
+        for name, model in plan["models"].items():
+            lines.append(f"{name:<{width}}{model['strategy']:<12}{model['n_candidates']:>11}{model['n_fits']:>7}"
+                         f"{model['exponent']:>10}{model['cpu_seconds']:>11}{model['memory_mb']:>11}")
+        lines.append(f"total {plan['cpu_seconds']} cpu s, ~{plan['wall_seconds']} s wall on {plan['n_jobs']} jobs, "
+                     f"peak ~{plan['peak_memory_mb']} MB, budget {plan['budget_seconds']} s "
+                     f"({plan['n_train_rows']} rows x {plan['n_folds']} folds, dry run {plan['dry_run_seconds']} s)")
+        return "\n".join(lines)
+
+    def plan(self, X, y) -> dict:
+        """
+        Estimate the search, log the plan and apply on_budget when the estimate exceeds the budget.
+        Raises RuntimeError for on_budget="abort".
+        """
+        plan = self.estimate(X, y)
+        logging.info(f"Search plan:\n{self.format_plan(plan)}")
+        logging.info(f"Search plan: {plan}")
+        budget_seconds = plan["budget_seconds"]
+        plan["over_budget"] = bool(budget_seconds) and plan["wall_seconds"] > budget_seconds
+        if plan["over_budget"]:
+            message = f"Estimated search wall time {plan['wall_seconds']}s exceeds the budget of {budget_seconds}s"
+            if self.settings["on_budget"] == "abort":
+                raise RuntimeError(message)
+            logging.info(message)
+            if self.settings["on_budget"] == "shrink":
+                plan["shrunk"] = self.shrink(plan)
+                logging.info(f"Grid shrunk to fit the budget, n_iter: {plan['shrunk']}")
+        return plan
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="wine-search-plan",
+                                     description="Estimate the time and memory of the model search (dry run)")
+    parser.add_argument("features_file_path", help="transformed training features, e.g. .../transformed/train.npy")
+    parser.add_argument("target_file_path", help="transformed training target, e.g. .../transformed/train_target.npy")
+    parser.add_argument("--config", default=MODEL_TRAINER_MODEL_CONFIG_FILE_PATH)
+    parser.add_argument("--budget-seconds", type=float, default=None, help="overrides grid_search.budget_seconds")
+    args = parser.parse_args(argv)
+
+    from wine_quality.utils.model_factory import ModelFactory
+
+    model_factory = ModelFactory(model_config_path=args.config)
+    if args.budget_seconds is not None:
+        model_factory.config["grid_search"]["budget_seconds"] = args.budget_seconds
+    X = np.load(args.features_file_path, mmap_mode="r")
+    y = np.load(args.target_file_path, mmap_mode="r")
+    plan = SearchPlanner(model_factory).plan(X, y)
+    print(SearchPlanner.format_plan(plan))
+    if plan["over_budget"]:
+        print(f"Estimated search wall time {plan['wall_seconds']}s exceeds the budget of {plan['budget_seconds']}s")
+    if plan.get("shrunk"):
+        print(f"Grid shrunk to fit the budget, n_iter: {plan['shrunk']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import time
+
+import dill
+import numpy as np
+from pandas import DataFrame
+
+from wine_quality.logger import logging
+
+
+def benchmark_model(model, sample: DataFrame, repeats: int = 100) -> dict:
+    """
+    Serving cost of a model that predicts on raw inputs (preprocessor included):
+    single row latency percentiles over `repeats` one row predict calls, the latency of one predict call on the
+    whole sample and the size of the model as saved by save_object (dill).
+    """
+    # the rows are sliced before timing, only predict is measured
+    rows = [sample.iloc[[i % len(sample)]] for i in range(repeats)]
+    model.predict(rows[0])  # warm up lazily initialised state (thread pools, caches)
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict(row)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    model.predict(sample)
+    batch_seconds = time.perf_counter() - start
+
+    measurements = {
+        "p50_latency_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+        "p99_latency_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+        "batch_rows": len(sample),
+        "batch_latency_ms": round(batch_seconds * 1000, 4),
+        "rows_per_second": round(len(sample) / batch_seconds, 1) if batch_seconds > 0 else float("inf"),
+        "model_mb": round(len(dill.dumps(model)) / 2 ** 20, 4),
+    }
+    logging.info(f"Serving benchmark of {model}: {measurements}")
+    return measurements
@@ -1,6 +1,11 @@
-from flask import Flask, render_template, request
+import threading
+import time
+
+from flask import Flask, Response, render_template, request
 import pandas as pd
 from wine_quality.entity.S3_estimator import WineEstimator
+from wine_quality.utils.drift_monitor import DriftMonitor
+from wine_quality.logger import logging
 from wine_quality.constants import *
 
 app = Flask(__name__)
@@ -11,6 +16,30 @@ model = WineEstimator(
     model_path="model.pkl"               # replace if your path is different
 )
 
+# Online drift monitor, built from the reference profile saved next to the model. While the profile can not be
+# loaded (e.g. not pushed yet) the load is retried with an exponential backoff, predictions are never blocked
+drift_monitor = None
+drift_monitor_lock = threading.Lock()
+drift_monitor_retry_at = 0.0
+drift_monitor_backoff = DRIFT_MONITOR_RETRY_SECONDS
+
+def get_drift_monitor():
+    global drift_monitor, drift_monitor_retry_at, drift_monitor_backoff
+    if drift_monitor is not None or time.monotonic() < drift_monitor_retry_at:
+        return drift_monitor
+    with drift_monitor_lock:
+        if drift_monitor is None and time.monotonic() >= drift_monitor_retry_at:
+            try:
+                profile = model.load_reference_profile(REFERENCE_PROFILE_FILE_NAME)
+                drift_monitor = DriftMonitor(profile,
+                                             window_seconds=DRIFT_MONITOR_WINDOW_SECONDS,
+                                             min_window_rows=DRIFT_MONITOR_MIN_WINDOW_ROWS).start()
+            except Exception as e:
+                logging.info(f"Drift monitoring unavailable, retrying in {drift_monitor_backoff:.0f}s: {e}")
+                drift_monitor_retry_at = time.monotonic() + drift_monitor_backoff
+                drift_monitor_backoff = min(2 * drift_monitor_backoff, DRIFT_MONITOR_MAX_RETRY_SECONDS)
+    return drift_monitor
+
 @app.route('/')
 def home():
     return render_template('wine.html')
@@ -50,10 +79,21 @@ def predict():
         prediction = model.predict(input_data)
         prediction = int(prediction[0])  # assume output is quality score
 
+        monitor = get_drift_monitor()
+        if monitor is not None:
+            monitor.update(input_data)
+
         return render_template('wine.html', result=f"Predicted Wine Quality: {prediction}")
 
     except Exception as e:
         return render_template('wine.html', result=f"Error: {str(e)}")
 
+@app.route('/metrics')
+def metrics():
+    monitor = get_drift_monitor()
+    if monitor is None:
+        return Response("", mimetype="text/plain")
+    return Response(monitor.prometheus_metrics(), mimetype="text/plain")
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=True)
@@ -6,7 +6,13 @@ setup(
     version="0.0.0",
     author="Ibraahim Ahmed",
     author_email="ibraakadarba.12gmail.com",
-    packages=find_packages()
+    packages=find_packages(),
+    entry_points={
+        "console_scripts": [
+            "wine-load=wine_quality.data_access.wine_loader:main",
+            "wine-search-plan=wine_quality.utils.search_planner:main",
+        ]
+    },
 )
 
 
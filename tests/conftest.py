@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def run_from_repo_root(monkeypatch):
+    # config paths (config/schema.yaml, config/model.yaml) are relative to the repository root
+    monkeypatch.chdir(REPO_ROOT)
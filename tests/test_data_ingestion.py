@@ -0,0 +1,74 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from bson import ObjectId
+
+from wine_quality.components.data_ingestion import DataIngestion
+from wine_quality.entity.config_entity import DataIngestionConfig
+from wine_quality.exception import custom_Exception
+
+
+def make_ingestion(tmp_path, **kwargs) -> DataIngestion:
+    store_dir = str(tmp_path / "feature_store")
+    config = DataIngestionConfig(persistent_feature_store_dir=store_dir,
+                                 watermark_file_path=os.path.join(store_dir, "watermark.yaml"), **kwargs)
+    return DataIngestion(config)
+
+
+def make_partition(ids, alcohol, stamp):
+    return pd.DataFrame({"fixed acidity": np.ones(len(ids)), "alcohol": np.asarray(alcohol, dtype=float),
+                         "quality": np.full(len(ids), 5), "ingested_at": pd.Timestamp(stamp), "Id": ids})
+
+
+def partition_path(store_dir):
+    # named like the partitions the ingestion writes, so they sort in write order
+    return os.path.join(store_dir, f"part_{datetime.now().strftime('%Y%m%d%H%M%S%f')}.parquet")
+
+
+def test_watermark_round_trip(tmp_path):
+    ingestion = make_ingestion(tmp_path)
+    assert ingestion.read_watermark() is None
+    stamp = datetime(2026, 10, 19, 12, 30, 15, 123000)
+    ingestion.write_watermark(stamp)
+    assert ingestion.read_watermark() == stamp
+
+
+def test_objectid_watermark_round_trip(tmp_path):
+    ingestion = make_ingestion(tmp_path, watermark_field="_id")
+    value = ObjectId()
+    ingestion.write_watermark(value)
+    assert ingestion.read_watermark() == value
+
+
+def test_watermark_on_another_field_is_refused(tmp_path):
+    make_ingestion(tmp_path).write_watermark(datetime(2026, 1, 1))
+    with pytest.raises(custom_Exception):
+        make_ingestion(tmp_path, watermark_field="_id").read_watermark()
+
+
+def test_drop_duplicate_keys_keeps_the_last_row_and_unkeyed_rows(tmp_path):
+    dataframe = pd.DataFrame({"Id": [1, 2, np.nan, 1, np.nan], "alcohol": [9.0, 10.0, 11.0, 12.0, 11.0]})
+    deduped = make_ingestion(tmp_path).drop_duplicate_keys(dataframe)
+    assert deduped["alcohol"].tolist() == [10.0, 11.0, 12.0, 11.0]
+
+
+def test_compaction_merges_partitions_and_drops_outdated_rows(tmp_path):
+    ingestion = make_ingestion(tmp_path, compaction_threshold=2)
+    store_dir = ingestion.data_ingestion_config.persistent_feature_store_dir
+    os.makedirs(store_dir)
+    make_partition([1, 2, 3], [9.0, 10.0, 11.0], "2026-01-01").to_parquet(partition_path(store_dir))
+    make_partition([4], [12.0], "2026-01-02").to_parquet(partition_path(store_dir))
+    ingestion.compact_feature_store()
+    assert len(ingestion.list_feature_store_partitions()) == 2
+
+    # Id 2 re-ingested with a new value
+    make_partition([2], [13.0], "2026-01-03").to_parquet(partition_path(store_dir))
+    ingestion.compact_feature_store()
+    partitions = ingestion.list_feature_store_partitions()
+    assert len(partitions) == 1 and partitions[0].endswith("_compacted.parquet")
+    compacted = pd.read_parquet(partitions[0]).set_index("Id")
+    assert sorted(compacted.index) == [1, 2, 3, 4]
+    assert compacted.loc[2, "alcohol"] == 13.0
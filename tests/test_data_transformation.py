@@ -0,0 +1,243 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import PowerTransformer, StandardScaler
+
+from wine_quality.components.data_transformation import DataTransformation
+from wine_quality.entity.artifact_entity import DataIngestionArtifact, DataValidationArtifact
+from wine_quality.entity.config_entity import DataTransformationConfig
+from wine_quality.exception import custom_Exception
+from wine_quality.utils.main_utils import load_numpy_array_data, save_dataframe, save_numpy_array_data
+
+SCHEMA = {
+    "num_features": ["a", "b", "c"],
+    "oh_columns": [],
+    "or_columns": [],
+    "transform_columns": ["a", "b"],
+    "drop_columns": ["Id"],
+}
+
+
+def make_transformation(schema=SCHEMA, **config) -> DataTransformation:
+    transformation = DataTransformation.__new__(DataTransformation)
+    transformation._schema_config = schema
+    transformation.data_transformation_config = DataTransformationConfig(power_subsample=None, power_n_jobs=1,
+                                                                         **config)
+    return transformation
+
+
+def make_features(n=500, seed=0) -> pd.DataFrame:
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({"a": rng.lognormal(0.0, 0.5, n), "b": rng.gamma(2.0, 2.0, n), "c": rng.normal(size=n)})
+
+
+def test_dedupe_keeps_each_column_in_its_first_group():
+    plan = make_transformation(overlap_mode="dedupe").plan_transformers()
+    assert plan["pipeline_columns"] == {"num_pipeline": ["a", "b", "c"]}
+    assert plan["overlap"] == {"a": ["num_pipeline", "transform_pipeline"],
+                               "b": ["num_pipeline", "transform_pipeline"]}
+    assert plan["steps_per_row"] == 6 and plan["unplanned_steps_per_row"] == 8
+
+
+def test_reuse_shares_one_power_fit_between_num_and_transform():
+    plan = make_transformation(overlap_mode="reuse").plan_transformers()
+    assert plan["pipeline_columns"] == {"num_pipeline": ["c"], "shared_power_pipeline": ["a", "b"]}
+    assert plan["steps_per_row"] == 6
+
+
+def test_reuse_output_matches_the_schema_as_listed():
+    X = make_features()
+    preprocessor = make_transformation(overlap_mode="reuse").get_data_transformer_object()
+    planned = preprocessor.fit_transform(X)
+    unplanned = ColumnTransformer([
+        ("num_pipeline", Pipeline([("power", PowerTransformer()), ("scaler", StandardScaler())]), ["a", "b", "c"]),
+        ("transform_pipeline", PowerTransformer(), ["a", "b"]),
+    ]).fit_transform(X)
+    assert planned.shape == unplanned.shape == (len(X), 5)
+    # the num only column first, then the shared columns (scaled, then plain)
+    np.testing.assert_allclose(planned, unplanned[:, [2, 0, 1, 3, 4]], atol=1e-6)
+
+
+def test_unknown_overlap_mode_raises():
+    with pytest.raises(custom_Exception):
+        make_transformation(overlap_mode="merge").plan_transformers()
+
+
+
+def test_input_features_drop_target_and_schema_columns():
+    df = make_features(5).assign(Id=range(5), quality=5)
+    assert list(make_transformation().get_input_features(df).columns) == ["a", "b", "c"]
+
+
+def save_split(tmp_path, n=60, minority=8):
+    features_file_path, target_file_path = str(tmp_path / "train.npy"), str(tmp_path / "train_target.npy")
+    rng = np.random.RandomState(0)
+    target = np.where(np.arange(n) < minority, 3.0, 5.0).astype(np.float32)
+    save_numpy_array_data(features_file_path, rng.normal(size=(n, 3)).astype(np.float32) + target[:, None])
+    save_numpy_array_data(target_file_path, target)
+    return features_file_path, target_file_path
+
+
+def spy_on_close_memmap(monkeypatch) -> list:
+    closed = []
+    close_memmap = DataTransformation.close_memmap
+
+    def record(array):
+        closed.append(array._mmap)
+        close_memmap(array)
+
+    monkeypatch.setattr(DataTransformation, "close_memmap", staticmethod(record))
+    return closed
+
+
+def test_resample_arrays_leaves_the_files_alone_without_a_resampler(tmp_path, monkeypatch):
+    features_file_path, target_file_path = save_split(tmp_path)
+    mtime = os.stat(features_file_path).st_mtime_ns
+    closed = spy_on_close_memmap(monkeypatch)
+    report = make_transformation(resampling_strategy="none").resample_arrays(features_file_path, target_file_path)
+    assert report["rows"] == report["resampled_rows"] == 60
+    assert os.stat(features_file_path).st_mtime_ns == mtime
+    assert len(closed) == 2 and all(mmap.closed for mmap in closed)
+
+
+def test_resample_arrays_unmaps_before_swapping_the_files_in(tmp_path, monkeypatch):
+    features_file_path, target_file_path = save_split(tmp_path)
+    closed = spy_on_close_memmap(monkeypatch)
+    replaced = []
+    replace = os.replace
+
+    def replace_after_close(source, destination):
+        replaced.append(all(mmap.closed for mmap in closed))
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", replace_after_close)
+    report = make_transformation(resampling_strategy="smote", smote_k_neighbors=3,
+                                 resampling_n_jobs=1).resample_arrays(features_file_path, target_file_path)
+    assert len(closed) == 2 and replaced == [True, True]
+    assert report["resampled_rows"] == 60 + 52 - 8
+    features = load_numpy_array_data(features_file_path)
+    target = load_numpy_array_data(target_file_path)
+    assert features.shape == (104, 3) and features.dtype == target.dtype == np.float32
+    assert (target == 3.0).sum() == (target == 5.0).sum() == 52
+
+
+def imbalanced_split(n=400, minority=40, seed=0):
+    rng = np.random.RandomState(seed)
+    target = np.where(np.arange(n) < minority, 3.0, 6.0)
+    return rng.normal(size=(n, 3)) + target[:, None], target
+
+
+def test_get_resampler_by_strategy():
+    _, target = imbalanced_split()
+    assert make_transformation(resampling_strategy="none").get_resampler(target) is None
+    assert type(make_transformation(resampling_strategy="smote").get_resampler(target)).__name__ == "SMOTE"
+    assert type(make_transformation(resampling_strategy="enn").get_resampler(target)).__name__ == \
+        "EditedNearestNeighbours"
+    assert type(make_transformation(resampling_strategy="smoteenn").get_resampler(target)).__name__ == "SMOTEENN"
+    with pytest.raises(ValueError):
+        make_transformation(resampling_strategy="adasyn").get_resampler(target)
+
+
+def test_smote_lowers_k_or_is_skipped_for_tiny_classes():
+    target = np.array([3.0, 3.0, 3.0] + [6.0] * 20)
+    smote = make_transformation(resampling_strategy="smote", smote_k_neighbors=5).get_resampler(target)
+    assert smote.k_neighbors.n_neighbors == 3
+    assert make_transformation(resampling_strategy="smote").get_resampler(np.array([3.0] + [6.0] * 20)) is None
+    # ENN still runs when SMOTE is skipped
+    enn = make_transformation(resampling_strategy="smoteenn").get_resampler(np.array([3.0] + [6.0] * 20))
+    assert type(enn).__name__ == "EditedNearestNeighbours"
+
+
+@pytest.mark.parametrize("resampling_mode", ["whole", "chunked"])
+def test_smote_balances_the_classes(resampling_mode):
+    features, target = imbalanced_split()
+    transformation = make_transformation(resampling_strategy="smote", resampling_mode=resampling_mode,
+                                         resampling_chunk_size=100, resampling_n_jobs=2, smote_k_neighbors=3)
+    features_resampled, target_resampled = transformation.resample(features, target)
+    labels, counts = np.unique(target_resampled, return_counts=True)
+    np.testing.assert_array_equal(labels, [3.0, 6.0])
+    # chunked: every block of 100 stratified rows holds 10 minority rows and is balanced on its own
+    assert counts[0] == counts[1] == 360
+    assert features_resampled.shape == (720, 3)
+    # the original rows are all kept
+    assert set(map(tuple, features)) <= set(map(tuple, features_resampled))
+
+
+def test_rows_past_resampling_max_rows_are_kept_as_they_are():
+    features, target = imbalanced_split()
+    transformation = make_transformation(resampling_strategy="smote", resampling_mode="whole",
+                                         resampling_max_rows=100, smote_k_neighbors=3)
+    features_resampled, target_resampled = transformation.resample(features, target)
+    # 100 stratified rows (10 minority) are balanced to 90 + 90, the other 300 rows pass through
+    assert len(target_resampled) == 180 + 300
+    assert (target_resampled == 3.0).sum() == 90 + 30
+
+
+def make_cached_transformation(tmp_path, schema=SCHEMA, **config) -> DataTransformation:
+    """transformation of the splits in tmp_path, all outputs and the cache under tmp_path"""
+    run_dir = tmp_path / f"run_{len(list(tmp_path.glob('run_*')))}"
+    config = {"resampling_strategy": "none", **config}
+    transformation = make_transformation(
+        schema=schema, cache_dir=str(tmp_path / "cache"),
+        transformed_train_file_path=str(run_dir / "train.npy"), transformed_test_file_path=str(run_dir / "test.npy"),
+        transformed_train_target_file_path=str(run_dir / "train_target.npy"),
+        transformed_test_target_file_path=str(run_dir / "test_target.npy"),
+        transformed_object_file_path=str(run_dir / "preprocessing.pkl"),
+        benchmark_sample_file_path=str(run_dir / "benchmark_sample.parquet"), **config)
+    transformation.data_ingestion_artifact = DataIngestionArtifact(trained_file_path=str(tmp_path / "train.parquet"),
+                                                                   test_file_path=str(tmp_path / "test.parquet"))
+    transformation.data_validation_artifact = DataValidationArtifact(validation_status=True, message="",
+                                                                     drift_report_file_path=None)
+    return transformation
+
+
+def save_splits(tmp_path, seed=0):
+    for name, n in (("train", 200), ("test", 50)):
+        df = make_features(n, seed=seed).assign(Id=range(n), quality=np.arange(n) % 3 + 4)
+        save_dataframe(str(tmp_path / f"{name}.parquet"), df)
+
+
+def test_transformation_cache_hit_reuses_the_outputs(tmp_path, monkeypatch):
+    save_splits(tmp_path)
+    first = make_cached_transformation(tmp_path).initiate_data_transformation()
+    assert not first.cache_hit and os.path.isdir(tmp_path / "cache" / first.fingerprint)
+
+    # a hit links the cached files in, nothing is fitted
+    monkeypatch.setattr(DataTransformation, "get_data_transformer_object",
+                        lambda self: pytest.fail("the preprocessor was fitted on a cache hit"))
+    second = make_cached_transformation(tmp_path).initiate_data_transformation()
+    assert second.cache_hit and second.fingerprint == first.fingerprint
+    assert second.transformed_train_file_path != first.transformed_train_file_path
+    np.testing.assert_array_equal(load_numpy_array_data(second.transformed_train_file_path),
+                                  load_numpy_array_data(first.transformed_train_file_path))
+    assert second.feature_width == first.feature_width == 3
+
+
+def test_transformation_cache_misses_when_data_config_schema_or_code_change(tmp_path, monkeypatch):
+    save_splits(tmp_path)
+    fingerprint = make_cached_transformation(tmp_path).get_fingerprint()
+    assert make_cached_transformation(tmp_path).get_fingerprint() == fingerprint
+    # paths and n_jobs do not change the outputs
+    assert make_cached_transformation(tmp_path, resampling_n_jobs=4).get_fingerprint() == fingerprint
+
+    changed = [
+        make_cached_transformation(tmp_path, resampling_strategy="smote").get_fingerprint(),
+        make_cached_transformation(tmp_path, schema={**SCHEMA, "transform_columns": ["a"]}).get_fingerprint(),
+    ]
+    monkeypatch.setattr(DataTransformation, "get_code_fingerprint", staticmethod(lambda: {"edited": "source"}))
+    changed.append(make_cached_transformation(tmp_path).get_fingerprint())
+    monkeypatch.undo()
+    save_splits(tmp_path, seed=1)
+    changed.append(make_cached_transformation(tmp_path).get_fingerprint())
+    assert len(set(changed)) == 4 and fingerprint not in changed
+    assert make_cached_transformation(tmp_path).load_from_cache(fingerprint) is None
+
+
+def test_code_fingerprint_covers_the_transformation_modules():
+    assert set(DataTransformation.get_code_fingerprint()) == {"wine_quality.components.data_transformation",
+                                                              "wine_quality.utils.preprocessing",
+                                                              "wine_quality.utils.main_utils"}
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from wine_quality.components.data_validation import DataValidation
+from wine_quality.entity.artifact_entity import DataIngestionArtifact
+from wine_quality.entity.config_entity import DataValidationConfig
+
+
+def make_validation(tmp_path, **kwargs) -> DataValidation:
+    config = DataValidationConfig(schema_report_file_path=str(tmp_path / "schema_report.json"), chunk_size=7,
+                                  **kwargs)
+    return DataValidation(DataIngestionArtifact(trained_file_path="", test_file_path=""), config)
+
+
+def make_split(n=40):
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({
+        "fixed acidity": rng.uniform(5, 12, n), "volatile acidity": rng.uniform(0.2, 1.0, n),
+        "citric acid": rng.uniform(0, 0.8, n), "residual sugar": rng.uniform(1, 10, n),
+        "chlorides": rng.uniform(0.03, 0.2, n), "free sulfur dioxide": rng.uniform(2, 50, n),
+        "total sulfur dioxide": rng.uniform(10, 200, n), "density": rng.uniform(0.99, 1.0, n),
+        "pH": rng.uniform(3.0, 3.8, n), "sulphates": rng.uniform(0.4, 1.2, n), "alcohol": rng.uniform(9, 14, n),
+        "quality": rng.randint(3, 9, n)})
+
+
+def test_clean_file_with_leftover_id_column_passes(tmp_path):
+    split = make_split()
+    split.insert(0, "Id", range(len(split)))
+    split.to_parquet(tmp_path / "train.parquet")
+    report = make_validation(tmp_path).validate_file(str(tmp_path / "train.parquet"))
+    assert report["status"] and report["rows"] == 40 and report["invalid_rows"] == 0
+    assert report["missing_columns"] == [] and report["unexpected_columns"] == []
+
+
+def test_violations_are_counted_across_chunks(tmp_path):
+    split = make_split().astype({"density": object})
+    split.loc[3, "pH"] = 15.0                 # range
+    split.loc[10, "alcohol"] = np.nan         # null
+    split.loc[17, "quality"] = 9              # domain
+    split.loc[25, "density"] = "abc"          # dtype
+    split.loc[25, "chlorides"] = -0.1         # range, same row
+    split["note"] = "x"
+    split.to_csv(tmp_path / "train.csv", index=False)
+    report = make_validation(tmp_path, max_invalid_row_share=0.2).validate_file(str(tmp_path / "train.csv"))
+
+    assert report["violations"] == {"chlorides": {"dtype": 0, "null": 0, "range": 1, "domain": 0},
+                                    "density": {"dtype": 1, "null": 0, "range": 0, "domain": 0},
+                                    "pH": {"dtype": 0, "null": 0, "range": 1, "domain": 0},
+                                    "alcohol": {"dtype": 0, "null": 1, "range": 0, "domain": 0},
+                                    "quality": {"dtype": 0, "null": 0, "range": 0, "domain": 1}}
+    assert report["invalid_rows"] == 4 and report["invalid_row_share"] == 0.1
+    assert [sample["row"] for sample in report["sample_invalid_rows"]] == [3, 10, 17, 25]
+    assert report["unexpected_columns"] == ["note"]
+    # below the configured share the file passes, above it fails
+    assert report["status"]
+    strict = make_validation(tmp_path, max_invalid_row_share=0.05).validate_file(str(tmp_path / "train.csv"))
+    assert not strict["status"]
+
+
+def test_missing_schema_column_fails(tmp_path):
+    make_split().drop(columns=["pH"]).to_parquet(tmp_path / "train.parquet")
+    report = make_validation(tmp_path).validate_file(str(tmp_path / "train.parquet"))
+    assert report["missing_columns"] == ["pH"] and not report["status"]
+
+
+def test_non_integer_quality_is_a_dtype_violation(tmp_path):
+    split = make_split().astype({"quality": float})
+    split.loc[0, "quality"] = 5.5
+    split.to_parquet(tmp_path / "train.parquet")
+    report = make_validation(tmp_path).validate_file(str(tmp_path / "train.parquet"))
+    assert report["violations"]["quality"]["dtype"] == 1
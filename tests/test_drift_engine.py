@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from wine_quality.utils.drift_engine import DriftEngine
+
+
+def test_chisquare_uses_current_counts_as_observed():
+    reference = pd.Series(["a"] * 40 + ["b"] * 30 + ["c"] * 20 + ["d"] * 10)
+    current = pd.Series(["a"] * 25 + ["b"] * 30 + ["c"] * 25 + ["d"] * 20)
+    result = DriftEngine().column_drift(reference, current)
+    expected = np.array([40, 30, 20, 10]) * (len(current) / len(reference))
+    assert result["stattest"] == "chisquare"
+    assert np.isclose(result["score"], stats.chisquare([25, 30, 25, 20], expected)[1])
+
+
+def test_chisquare_category_missing_from_current_window():
+    reference = pd.Series(["a"] * 30 + ["b"] * 30 + ["c"] * 30 + ["d"] * 10)
+    current = pd.Series(["a"] * 33 + ["b"] * 33 + ["c"] * 34)
+    result = DriftEngine().column_drift(reference, current)
+    assert result["stattest"] == "chisquare"
+    assert np.isfinite(result["score"]) and result["score"] > 0
+
+
+def numeric_column(n, shift=0.0, seed=0):
+    return pd.Series(np.random.RandomState(seed).normal(loc=shift, size=n))
+
+
+def test_ks_and_wasserstein_match_scipy():
+    reference, current = np.sort(numeric_column(500)), np.sort(numeric_column(300, shift=0.3, seed=1))
+    assert np.isclose(DriftEngine.ks_statistic(reference, current), stats.ks_2samp(reference, current).statistic)
+    assert np.isclose(DriftEngine.wasserstein_distance(reference, current),
+                      stats.wasserstein_distance(reference, current))
+
+
+def test_psi_is_zero_on_the_same_sample_and_grows_with_the_shift():
+    reference = np.sort(numeric_column(2000))
+    assert DriftEngine.psi(reference, reference) == 0.0
+    small = DriftEngine.psi(reference, np.sort(numeric_column(2000, shift=0.2, seed=1)))
+    large = DriftEngine.psi(reference, np.sort(numeric_column(2000, shift=1.0, seed=1)))
+    assert 0 < small < large
+
+
+def test_stattest_selection_follows_the_reference_size_and_the_number_of_values():
+    engine = DriftEngine()
+    assert engine.column_drift(numeric_column(500), numeric_column(200, seed=1))["stattest"] == "ks"
+    assert engine.column_drift(numeric_column(2000), numeric_column(200, seed=1))["stattest"] == "wasserstein"
+    quality = pd.Series(np.random.RandomState(0).randint(3, 8, size=500))
+    assert engine.column_drift(quality, quality.sample(200, random_state=1))["stattest"] == "chisquare"
+    binary = pd.Series([0, 1] * 250)
+    assert engine.column_drift(binary, binary.iloc[:100])["stattest"] == "z"
+    large_quality = pd.Series(np.random.RandomState(0).randint(3, 8, size=2000))
+    assert engine.column_drift(large_quality, quality)["stattest"] == "jensenshannon"
+    colors = pd.Series(["red", "white"] * 600)
+    assert engine.column_drift(colors, colors.iloc[:300])["stattest"] == "jensenshannon"
+
+
+def test_drift_decisions():
+    engine = DriftEngine()
+    assert not engine.column_drift(numeric_column(800), numeric_column(800, seed=1))["drift_detected"]
+    assert engine.column_drift(numeric_column(800), numeric_column(800, shift=1.0, seed=1))["drift_detected"]
+    assert not engine.column_drift(numeric_column(3000), numeric_column(3000, seed=1))["drift_detected"]
+    assert engine.column_drift(numeric_column(3000), numeric_column(3000, shift=1.0, seed=1))["drift_detected"]
+
+
+def test_dataset_drift_uses_the_share_of_drifted_columns():
+    reference = pd.DataFrame({"a": numeric_column(800), "b": numeric_column(800, seed=2)})
+    current = pd.DataFrame({"a": numeric_column(800, shift=1.0, seed=1), "b": numeric_column(800, seed=3)})
+    assert DriftEngine(drift_share=0.5).run(reference, current)["dataset_drift"]
+    report = DriftEngine(drift_share=0.6).run(reference, current)
+    assert not report["dataset_drift"] and report["number_of_drifted_columns"] == 1
+
+
+def test_profile_comparison_without_the_reference_rows():
+    reference = pd.DataFrame({"alcohol": numeric_column(5000), "quality": np.tile([5, 6, 7], 2000)[:5000]})
+    engine = DriftEngine()
+    profile = engine.build_profile(reference, domain_value={"quality": [5, 6, 7]})
+    assert profile["n_rows"] == 5000 and sum(profile["columns"]["alcohol"]["bin_counts"]) == 5000
+
+    same = pd.DataFrame({"alcohol": numeric_column(1000, seed=1), "quality": [5, 6, 7, 8] * 250})
+    result = engine.compare_to_profile(profile, same)["columns"]
+    assert not result["alcohol"]["drift_detected"]
+    assert result["quality"]["domain_violations"] == 250
+
+    shifted = numeric_column(1000, shift=1.5, seed=1)
+    column = engine.compare_column_to_profile(profile["columns"]["alcohol"], shifted)
+    assert column["drift_detected"]
+    assert column["out_of_range"] == int((shifted > profile["columns"]["alcohol"]["max"]).sum()
+                                         + (shifted < profile["columns"]["alcohol"]["min"]).sum())
+    exact = stats.wasserstein_distance(reference["alcohol"], shifted) / reference["alcohol"].std(ddof=0)
+    assert np.isclose(column["wasserstein_normed"], exact, rtol=0.05)
@@ -0,0 +1,125 @@
+import importlib
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wine_quality.utils.drift_engine import DriftEngine
+from wine_quality.utils.drift_monitor import DriftMonitor
+
+REFERENCE = pd.DataFrame({"alcohol": np.random.RandomState(0).normal(10.5, 1.0, size=5000),
+                          "pH": np.random.RandomState(1).normal(3.3, 0.15, size=5000),
+                          "quality": np.random.RandomState(2).randint(3, 9, size=5000)})
+
+
+def make_monitor(min_window_rows=100) -> DriftMonitor:
+    return DriftMonitor(DriftEngine().build_profile(REFERENCE), min_window_rows=min_window_rows)
+
+
+def traffic(n, alcohol_shift=0.0, seed=3):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({"alcohol": rng.normal(10.5 + alcohol_shift, 1.0, size=n),
+                         "pH": rng.normal(3.3, 0.15, size=n)})
+
+
+def test_target_is_not_monitored():
+    assert make_monitor().columns == ["alcohol", "pH"]
+
+
+def test_thread_shards_are_merged():
+    monitor = make_monitor()
+    batches = [traffic(50, seed=seed) for seed in range(4)]
+    threads = [threading.Thread(target=monitor.update, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    totals = monitor.merge()
+    assert len(monitor._shards) == 4 and totals["_rows"][0] == 200
+    expected = DriftEngine.bin_counts(np.sort(pd.concat(batches)["alcohol"].to_numpy()),
+                                      np.asarray(monitor.profile["columns"]["alcohol"]["bin_edges"]))
+    np.testing.assert_array_equal(totals["alcohol"], expected)
+
+
+def test_small_windows_keep_accumulating():
+    monitor = make_monitor(min_window_rows=100)
+    monitor.update(traffic(60))
+    metrics = monitor.compute_metrics()
+    assert metrics["evaluated_at"] is None and metrics["total_rows"] == 60
+    monitor.update(traffic(60, seed=4))
+    assert monitor.compute_metrics()["window_rows"] == 120
+
+
+def test_each_window_only_sees_its_own_rows():
+    monitor = make_monitor()
+    monitor.update(traffic(1000, alcohol_shift=2.0))
+    first = monitor.compute_metrics()
+    assert first["columns"]["alcohol"]["drift_detected"] and not first["columns"]["pH"]["drift_detected"]
+    assert first["dataset_drift"]
+    monitor.update(traffic(1000, seed=5))
+    second = monitor.compute_metrics()
+    assert second["window_rows"] == 1000 and second["total_rows"] == 2000
+    assert not second["columns"]["alcohol"]["drift_detected"] and not second["dataset_drift"]
+
+
+def test_prometheus_metrics():
+    monitor = make_monitor()
+    monitor.update(traffic(500, alcohol_shift=2.0))
+    metrics = monitor.compute_metrics()
+    lines = monitor.prometheus_metrics().splitlines()
+    assert "wine_drift_input_rows_total 500" in lines
+    assert "wine_drift_window_rows 500" in lines
+    assert "wine_drift_dataset_drift 1" in lines
+    assert f'wine_drift_psi{{feature="alcohol"}} {metrics["columns"]["alcohol"]["psi"]}' in lines
+    assert 'wine_drift_detected{feature="alcohol"} 1' in lines
+    assert 'wine_drift_detected{feature="pH"} 0' in lines
+    assert sum(line.startswith("# TYPE ") for line in lines) == 6
+
+
+class FlakyModel:
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def load_reference_profile(self, profile_path):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise FileNotFoundError(profile_path)
+        return DriftEngine().build_profile(REFERENCE)
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.syspath_prepend(".")
+    sys.modules.pop("app", None)
+    module = importlib.import_module("app")
+    yield module
+    if module.drift_monitor is not None:
+        module.drift_monitor.stop()
+    sys.modules.pop("app", None)
+
+
+def test_app_retries_the_profile_with_a_backoff(app_module, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app_module.time, "monotonic", lambda: now[0])
+    app_module.model = FlakyModel(failures=2)
+    retry = app_module.DRIFT_MONITOR_RETRY_SECONDS
+
+    assert app_module.get_drift_monitor() is None
+    assert app_module.get_drift_monitor() is None and app_module.model.calls == 1
+    now[0] += retry
+    assert app_module.get_drift_monitor() is None and app_module.model.calls == 2
+    # the delay doubled
+    now[0] += retry
+    assert app_module.get_drift_monitor() is None and app_module.model.calls == 2
+    now[0] += retry
+    monitor = app_module.get_drift_monitor()
+    assert isinstance(monitor, DriftMonitor) and app_module.model.calls == 3
+    assert app_module.get_drift_monitor() is monitor
+
+    response = app_module.app.test_client().get("/metrics")
+    assert response.status_code == 200 and b"wine_drift_input_rows_total 0" in response.data
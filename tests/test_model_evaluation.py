@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import FunctionTransformer
+
+from wine_quality.components import model_evaluation
+from wine_quality.components.model_evaluation import ModelEvaluation
+from wine_quality.entity.artifact_entity import DataIngestionArtifact, ModelTrainerArtifact, RegressionMetricArtifact
+from wine_quality.entity.config_entity import ModelEvaluationConfig
+from wine_quality.entity.estimator import combined_Model_preproccessing
+from wine_quality.utils.main_utils import save_dataframe
+
+
+class PrecisionSensitiveModel:
+    """predicts the first feature, off by one when it is fed float32 features"""
+
+    def predict(self, X):
+        return X[:, 0] + (X.dtype == np.float32)
+
+
+def make_evaluation(tmp_path, monkeypatch, dtype) -> ModelEvaluation:
+    test_df = pd.DataFrame({"alcohol": np.linspace(8.0, 14.0, 40), "quality": np.linspace(8.0, 14.0, 40)})
+    save_dataframe(str(tmp_path / "test.parquet"), test_df)
+    model = combined_Model_preproccessing(FunctionTransformer(lambda x: np.asarray(x, dtype=np.float64)),
+                                          PrecisionSensitiveModel(), dtype=dtype)
+    monkeypatch.setattr(model_evaluation, "load_object", lambda file_path: model)
+    monkeypatch.setattr(ModelEvaluation, "get_best_model", lambda self: None)
+    return ModelEvaluation(ModelEvaluationConfig(),
+                           DataIngestionArtifact(trained_file_path=None, test_file_path=str(tmp_path / "test.parquet")),
+                           ModelTrainerArtifact(trained_model_file_path="model.pkl",
+                                                metric_artifact=RegressionMetricArtifact(r2_score=0.5, mae=0, mse=0)))
+
+
+def test_inference_dtype_delta_compares_cast_and_float64_inputs(tmp_path, monkeypatch):
+    evaluation = make_evaluation(tmp_path, monkeypatch, dtype="float32")
+    x = pd.DataFrame({"alcohol": np.linspace(8.0, 14.0, 40)})
+    y = x["alcohol"]
+    # float64 inputs are exact, float32 inputs are off by one
+    assert evaluation.get_inference_dtype_r2_delta(x, y) > 0.1
+    assert make_evaluation(tmp_path, monkeypatch, dtype=None).get_inference_dtype_r2_delta(x, y) is None
+
+
+def test_inference_dtype_delta_is_reported_but_does_not_decide_acceptance(tmp_path, monkeypatch):
+    result = make_evaluation(tmp_path, monkeypatch, dtype="float32").evaluate_model()
+    assert result.inference_dtype_r2_delta > ModelEvaluationConfig().inference_dtype_r2_tolerance
+    assert result.is_model_accepted
@@ -0,0 +1,189 @@
+import logging
+
+import numpy as np
+import pytest
+import yaml
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.model_selection import GridSearchCV
+
+from wine_quality.utils.model_factory import ModelFactory
+from wine_quality.utils.search_executor import SearchExecutor
+
+
+def make_factory(tmp_path, model_selection: dict, search_cache_file_path=None, **sections) -> ModelFactory:
+    config = {
+        "grid_search": {"params": {"cv": 3, "scoring": "r2"}, "strategy": "grid"},
+        "search_executor": {"n_jobs": 1, "inner_max_num_threads": 1, "backend": "loky"},
+        "model_selection": model_selection,
+        **sections,
+    }
+    model_config_path = tmp_path / "model.yaml"
+    model_config_path.write_text(yaml.safe_dump(config))
+    return ModelFactory(model_config_path=str(model_config_path), search_cache_file_path=search_cache_file_path)
+
+
+def ridge(alphas: list) -> dict:
+    return {"module_0": {"class": "Ridge", "module": "sklearn.linear_model", "params": {},
+                         "search_param_grid": {"alpha": alphas}}}
+
+
+def make_data(n=120, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(n, 4))
+    return X, X @ np.array([1.0, -2.0, 0.5, 0.0]) + rng.normal(scale=0.1, size=n)
+
+
+def test_failing_candidate_is_logged_with_its_parameters_and_ranked_last(tmp_path, caplog):
+    X, y = make_data()
+    with caplog.at_level(logging.WARNING):
+        result = make_factory(tmp_path, ridge([-1.0, 1.0])).get_best_model(X, y, base_score=0.0)
+    assert result["best_params"] == {"alpha": 1.0}
+    failures = [record.getMessage() for record in caplog.records if "failed" in record.getMessage()]
+    assert len(failures) == 3 and all("candidate 0 {'alpha': -1.0}" in message for message in failures)
+    errors = [task["error"] for task in result["search_report"]["tasks"]]
+    assert errors.count(None) == 3 and all("alpha" in error for error in errors if error is not None)
+
+
+def test_search_raises_when_every_candidate_of_a_model_fails(tmp_path):
+    X, y = make_data()
+    with pytest.raises(ValueError, match="All the 6 fits of Ridge failed"):
+        make_factory(tmp_path, ridge([-1.0, -2.0])).get_best_model(X, y, base_score=0.0)
+
+
+def test_grid_strategy_matches_grid_search_cv(tmp_path):
+    X, y = make_data()
+    alphas = [0.01, 1.0, 30.0, 300.0]
+    result = make_factory(tmp_path, ridge(alphas)).get_best_model(X, y, base_score=0.0)
+    reference = GridSearchCV(Ridge(), {"alpha": alphas}, cv=3, scoring="r2").fit(X, y)
+    assert result["best_params"] == reference.best_params_
+    assert result["best_score"] == pytest.approx(reference.best_score_, abs=1e-12)
+
+
+def test_randomized_strategy_samples_n_iter_candidates(tmp_path):
+    factory = make_factory(tmp_path, ridge([0.01, 0.1, 1.0, 10.0, 100.0]))
+    settings = {**factory.SEARCH_DEFAULTS, "strategy": "randomized", "n_iter": 3}
+    candidates = factory.get_candidates({"alpha": [0.01, 0.1, 1.0, 10.0, 100.0]}, settings)
+    assert len(candidates) == 3 and len({candidate["alpha"] for candidate in candidates}) == 3
+    # n_iter above the grid size evaluates the whole grid once
+    assert len(factory.get_candidates({"alpha": [1.0, 2.0]}, {**settings, "n_iter": 10})) == 2
+
+
+def test_halving_schedule_ends_on_max_resources():
+    settings = {**ModelFactory.SEARCH_DEFAULTS, "strategy": "halving", "factor": 3}
+    assert ModelFactory.get_resource_schedule(settings, n_candidates=9, max_resources=300) == [33, 99, 300]
+    assert ModelFactory.get_resource_schedule(settings, n_candidates=1, max_resources=300) == [300]
+    assert ModelFactory.get_resource_schedule({**settings, "min_resources": 50}, 9, 300) == [50, 150, 300]
+
+
+def test_halving_keeps_the_best_third_each_round(tmp_path):
+    X, y = make_data(n=300)
+    model_selection = ridge([0.01, 0.1, 1.0, 3.0, 10.0, 30.0, 100.0, 300.0, 1000.0])
+    model_selection["module_0"]["search"] = {"strategy": "halving", "factor": 3}
+    result = make_factory(tmp_path, model_selection).get_best_model(X, y, base_score=0.0)
+    rounds = result["search_report"]["models"]["Ridge"]["rounds"]
+    assert [round_["n_candidates"] for round_ in rounds] == [9, 3, 1]
+    # the last round trains on the full training folds
+    assert rounds[-1]["resource"] == 200
+    assert result["best_params"]["alpha"] <= 1.0
+
+
+def test_budget_leaves_unfinished_candidates_out(tmp_path):
+    X, y = make_data()
+    factory = make_factory(tmp_path, ridge([0.01, 1.0, 30.0]))
+    factory.config["grid_search"]["budget_seconds"] = 1e-9
+    result = factory.get_best_model(X, y, base_score=0.0)
+    # the first task finishes past the deadline, the others are cancelled and no candidate has all its folds
+    assert len(result["search_report"]["tasks"]) < 9
+    assert result["best_model"] is None
+
+
+def cached_search(tmp_path, X, y, alphas: list, cv: int = 3) -> dict:
+    factory = make_factory(tmp_path, ridge(alphas), search_cache_file_path=str(tmp_path / "cv_results.sqlite"))
+    factory.config["grid_search"]["params"]["cv"] = cv
+    return factory.get_best_model(X, y, base_score=0.0)
+
+
+def test_search_cache_serves_a_rerun_and_only_evaluates_new_points(tmp_path):
+    X, y = make_data()
+    first = cached_search(tmp_path, X, y, [0.1, 10.0])
+    assert first["search_report"]["cache"]["hits"] == 0 and first["search_report"]["cache"]["misses"] == 6
+
+    rerun = cached_search(tmp_path, X, y, [0.1, 10.0])
+    assert rerun["search_report"]["cache"]["hits"] == 6
+    assert all(task["cached"] for task in rerun["search_report"]["tasks"])
+    assert rerun["best_params"] == first["best_params"] and rerun["best_score"] == first["best_score"]
+
+    # a new grid value: only its folds are fitted
+    grown = cached_search(tmp_path, X, y, [0.1, 10.0, 1000.0])
+    assert sorted(task["params"]["alpha"] for task in grown["search_report"]["tasks"] if not task["cached"]) == \
+        [1000.0] * 3
+
+
+def test_search_cache_misses_when_data_or_folds_change(tmp_path):
+    X, y = make_data()
+    cached_search(tmp_path, X, y, [0.1, 10.0])
+    changed_data = cached_search(tmp_path, X, y + 1.0, [0.1, 10.0])
+    assert changed_data["search_report"]["cache"]["hits"] == 0
+    changed_folds = cached_search(tmp_path, X, y, [0.1, 10.0], cv=4)
+    assert changed_folds["search_report"]["cache"]["hits"] == 0
+    assert not any(task["cached"] for task in changed_folds["search_report"]["tasks"])
+
+
+def select(tmp_path, selection: dict):
+    X, y = make_data()
+    factory = make_factory(tmp_path, ridge([1.0]), selection=selection)
+    searches = {"module_0": {"estimator": Ridge()}}
+    finalists = [{"model_key": "module_0", "model_name": "Ridge", "params": {"alpha": alpha}, "score": score}
+                 for alpha, score in ((1.0, 0.9), (10.0, 0.85), (100.0, 0.8))]
+    # stand in measurements: larger alphas serve faster
+    benchmark = lambda model: {"p99_latency_ms": 10.0 / model.alpha, "model_mb": 1.0}
+    return factory.select_model(finalists, searches, SearchExecutor(n_jobs=1), X, y, benchmark), finalists
+
+
+def test_selection_without_constraints_or_weights_keeps_the_best_score(tmp_path):
+    chosen, finalists = select(tmp_path, {"constraints": {"max_p99_latency_ms": None}, "weights": {}})
+    assert chosen["params"] == {"alpha": 1.0} and chosen["model"].alpha == 1.0
+    assert [finalist["selected"] for finalist in finalists] == [True, False, False]
+    assert all("model" not in finalist for finalist in finalists[1:])
+
+
+def test_selection_drops_finalists_over_a_constraint_and_ranks_on_the_weighted_objective(tmp_path):
+    chosen, finalists = select(tmp_path, {"constraints": {"max_p99_latency_ms": 5.0}})
+    assert finalists[0]["violations"] == ["max_p99_latency_ms"] and chosen["params"] == {"alpha": 10.0}
+    # objectives 0.9 - 0.1 * 10, 0.85 - 0.1 * 1, 0.8 - 0.1 * 0.1
+    chosen, _ = select(tmp_path, {"weights": {"p99_latency_ms": 0.1}})
+    assert chosen["params"] == {"alpha": 100.0}
+    assert chosen["measurements"] == {"p99_latency_ms": 0.1, "model_mb": 1.0}
+
+
+def test_selection_rejects_unknown_measurements_and_may_find_no_feasible_finalist(tmp_path):
+    with pytest.raises(ValueError, match="Unknown serving measurements"):
+        select(tmp_path, {"weights": {"p50_latency_ms": 1.0}})
+    chosen, finalists = select(tmp_path, {"constraints": {"max_model_mb": 0.5}})
+    assert chosen is None and not any(finalist["selected"] for finalist in finalists)
+
+
+def test_search_on_a_subsample_refits_the_choice_on_every_row(tmp_path):
+    X, y = make_data(n=300)
+    result = make_factory(tmp_path, ridge([0.1, 10.0])).get_best_model(X[:90], y[:90], base_score=0.0,
+                                                                       X_refit=X, y_refit=y)
+    assert result["search_report"]["search_sample"] == {"rows": 90, "refit_rows": 300}
+    np.testing.assert_allclose(result["best_model"].coef_, Ridge(**result["best_params"]).fit(X, y).coef_)
+    np.testing.assert_allclose(result["search_sample_model"].coef_,
+                               Ridge(**result["best_params"]).fit(X[:90], y[:90]).coef_)
+
+
+def test_histogram_boosting_with_early_stopping_matches_grid_search_cv(tmp_path):
+    X, y = make_data(n=300)
+    params = {"max_iter": 50, "early_stopping": True, "validation_fraction": 0.1, "n_iter_no_change": 5,
+              "random_state": 42}
+    grid = {"learning_rate": [0.05, 0.2], "max_leaf_nodes": [7, 15]}
+    model_selection = {"module_0": {"class": "HistGradientBoostingRegressor", "module": "sklearn.ensemble",
+                                    "params": params, "search_param_grid": grid}}
+    result = make_factory(tmp_path, model_selection).get_best_model(X, y, base_score=-1.0)
+    reference = GridSearchCV(HistGradientBoostingRegressor(**params), grid, cv=3, scoring="r2").fit(X, y)
+    # every candidate is a plain fit of its own, nothing is shared between folds or candidates
+    assert not any(task["shared_fit"] for task in result["search_report"]["tasks"])
+    assert result["best_params"] == reference.best_params_
+    assert result["best_score"] == pytest.approx(reference.best_score_, abs=1e-12)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from wine_quality.constants import PARQUET_COMPRESSION
+from wine_quality.utils.main_utils import read_dataframe, save_dataframe
+
+DTYPES = {"alcohol": np.dtype("float64"), "quality": np.dtype("int64"), "Id": np.dtype("int64")}
+
+
+def test_save_casts_to_schema_dtypes_and_compresses(tmp_path):
+    file_path = str(tmp_path / "store" / "wine.parquet")
+    dataframe = pd.DataFrame({"alcohol": [9.5, 10.0], "quality": [5.0, 6.0], "Id": [1, 2]})
+    save_dataframe(file_path, dataframe, dtypes=DTYPES)
+    metadata = pq.ParquetFile(file_path).metadata
+    assert metadata.row_group(0).column(0).compression.lower() == PARQUET_COMPRESSION
+    loaded = read_dataframe(file_path)
+    assert loaded["quality"].dtype == np.int64
+    pd.testing.assert_frame_equal(loaded, dataframe.astype(DTYPES))
+
+
+def test_integer_column_with_missing_values_stays_float(tmp_path):
+    file_path = str(tmp_path / "wine.parquet")
+    save_dataframe(file_path, pd.DataFrame({"quality": [5.0, np.nan]}), dtypes=DTYPES)
+    loaded = read_dataframe(file_path)
+    assert loaded["quality"].dtype == np.float64 and loaded["quality"].isna().tolist() == [False, True]
+
+
+def test_read_only_the_requested_columns(tmp_path):
+    file_path = str(tmp_path / "wine.parquet")
+    save_dataframe(file_path, pd.DataFrame({"alcohol": [9.5], "quality": [5], "Id": [1]}))
+    assert read_dataframe(file_path, columns=["quality"]).columns.tolist() == ["quality"]
+
+
+def test_legacy_csv_is_read_with_the_given_dtypes(tmp_path):
+    file_path = str(tmp_path / "wine.csv")
+    pd.DataFrame({"alcohol": [9.5], "quality": [5]}).to_csv(file_path, index=False)
+    loaded = read_dataframe(file_path, dtypes={"alcohol": "float32"})
+    assert loaded["alcohol"].dtype == np.float32
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from wine_quality.data_access.wine_data import winedata
+from wine_quality.utils.main_utils import get_schema_dtypes, read_yaml_file
+
+SCHEMA = read_yaml_file(os.path.join(os.path.dirname(__file__), "..", "config", "schema.yaml"))
+OPERATORS = {"$gte": lambda a, b: a >= b, "$lt": lambda a, b: a < b}
+
+
+def matches(document, query):
+    if "$and" in query:
+        return all(matches(document, part) for part in query["$and"])
+    return all(OPERATORS[operator](document[field], value)
+               for field, condition in query.items() for operator, value in condition.items())
+
+
+class RangeCollection:
+    """in-memory collection answering the range queries, $sample and projections of the partitioned export"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def count_documents(self, query):
+        return sum(matches(document, query) for document in self.documents)
+
+    def find(self, query, projection=None, batch_size=None):
+        kept = [column for column, keep in projection.items() if keep]
+        return iter([{column: document[column] for column in kept if column in document}
+                     for document in self.documents if matches(document, query)])
+
+    def aggregate(self, pipeline):
+        size = pipeline[1]["$sample"]["size"]
+        field = next(iter(pipeline[2]["$project"]))
+        rng = np.random.RandomState(0)
+        sample = rng.choice(len(self.documents), size=min(size, len(self.documents)), replace=False)
+        return iter([{field: self.documents[i][field]} for i in sample])
+
+
+def make_winedata(collection) -> winedata:
+    data = winedata.__new__(winedata)
+    data._schema_dtypes = get_schema_dtypes(SCHEMA)
+    data.get_collection = lambda collection_name, database_name=None: collection
+    return data
+
+
+def make_documents(n):
+    return [{**{column: float(i) for column in SCHEMA["numerical_columns"]}, "Id": i, "quality": 5}
+            for i in range(n)]
+
+
+def test_partition_queries_cover_the_range_without_overlap():
+    queries = winedata.get_partition_queries([10, 20], field="Id")
+    assert queries == [{"Id": {"$lt": 10}}, {"Id": {"$gte": 10, "$lt": 20}}, {"Id": {"$gte": 20}}]
+    assert winedata.get_partition_queries([], field="Id") == [{}]
+
+
+def test_partition_queries_keep_the_filter():
+    queries = winedata.get_partition_queries([10], field="Id", query={"quality": {"$gte": 5}})
+    assert queries[0] == {"$and": [{"quality": {"$gte": 5}}, {"Id": {"$lt": 10}}]}
+
+
+def test_partition_bounds_are_sorted_and_distinct():
+    data = make_winedata(RangeCollection(make_documents(200)))
+    bounds = data.get_partition_bounds("wine", n_partitions=4, field="Id", samples_per_partition=8)
+    assert len(bounds) == 3 and bounds == sorted(set(bounds))
+
+
+def test_partitioned_export_returns_every_document_once():
+    data = make_winedata(RangeCollection(make_documents(200)))
+    partitions = data.export_collection_in_partitions("wine", n_partitions=4, max_workers=2, field="Id")
+    assert len(partitions) == 4
+    exported = pd.concat(partitions, ignore_index=True)
+    np.testing.assert_array_equal(exported["alcohol"].to_numpy(), np.arange(200.0))
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import PowerTransformer
+
+from wine_quality.utils.preprocessing import SubsampledPowerTransformer, stratified_order
+
+
+def skewed_features(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.column_stack([rng.lognormal(0.0, 0.6, n), rng.gamma(2.0, 3.0, n), rng.normal(3.3, 0.15, n),
+                            -rng.lognormal(0.0, 0.3, n) + 2.0])
+
+
+def test_lambdas_equal_power_transformer_without_subsampling():
+    X = skewed_features(3000)
+    reference = PowerTransformer().fit(X)
+    transformer = SubsampledPowerTransformer(subsample=None).fit(X)
+    np.testing.assert_allclose(transformer.lambdas_, reference.lambdas_, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(transformer.transform(X), reference.transform(X), atol=1e-8)
+    np.testing.assert_allclose(transformer.inverse_transform(transformer.transform(X)), X, atol=1e-8)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_subsampled_lambdas_stay_within_tolerance_of_the_full_data(n_jobs, monkeypatch):
+    # fit the columns in worker processes even on this small sample
+    monkeypatch.setattr(SubsampledPowerTransformer, "MIN_PARALLEL_ROWS", 0)
+    X = skewed_features(60_000)
+    y = np.random.RandomState(1).randint(3, 9, len(X))
+    reference = PowerTransformer().fit(X)
+    transformer = SubsampledPowerTransformer(subsample=2000, tol=1e-2, n_jobs=n_jobs, random_state=0).fit(X, y)
+    assert transformer.n_samples_lambdas_ < len(X)
+    # the near normal column (2) has a flat likelihood, its lambda is not identified but its transform is
+    skewed = [0, 1, 3]
+    np.testing.assert_allclose(transformer.lambdas_[skewed], reference.lambdas_[skewed], atol=0.1)
+    # the tolerance is on the standardized transform: mean absolute shift in standard deviations
+    shift = np.abs(transformer.transform(X) - reference.transform(X)).mean(axis=0)
+    assert shift.max() < 2e-2
+
+
+def test_nans_are_ignored_in_fit_and_kept_in_transform():
+    X = skewed_features(500)
+    X[::7, 1] = np.nan
+    reference = PowerTransformer().fit(X)
+    transformer = SubsampledPowerTransformer().fit(pd.DataFrame(X, columns=list("abcd")))
+    np.testing.assert_allclose(transformer.lambdas_, reference.lambdas_, rtol=1e-6, atol=1e-6)
+    transformed = transformer.transform(pd.DataFrame(X, columns=list("abcd")))
+    np.testing.assert_array_equal(np.isnan(transformed), np.isnan(X))
+    assert transformer.get_feature_names_out().tolist() == list("abcd")
+
+
+def test_invalid_parameters_are_rejected():
+    for params in ({"method": "log"}, {"subsample": 0}, {"tol": -1.0}):
+        with pytest.raises(ValueError):
+            SubsampledPowerTransformer(**params).fit(skewed_features(50))
+
+
+def test_stratified_order_prefixes_keep_the_class_proportions():
+    rng = np.random.RandomState(0)
+    y = rng.choice([3, 4, 5, 6, 7, 8], size=5000, p=[0.01, 0.04, 0.4, 0.4, 0.12, 0.03])
+    order = stratified_order(y, random_state=1)
+    np.testing.assert_array_equal(np.sort(order), np.arange(len(y)))
+    labels, counts = np.unique(y, return_counts=True)
+    for n in (100, 250, 1000, 4000):
+        prefix_counts = np.array([(y[order[:n]] == label).sum() for label in labels])
+        # every class is within one row of its population share
+        assert np.all(np.abs(prefix_counts - counts * n / len(y)) <= 1)
+    # the same seed gives the same order, growing the sample does not redraw it
+    np.testing.assert_array_equal(stratified_order(y, random_state=1), order)
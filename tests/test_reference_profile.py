@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from wine_quality.components.data_validation import DataValidation
+from wine_quality.entity.artifact_entity import DataIngestionArtifact
+from wine_quality.entity.config_entity import DataValidationConfig
+from wine_quality.utils.drift_engine import DriftEngine
+
+
+def make_training_frame(n=2000):
+    rng = np.random.RandomState(0)
+    return pd.DataFrame({"alcohol": rng.normal(10.5, 1.0, size=n), "quality": rng.randint(3, 8, size=n),
+                         "pH": np.where(rng.rand(n) < 0.01, np.nan, rng.normal(3.3, 0.15, size=n))})
+
+
+def test_reference_profile_is_written_as_json(tmp_path):
+    config = DataValidationConfig(reference_profile_file_path=str(tmp_path / "reference_profile.json"),
+                                  profile_quantiles=11, profile_bins=5)
+    validation = DataValidation(DataIngestionArtifact(trained_file_path="", test_file_path=""), config)
+    profile = validation.create_reference_profile(make_training_frame())
+    with open(config.reference_profile_file_path) as file:
+        assert json.load(file) == profile
+
+    alcohol = profile["columns"]["alcohol"]
+    assert len(alcohol["quantiles"]) == 11 and len(alcohol["bin_edges"]) == 6
+    assert sum(alcohol["bin_counts"]) == 2000
+    assert profile["columns"]["pH"]["null_count"] + profile["columns"]["pH"]["count"] == 2000
+    assert sorted(profile["columns"]["quality"]["domain_values"]) == [3, 4, 5, 6, 7, 8]
+    assert set(profile["columns"]["quality"]["value_counts"]) == {"3", "4", "5", "6", "7"}
+
+
+def test_bin_counts_put_outliers_in_the_edge_bins():
+    edges = np.array([0.0, 1.0, 2.0, 3.0])
+    counts = DriftEngine.bin_counts(np.sort(np.array([-5.0, 0.5, 1.5, 1.5, 2.5, 9.0])), edges)
+    assert counts.tolist() == [2, 2, 2]
+
+
+def test_compare_bin_counts_on_histograms_only():
+    profile = {"bin_counts": [25, 25, 25, 25]}
+    same = DriftEngine.compare_bin_counts(profile, np.array([10, 10, 10, 10]))
+    assert same == {"psi": 0.0, "ks_statistic_binned": 0.0}
+    shifted = DriftEngine.compare_bin_counts(profile, np.array([0, 0, 10, 30]))
+    assert shifted["ks_statistic_binned"] == 0.5 and shifted["psi"] > DriftEngine.PSI_THRESHOLD
+    assert DriftEngine.compare_bin_counts(profile, np.zeros(4))["psi"] == 0.0
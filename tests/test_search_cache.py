@@ -0,0 +1,52 @@
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import Ridge
+
+from wine_quality.utils.search_cache import SearchCache, hash_arrays
+
+
+def make_entry(cache: SearchCache, params: dict, score: float, data_hash="data", fold_hash="fold") -> dict:
+    return {"key": cache.key(Ridge(), params, data_hash, fold_hash, "r2"), "estimator": "Ridge", "params": params,
+            "data_hash": data_hash, "fold_hash": fold_hash, "fold": 0, "scoring": "r2", "score": score,
+            "fit_seconds": 0.1, "seconds": 0.2}
+
+
+def test_key_covers_estimator_params_data_folds_and_scoring(tmp_path):
+    cache = SearchCache(str(tmp_path / "cv_results.sqlite"))
+    key = cache.key(Ridge(), {"alpha": 1.0}, "data", "fold", "r2")
+    # every parameter is part of the key, so a default given explicitly is the same candidate
+    assert cache.key(Ridge(), {"alpha": 1.0, "fit_intercept": True}, "data", "fold", "r2") == key
+    changed = [
+        cache.key(Ridge(), {"alpha": 2.0}, "data", "fold", "r2"),
+        cache.key(Ridge(fit_intercept=False), {"alpha": 1.0}, "data", "fold", "r2"),
+        cache.key(RandomForestRegressor(), {}, "data", "fold", "r2"),
+        cache.key(Ridge(), {"alpha": 1.0}, "other data", "fold", "r2"),
+        cache.key(Ridge(), {"alpha": 1.0}, "data", "other fold", "r2"),
+        cache.key(Ridge(), {"alpha": 1.0}, "data", "fold", "neg_mean_squared_error"),
+    ]
+    assert len(set(changed)) == len(changed) and key not in changed
+    cache.close()
+
+
+def test_hashes_change_with_content_shape_and_dtype():
+    X = np.arange(12.0).reshape(6, 2)
+    assert hash_arrays(X) == hash_arrays(X.copy())
+    assert hash_arrays(X, block_rows=4) == hash_arrays(X)
+    assert len({hash_arrays(X), hash_arrays(X + 1), hash_arrays(X.reshape(4, 3)),
+                hash_arrays(X.astype(np.float32))}) == 4
+    assert SearchCache.fold_hash(np.arange(4), np.arange(4, 6)) != SearchCache.fold_hash(np.arange(3), np.arange(3, 6))
+
+
+def test_put_and_get_count_hits_and_misses_and_skip_failed_fits(tmp_path):
+    file_path = str(tmp_path / "cv_results.sqlite")
+    cache = SearchCache(file_path)
+    entries = [make_entry(cache, {"alpha": 1.0}, 0.5), make_entry(cache, {"alpha": 2.0}, float("nan"))]
+    cache.put(entries)
+    cache.close()
+
+    # results persist across runs
+    cache = SearchCache(file_path)
+    rows = cache.get([entry["key"] for entry in entries])
+    assert rows == {entries[0]["key"]: {"score": 0.5, "fit_seconds": 0.1, "seconds": 0.2}}
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
@@ -0,0 +1,56 @@
+import os
+import pickle
+
+import numpy as np
+
+from wine_quality.utils.main_utils import create_numpy_memmap
+from wine_quality.utils.search_data import SearchData
+
+
+def make_folds(n, n_folds=3, seed=0):
+    rng = np.random.RandomState(seed)
+    rows = np.arange(n)
+    return [(rng.permutation(np.setdiff1d(rows, test_index)), test_index)
+            for test_index in np.array_split(rows, n_folds)]
+
+
+def test_memory_mapped_npy_is_used_in_place_other_arrays_are_written_once(tmp_path):
+    X = create_numpy_memmap(str(tmp_path / "train.npy"), shape=(30, 2), dtype=np.float32)
+    X[:] = np.arange(60).reshape(30, 2)
+    X.flush()
+    y = np.arange(30.0)
+    with SearchData(X, y, make_folds(30), temp_folder=str(tmp_path)) as data:
+        assert data.X_path == str(tmp_path / "train.npy")
+        assert os.path.dirname(data.y_path) == data.folder
+        np.testing.assert_array_equal(data.X, X)
+        np.testing.assert_array_equal(data.y, y)
+        folder = data.folder
+    # the files written for the search are removed with it, the training data is not
+    assert not os.path.exists(folder) and os.path.exists(tmp_path / "train.npy")
+    # a slice of a map is not the whole file, it is written out
+    with SearchData(X[:20], y[:20], make_folds(20), temp_folder=str(tmp_path)) as data:
+        assert os.path.dirname(data.X_path) == data.folder and data.X.shape == (20, 2)
+
+
+def test_pickled_handle_is_small_and_maps_the_same_data(tmp_path):
+    X = np.random.RandomState(0).normal(size=(5000, 8))
+    y = np.arange(5000.0)
+    folds = make_folds(5000)
+    with SearchData(X, y, folds, temp_folder=str(tmp_path)) as data:
+        payload = pickle.dumps(data)
+        assert len(payload) < 2000
+        worker_data = pickle.loads(payload)
+        np.testing.assert_array_equal(worker_data.X, X)
+        train_index, test_index = worker_data.fold(1)
+        np.testing.assert_array_equal(train_index, np.sort(folds[1][0]))
+        np.testing.assert_array_equal(test_index, folds[1][1])
+        assert worker_data.n_folds == 3 and worker_data.n_train_rows == 3333
+
+
+def test_fold_subsample_is_a_sorted_prefix_of_the_train_order(tmp_path):
+    folds = make_folds(300)
+    with SearchData(np.zeros((300, 1)), np.zeros(300), folds, temp_folder=str(tmp_path)) as data:
+        train_index, _ = data.fold(0, n_train=50)
+        np.testing.assert_array_equal(train_index, np.sort(folds[0][0][:50]))
+        # a larger subsample contains the smaller one
+        assert set(train_index) <= set(data.fold(0, n_train=100)[0])
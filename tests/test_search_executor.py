@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.ensemble import (ExtraTreesRegressor, GradientBoostingRegressor, HistGradientBoostingRegressor,
+                              RandomForestRegressor)
+from sklearn.metrics import r2_score
+from sklearn.model_selection import GridSearchCV, KFold, ParameterGrid
+from sklearn.neighbors import KNeighborsRegressor
+
+from wine_quality.utils.search_executor import score_ensemble_sizes, score_neighbor_grid, supports_ensemble_prefix
+
+
+def make_split(n=300, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.normal(size=(n, 5))
+    y = X[:, 0] - 2 * X[:, 1] ** 2 + np.sin(3 * X[:, 2]) + rng.normal(scale=0.3, size=n)
+    return X[:200], y[:200], X[200:], y[200:]
+
+
+@pytest.mark.parametrize("estimator", [
+    RandomForestRegressor(max_depth=4, random_state=0),
+    ExtraTreesRegressor(max_depth=4, random_state=0),
+    GradientBoostingRegressor(max_depth=2, subsample=0.8, random_state=0),
+])
+def test_prefix_scores_equal_independently_fitted_ensembles(estimator):
+    X_train, y_train, X_test, y_test = make_split()
+    sizes = [1, 5, 12, 30]
+    candidates = {candidate: clone(estimator).set_params(n_estimators=size) for candidate, size in enumerate(sizes)}
+    scores, fit_seconds = score_ensemble_sizes(candidates, X_train, y_train, X_test, y_test, "r2")
+    for candidate, size in enumerate(sizes):
+        model = clone(estimator).set_params(n_estimators=size).fit(X_train, y_train)
+        assert scores[candidate] == pytest.approx(r2_score(y_test, model.predict(X_test)), abs=1e-12)
+    assert set(fit_seconds) == set(candidates)
+
+
+def test_ensemble_prefix_support():
+    assert supports_ensemble_prefix(RandomForestRegressor())
+    assert supports_ensemble_prefix(GradientBoostingRegressor())
+    # with early stopping (HistGradientBoosting always has n_iter_no_change) the number of stages depends on the data
+    assert not supports_ensemble_prefix(GradientBoostingRegressor(n_iter_no_change=5))
+    assert not supports_ensemble_prefix(HistGradientBoostingRegressor())
+
+
+def test_neighbor_grid_scores_equal_grid_search_cv():
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(300, 4))
+    # rows 0-9 are repeated in the two other folds: zero distance neighbors in every fold. The copies share their
+    # target, so which copy an algorithm picks on a tie at the k-th neighbor does not change the prediction
+    X[100:110] = X[200:210] = X[:10]
+    y = X[:, 0] + rng.normal(scale=0.5, size=300)
+    y[100:110] = y[200:210] = y[:10]
+    grid = {"algorithm": ["auto", "ball_tree", "kd_tree", "brute"], "weights": ["uniform", "distance"],
+            "n_neighbors": [3, 5, 9]}
+    folds = list(KFold(n_splits=3).split(X))
+    reference = GridSearchCV(KNeighborsRegressor(), grid, cv=folds, scoring="r2").fit(X, y)
+
+    candidates = list(ParameterGrid(grid))
+    for fold, (train_index, test_index) in enumerate(folds):
+        models = {candidate: KNeighborsRegressor(**params) for candidate, params in enumerate(candidates)}
+        scores, _ = score_neighbor_grid(models, X[train_index], y[train_index], X[test_index], y[test_index], "r2")
+        np.testing.assert_allclose([scores[candidate] for candidate in range(len(candidates))],
+                                   reference.cv_results_[f"split{fold}_test_score"], rtol=0, atol=1e-12)
+
+
+def test_neighbor_grid_queries_one_index_and_splits_its_time(monkeypatch):
+    X_train, y_train, X_test, y_test = make_split()
+    queries = []
+    kneighbors = KNeighborsRegressor.kneighbors
+
+    def count_queries(self, *args, **kwargs):
+        queries.append(self.algorithm)
+        return kneighbors(self, *args, **kwargs)
+
+    monkeypatch.setattr(KNeighborsRegressor, "kneighbors", count_queries)
+    models = {candidate: KNeighborsRegressor(**params) for candidate, params in enumerate(
+        ParameterGrid({"algorithm": ["brute", "kd_tree"], "n_neighbors": [3, 500]}))}
+    scores, fit_seconds = score_neighbor_grid(models, X_train, y_train, X_test, y_test, "r2")
+    assert queries == ["brute"]
+    assert len(set(fit_seconds.values())) == 1 and set(fit_seconds) == set(models)
+    # n_neighbors above the training rows cannot be scored, as KNeighborsRegressor.predict fails
+    assert set(scores) == {0, 2}
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import yaml
+
+from wine_quality.utils.model_factory import ModelFactory
+from wine_quality.utils.search_planner import SearchPlanner, main
+
+ALPHAS = [0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0, 30.0, 100.0]
+
+
+def write_config(tmp_path, on_budget="warn", budget_seconds=None) -> str:
+    config = {
+        "grid_search": {"params": {"cv": 3, "scoring": "r2"}, "strategy": "grid", "budget_seconds": budget_seconds},
+        "search_executor": {"n_jobs": 1},
+        "dry_run": {"enabled": True, "n_configs": 2, "sample_rows": [50, 100], "on_budget": on_budget},
+        "model_selection": {"module_0": {"class": "Ridge", "module": "sklearn.linear_model", "params": {},
+                                         "search_param_grid": {"alpha": ALPHAS}}},
+    }
+    model_config_path = tmp_path / "model.yaml"
+    model_config_path.write_text(yaml.safe_dump(config))
+    return str(model_config_path)
+
+
+def make_data(n=300):
+    rng = np.random.RandomState(0)
+    X = rng.normal(size=(n, 4))
+    return X, X[:, 0] + rng.normal(scale=0.1, size=n)
+
+
+def test_plan_logs_instead_of_printing(tmp_path, capsys):
+    X, y = make_data()
+    plan = SearchPlanner(ModelFactory(write_config(tmp_path))).plan(X, y)
+    assert capsys.readouterr().out == ""
+    assert plan["models"]["Ridge"]["n_candidates"] == 9 and plan["models"]["Ridge"]["n_fits"] == 27
+    assert not plan["over_budget"]
+
+
+def test_over_budget_plan_aborts_or_shrinks_the_grid(tmp_path):
+    X, y = make_data()
+    with pytest.raises(RuntimeError, match="exceeds the budget"):
+        SearchPlanner(ModelFactory(write_config(tmp_path, "abort", budget_seconds=1e-9))).plan(X, y)
+    factory = ModelFactory(write_config(tmp_path, "shrink", budget_seconds=1e-9))
+    plan = SearchPlanner(factory).plan(X, y)
+    assert plan["over_budget"] and plan["shrunk"] == {"Ridge": 1}
+    assert factory.config["model_selection"]["module_0"]["search"] == {"strategy": "randomized", "n_iter": 1}
+
+
+def test_cli_prints_the_plan(tmp_path, capsys):
+    X, y = make_data()
+    np.save(tmp_path / "train.npy", X)
+    np.save(tmp_path / "train_target.npy", y)
+    main([str(tmp_path / "train.npy"), str(tmp_path / "train_target.npy"), "--config", write_config(tmp_path),
+          "--budget-seconds", "1e-9"])
+    out = capsys.readouterr().out
+    assert out.splitlines()[0].split() == ["model", "strategy", "candidates", "fits", "exponent", "cpu", "s",
+                                           "memory", "MB"]
+    assert "Ridge" in out and "exceeds the budget" in out
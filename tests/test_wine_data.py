@@ -0,0 +1,107 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from wine_quality.data_access.wine_data import winedata
+from wine_quality.utils.main_utils import get_schema_dtypes, read_yaml_file
+
+SCHEMA = read_yaml_file(os.path.join(os.path.dirname(__file__), "..", "config", "schema.yaml"))
+
+
+class StaleCountCollection:
+    """collection whose count_documents lags behind find, as between two replica set members"""
+
+    def __init__(self, documents, count):
+        self.documents = documents
+        self.count = count
+
+    def count_documents(self, query):
+        return self.count
+
+    def find(self, query, projection=None, batch_size=None):
+        kept = [column for column, keep in projection.items() if keep]
+        return iter([{column: document[column] for column in kept if column in document}
+                     for document in self.documents])
+
+
+def make_winedata(collection=None) -> winedata:
+    data = winedata.__new__(winedata)
+    data._schema_dtypes = get_schema_dtypes(SCHEMA)
+    data.get_collection = lambda collection_name, database_name=None: collection
+    return data
+
+
+def make_documents(n):
+    documents = []
+    for i in range(n):
+        document = {column: float(i) for column in SCHEMA["numerical_columns"]}
+        document.update({"_id": i, "Id": i, "quality": 5 + i % 3})
+        documents.append(document)
+    return documents
+
+
+def test_projection_keeps_schema_columns_only():
+    projection = make_winedata().get_projection()
+    assert projection["_id"] == 0
+    assert "Id" not in projection
+    assert set(column for column, keep in projection.items() if keep) == set(get_schema_dtypes(SCHEMA))
+
+
+def test_fill_buffers_writes_typed_columns_batch_by_batch():
+    data = make_winedata()
+    buffers = data._new_buffers(10)
+    cursor = iter(make_documents(25))
+    rows = winedata._fill_buffers(cursor, buffers, 10, batch_size=3)
+    assert rows == 10
+    assert buffers["quality"].dtype == np.int64
+    assert buffers["alcohol"].dtype == np.float64
+    np.testing.assert_array_equal(buffers["alcohol"], np.arange(10.0))
+    # the cursor is not read past the buffer size
+    assert next(cursor)["Id"] == 10
+
+
+def test_missing_values_upcast_only_their_integer_column():
+    documents = make_documents(6)
+    documents[1]["quality"] = None
+    documents[2]["quality"] = "na"
+    documents[3]["quality"] = float("nan")
+    documents[4]["alcohol"] = float("nan")
+    del documents[5]["pH"]
+    buffers = make_winedata()._new_buffers(6)
+    rows = winedata._fill_buffers(iter(documents), buffers, 6, batch_size=4)
+    assert rows == 6
+    assert buffers["quality"].dtype == np.float64
+    np.testing.assert_array_equal(np.isnan(buffers["quality"]), [False, True, True, True, False, False])
+    assert np.isnan(buffers["alcohol"][4]) and np.isnan(buffers["pH"][5])
+    assert buffers["pH"].dtype == np.float64
+
+
+def test_export_grows_buffers_past_a_stale_count():
+    collection = StaleCountCollection(make_documents(23), count=5)
+    df = make_winedata(collection).export_collection_as_dataframe("wine", batch_size=4)
+    assert len(df) == 23
+    assert list(df.columns) == list(get_schema_dtypes(SCHEMA))
+    assert df["quality"].dtype == np.int64
+    np.testing.assert_array_equal(df["alcohol"].to_numpy(), np.arange(23.0))
+
+
+def test_export_of_an_empty_collection():
+    df = make_winedata(StaleCountCollection([], count=0)).export_collection_as_dataframe("wine")
+    assert len(df) == 0 and list(df.columns) == list(get_schema_dtypes(SCHEMA))
+
+
+def test_extra_columns_are_projected_and_typed():
+    extra_columns = {"ingested_at": np.dtype("datetime64[ms]"), "Id": np.dtype("int64")}
+    documents = make_documents(3)
+    for i, document in enumerate(documents):
+        document["ingested_at"] = datetime(2026, 10, 19, 12, 0, i)
+    del documents[2]["ingested_at"]
+    collection = StaleCountCollection(documents, count=3)
+    data = make_winedata(collection)
+    assert data.get_projection(extra_columns)["Id"] == 1
+    df = data.export_collection_as_dataframe("wine", extra_columns=extra_columns)
+    assert df["Id"].tolist() == [0, 1, 2]
+    assert df["ingested_at"].iloc[1] == pd.Timestamp(2026, 10, 19, 12, 0, 1)
+    assert pd.isna(df["ingested_at"].iloc[2])
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+from pymongo import InsertOne, UpdateOne
+
+from wine_quality.data_access.wine_loader import WineLoader
+
+SERVER_AHEAD = timedelta(minutes=5)
+
+
+class RecordingCollection:
+    full_name = "wine.wine_Collection"
+
+    def __init__(self):
+        self.operations = []
+
+    def bulk_write(self, operations, ordered=True):
+        assert not ordered
+        self.operations.extend(operations)
+
+
+def make_loader(upsert_key=None) -> WineLoader:
+    loader = WineLoader.__new__(WineLoader)
+    admin = SimpleNamespace(command=lambda name: {"localTime": WineLoader._utcnow() + SERVER_AHEAD})
+    loader.mongo_client = SimpleNamespace(client=SimpleNamespace(admin=admin))
+    loader.collection = RecordingCollection()
+    loader.batch_size, loader.workers = 4, 2
+    loader.upsert_key, loader.stamp_field = upsert_key, "ingested_at"
+    loader._clock_offset = None
+    return loader
+
+
+def test_inserts_are_insert_one_stamped_on_the_server_clock():
+    loader = make_loader()
+    before = WineLoader._utcnow()
+    assert loader.write_batch(pd.DataFrame({"Id": [1, 2], "alcohol": [9.5, 10.0]})) == 2
+    operations = loader.collection.operations
+    assert all(isinstance(operation, InsertOne) for operation in operations)
+    documents = [operation._doc for operation in operations]
+    assert [document["Id"] for document in documents] == [1, 2]
+    stamp = documents[0]["ingested_at"]
+    assert abs(stamp - (before + SERVER_AHEAD)) < timedelta(seconds=5)
+
+
+def test_upserts_are_stamped_by_the_server():
+    loader = make_loader(upsert_key="Id")
+    loader.write_batch(pd.DataFrame({"Id": [1, 2], "alcohol": [9.5, 10.0]}))
+    operation = loader.collection.operations[0]
+    assert isinstance(operation, UpdateOne) and operation._upsert
+    assert operation._filter == {"Id": 1}
+    assert operation._doc["$currentDate"] == {"ingested_at": True}
+
+
+def test_load_streams_every_batch(tmp_path):
+    file_path = str(tmp_path / "wine.csv")
+    pd.DataFrame({"Id": range(10), "alcohol": [9.0] * 10}).to_csv(file_path, index=False)
+    loader = make_loader()
+    assert loader.load(file_path)["rows"] == 10
+    assert sorted(operation._doc["Id"] for operation in loader.collection.operations) == list(range(10))